@@ -0,0 +1,64 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run benchmarks from the project root, e.g.
+
+    python benchmarks/bench_capture_modes.py
+
+They default to the synthetic camera source, so no device or network is needed.
+"""
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tx2_backend.settings")
+os.environ.setdefault("TX2_CAMERA_SOURCE", "synthetic")
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Call fn() warmup + repeat times and return the timed durations in ms."""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000.0)
+    return durations
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(int(round(q / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(durations):
+    ordered = sorted(durations)
+    n = len(ordered)
+    return {
+        "n": n,
+        "mean_ms": sum(ordered) / n,
+        "p50_ms": percentile(ordered, 50),
+        "p99_ms": percentile(ordered, 99),
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+    }
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as a fixed-width table."""
+    widths = [max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
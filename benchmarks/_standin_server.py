@@ -0,0 +1,98 @@
+"""
+Local stand-in for the GPU segmentation server.
+
+Accepts the capture POSTs, optionally throttles to a given link bandwidth
+and latency to mimic the dev tunnel, and can be switched off and on
+(start() again after stop() reuses the port). Requests repeating an
+`Idempotency-Key` already processed get the first reply again, whatever
+its status, and are counted in `duplicates`. Delta uploads
+(`X-Upload-Mode: delta`) are answered with `delta_status`, e.g. 409 to
+act like a server that doesn't have the before capture.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    def __init__(self, bandwidth_mbps=None, latency_ms=0.0, port=0, delta_status=200):
+        self.bandwidth_mbps = bandwidth_mbps
+        self.latency_ms = latency_ms
+        self.delta_status = delta_status
+        self.port = port
+        self.requests = []
+        self.duplicates = 0
+        self._replies = {}
+        self._connections = set()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/api/segment"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                server._connections.add(self.connection)
+
+            def finish(self):
+                super().finish()
+                server._connections.discard(self.connection)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                delay = server.latency_ms / 1000.0
+                if server.bandwidth_mbps:
+                    delay += len(body) * 8 / (server.bandwidth_mbps * 1e6)
+                time.sleep(delay)
+                key = self.headers.get("Idempotency-Key")
+                stored = server._replies.get(key) if key else None
+                if stored is not None:
+                    server.duplicates += 1
+                    status, reply = stored
+                else:
+                    server.requests.append({"path": self.path, "bytes": len(body),
+                                            "headers": dict(self.headers)})
+                    if self.headers.get("X-Upload-Mode") == "delta" and server.delta_status != 200:
+                        status, reply = server.delta_status, b""
+                    else:
+                        status, reply = 200, json.dumps({"status": "ok", "bytes": len(body)}).encode()
+                    if key:
+                        server._replies[key] = (status, reply)
+                self.send_response(status)
+                if reply:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop listening and drop open keep-alive connections, like a server going away."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        for connection in list(self._connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
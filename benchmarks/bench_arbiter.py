@@ -0,0 +1,85 @@
+"""
+Concurrent capture requests against one (fake) camera device.
+
+`--clients` threads each request `--requests` frames from a FakeDevice with
+`--latency` seconds per capture, three ways:
+
+- direct: every request hits the device, overlapping ones fail as busy;
+- serialized: a device lock only, so requests queue one capture each;
+- coalesced: the CameraArbiter, where requests arriving during a capture share it.
+
+    python benchmarks/bench_arbiter.py [--clients 16] [--requests 10] [--latency 0.05]
+"""
+import argparse
+import threading
+import time
+
+from _common import print_table, summarize
+
+import django
+
+django.setup()
+
+from tx2_backend.arbiter import CameraArbiter, FakeDevice
+from tx2_backend.camera import CameraError
+
+
+def run(request_fn, clients, requests):
+    durations, errors = [], []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                request_fn()
+            except CameraError:
+                with lock:
+                    errors.append(1)
+                continue
+            with lock:
+                durations.append((time.perf_counter() - start) * 1000.0)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return durations, len(errors), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rows = []
+    for mode in ("direct", "serialized", "coalesced"):
+        device = FakeDevice(latency=args.latency)
+        if mode == "direct":
+            request_fn = device.capture
+        elif mode == "serialized":
+            device_lock = threading.Lock()
+
+            def request_fn(device=device, device_lock=device_lock):
+                with device_lock:
+                    return device.capture()
+        else:
+            arbiter = CameraArbiter(device.capture, timeout=args.timeout, name=device.serial)
+            request_fn = arbiter.capture
+
+        durations, errors, wall = run(request_fn, args.clients, args.requests)
+        row = dict(mode=mode, ok=len(durations), busy=errors, device_captures=device.captures, wall_s=wall)
+        if durations:
+            row.update(summarize(durations))
+        rows.append(row)
+
+    print_table(rows, ["mode", "ok", "busy", "device_captures", "wall_s", "p50_ms", "p99_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Overload behaviour of the async capture_meal view: bounded vs unbounded executors.
+
+Sends meal captures (each a new photo, so each needs a camera wait and a
+JPEG encode) to the ASGI handler at --rate requests per second for
+--seconds, more than the executors can serve. It runs first with the
+configured TX2_EXECUTORS, then with effectively unbounded queues, which
+is the old behaviour where every request waits its turn.
+Reports status counts and latency percentiles. With bounded executors,
+excess requests get a fast 503 + Retry-After, and the latency of the
+requests that are served stays bounded instead of growing with the load.
+
+    python benchmarks/bench_async.py [--rate 300] [--seconds 3]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+
+from _common import print_table, summarize
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.test import AsyncClient
+
+from tx2_backend import executors
+from tx2_backend.camera import get_camera_service, shutdown_camera_service
+
+
+async def load(client, rate, seconds):
+    async def one():
+        started = time.perf_counter()
+        response = await client.get("/api/capture/meal/?save=0")
+        return response.status_code, (time.perf_counter() - started) * 1000.0
+
+    # Open loop: requests keep arriving at `rate` however slow the answers are
+    tasks = []
+    for _ in range(int(rate * seconds)):
+        tasks.append(asyncio.ensure_future(one()))
+        await asyncio.sleep(1.0 / rate)
+    return await asyncio.gather(*tasks)
+
+
+def run(label, rate, seconds):
+    executors._executors.clear()
+    results = asyncio.run(load(AsyncClient(), rate, seconds))
+    statuses = Counter(status for status, _ in results)
+    row = {"executors": label, "ok": statuses.get(200, 0), "busy_503": statuses.get(503, 0)}
+    for status, name in ((200, "ok"), (503, "busy")):
+        durations = [ms for s, ms in results if s == status]
+        if durations:
+            stats = summarize(durations)
+            row[f"{name}_p50_ms"] = stats["p50_ms"]
+            row[f"{name}_p99_ms"] = stats["p99_ms"]
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=300.0, help="Requests per second")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.TX2_MEDIA_ROOT = scratch
+    settings.TX2_SHARED_DB = f"{scratch}/bench.sqlite3"
+    get_camera_service().latest(timeout=30)
+
+    rows = [run("bounded", args.rate, args.seconds)]
+    settings.TX2_EXECUTORS = {name: {"QUEUE": 100000} for name in executors.DEFAULTS}
+    rows.append(run("unbounded", args.rate, args.seconds))
+    shutdown_camera_service()
+
+    print_table(rows, ["executors", "ok", "busy_503", "ok_p50_ms", "ok_p99_ms", "busy_p50_ms", "busy_p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Batch throughput: sequential captures vs the capture/process/upload pipeline.
+
+Runs --items captures one after another with run_capture, then as one
+run_batch, uploading to a local stand-in server throttled to --bandwidth
+Mbit/s with --latency ms of server processing per request. Reports items
+per second and the mean time of each stage; pipelined throughput should
+approach 1 / (slowest stage).
+
+    python benchmarks/bench_batch.py [--items 8] [--bandwidth 100] [--latency 300] [--uploads 2]
+"""
+import argparse
+import tempfile
+import time
+
+from _common import print_table
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from _standin_server import StandInServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=8)
+    parser.add_argument("--bandwidth", type=float, default=100.0, help="Mbit/s, 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=300.0, help="ms per request (server processing)")
+    parser.add_argument("--uploads", type=int, default=2, help="Concurrent uploads in the pipeline")
+    args = parser.parse_args()
+
+    server = StandInServer(args.bandwidth or None, args.latency).start()
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.TX2_SEGMENT_SERVER_URL = server.base_url
+    settings.TX2_MEDIA_ROOT = scratch
+    settings.TX2_SHARED_DB = f"{scratch}/bench.sqlite3"
+    settings.TX2_OUTBOX = {"ENABLED": False}  # time the uploads themselves
+    settings.TX2_HISTORY = {"ENABLED": False}
+
+    from tx2_backend.batch import run_batch
+    from tx2_backend.camera import get_camera_service, shutdown_camera_service
+    from tx2_backend.capture import CaptureLog, run_capture
+
+    get_camera_service().latest(timeout=30)
+    urls = [f"/segment/{i}/" + ("before" if i % 2 == 0 else "after") for i in range(args.items)]
+    stages = ("capture", "save", "inpaint", "upload")
+    rows = []
+
+    def row(mode, elapsed, results):
+        stats = {"mode": mode, "items": len(results), "elapsed_s": elapsed, "items_per_s": len(results) / elapsed}
+        for stage in stages:
+            stats[f"{stage}_ms"] = sum(r["timings_ms"].get(stage, 0.0) for r in results) / len(results)
+        return stats
+
+    started = time.perf_counter()
+    results = [run_capture("before", log=CaptureLog(echo=False)) for _ in urls]
+    rows.append(row("sequential", time.perf_counter() - started, results))
+
+    started = time.perf_counter()
+    results = [r for r in run_batch(urls, upload_workers=args.uploads) if r.get("status") != "done"]
+    rows.append(row("pipelined", time.perf_counter() - started, results))
+
+    shutdown_camera_service()
+    server.stop()
+    print_table(rows, ["mode", "items", "elapsed_s", "items_per_s"] + [f"{s}_ms" for s in stages])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+End-to-end capture latency: subprocess-per-request vs in-process.
+
+The subprocess mode is what `capture_api` used to do (spawn capture_before.py,
+which pays interpreter start, heavy imports and camera start every time).
+The in-process mode calls `run_capture` against the already-warm camera
+service. Upload is skipped so only the TX2 side is measured.
+
+    python benchmarks/bench_capture_modes.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from _common import PROJECT_ROOT, print_table, summarize, time_calls
+
+os.environ["TX2_HISTORY"] = "0"  # here and in the subprocess: no rows in the project database
+
+import django
+
+django.setup()
+
+from tx2_backend.camera import get_camera_service, shutdown_camera_service
+from tx2_backend.capture import CaptureLog, run_capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    script = os.path.join(PROJECT_ROOT, "capture_before.py")
+    media_dir = tempfile.mkdtemp(prefix="tx2-bench-")
+
+    def subprocess_capture():
+        subprocess.run([sys.executable, script, "--no-upload", "--media-dir", media_dir], check=True,
+                       capture_output=True, cwd=PROJECT_ROOT, env=os.environ.copy())
+
+    def in_process_capture():
+        run_capture("before", upload=False, media_dir=media_dir, log=CaptureLog(echo=False))
+
+    rows = [dict(mode="subprocess", **summarize(time_calls(subprocess_capture, args.repeat)))]
+
+    get_camera_service().latest(timeout=30)  # service start is a one-off cost
+    rows.append(dict(mode="in-process", **summarize(time_calls(in_process_capture, args.repeat))))
+    shutdown_camera_service()
+
+    print_table(rows, ["mode", "n", "mean_ms", "p50_ms", "min_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
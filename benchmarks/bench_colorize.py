@@ -0,0 +1,68 @@
+"""
+Depth colorization: the old mask/percentile/normalize/equalizeHist/
+applyColorMap chain vs the fused histogram + LUT colorizer.
+
+Reports time per frame for each, the speedup, and how many pixels differ.
+
+    python benchmarks/bench_colorize.py [--repeat 50] [--holes 0.05 0.15 0.3]
+"""
+import argparse
+
+from _common import print_table, summarize, time_calls
+
+import cv2
+import numpy as np
+
+from tx2_backend.colorize import colorize_depth
+from tx2_backend.synthetic import synthetic_depth
+
+
+def legacy_colorize(depth_image):
+    """The colorization save_depth_and_rgb used to run, kept as the reference."""
+    valid_mask = depth_image > 0
+
+    if np.any(valid_mask):
+        depth_for_viz = depth_image.astype(np.float32)
+        valid_depths = depth_for_viz[valid_mask]
+
+        dmin, dmax = np.percentile(valid_depths, [2, 98])
+        depth_for_viz = np.clip(depth_for_viz, dmin, dmax)
+
+        depth_norm = cv2.normalize(depth_for_viz, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        depth_eq = cv2.equalizeHist(depth_norm)
+
+        depth_colormap_jet = cv2.applyColorMap(depth_eq, cv2.COLORMAP_JET)
+        depth_colormap_jet[depth_image == 0] = (0, 0, 0)
+
+    else:
+        depth_colormap_jet = np.zeros((depth_image.shape[0], depth_image.shape[1], 3), dtype=np.uint8)
+
+    return depth_colormap_jet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--holes", type=float, nargs="+", default=[0.05, 0.15, 0.3])
+    args = parser.parse_args()
+
+    rows = []
+    for hole_fraction in args.holes:
+        depth = synthetic_depth(hole_fraction=hole_fraction, rng=0)
+        legacy = summarize(time_calls(lambda: legacy_colorize(depth), args.repeat))
+        fused = summarize(time_calls(lambda: colorize_depth(depth), args.repeat))
+        diff = np.abs(legacy_colorize(depth).astype(np.int16) - colorize_depth(depth).astype(np.int16))
+        rows.append({
+            "holes": hole_fraction,
+            "legacy_ms": legacy["mean_ms"],
+            "fused_ms": fused["mean_ms"],
+            "speedup": legacy["mean_ms"] / fused["mean_ms"],
+            "max_abs_diff": int(diff.max()),
+            "pct_pixels_differ": 100.0 * float((diff.max(axis=2) > 0).mean()),
+        })
+
+    print_table(rows, ["holes", "legacy_ms", "fused_ms", "speedup", "max_abs_diff", "pct_pixels_differ"])
+
+
+if __name__ == "__main__":
+    main()
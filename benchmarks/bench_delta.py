@@ -0,0 +1,108 @@
+"""
+Differential "after" uploads: bytes and upload time, full frame vs delta.
+
+Builds a synthetic before/after pair of one tray: the after frame has one
+food mound removed (--peak mm high, --radius px), fresh sensor noise and
+moved holes in both depth maps, and fresh color noise. It times the
+UploadClient sending the after capture as a full frame (RGB PNG + gzip
+CSV) and as a delta. This runs against a stand-in server throttled to
+--bandwidth Mbit/s and --latency ms, and once more against a server that
+answers 409 to the delta (the full-frame fallback). It then rebuilds the
+frame from the delta with `apply_delta` and checks that the depth is
+exactly the full-frame CSV's and the RGB is exact inside the regions.
+A pair where the tray was moved shows the full-frame cut-off.
+
+    python benchmarks/bench_delta.py [--repeat 10] [--bandwidth 20] [--latency 30]
+"""
+import argparse
+import time
+
+from _common import print_table, summarize, time_calls
+from _standin_server import StandInServer
+
+import cv2
+import numpy as np
+
+from tx2_backend.delta import apply_delta, build_delta, quantize_depth
+from tx2_backend.inpaint import inpaint_depth
+from tx2_backend.synthetic import synthetic_color, synthetic_scene, synthetic_sequence
+from tx2_backend.upload import UploadClient
+
+
+def recolor(color, mask, bgr, rng):
+    """Paint `mask` in `bgr`, then add fresh sensor noise to the whole frame."""
+    color = color.astype(np.int16)
+    color[mask] = bgr
+    noise = rng.integers(-6, 7, size=color.shape, dtype=np.int16)
+    return np.clip(color + noise, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="Mbit/s, 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=30.0, help="ms per request")
+    parser.add_argument("--peak", type=float, default=30.0, help="Removed mound height in mm")
+    parser.add_argument("--radius", type=float, default=45.0, help="Removed mound radius (sigma) in pixels")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scene = synthetic_scene(rng=1)
+    height, width = scene.shape
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    mound = args.peak * np.exp(-((xx - width / 2) ** 2 + (yy - height / 2) ** 2) / (2 * args.radius ** 2))
+
+    before_depth = inpaint_depth(synthetic_sequence(scene - mound, 1, rng=2)[0])
+    after_depth = inpaint_depth(synthetic_sequence(scene, 1, rng=3)[0])
+    before_rgb = synthetic_color(before_depth, rng)
+    after_rgb = recolor(before_rgb, mound > 3, (200, 200, 205), rng)
+    rgb_png = cv2.imencode(".png", after_rgb)[1].tobytes()
+
+    started = time.perf_counter()
+    delta = build_delta("before", "after", before_depth, after_depth, before_rgb, after_rgb)
+    build_ms = (time.perf_counter() - started) * 1000.0
+
+    rows = []
+    for mode, delta_status, payload in (
+        ("full frame", 200, None),
+        ("delta", 200, delta),
+        ("delta, server answers 409", 409, delta),
+    ):
+        server = StandInServer(args.bandwidth or None, args.latency, delta_status=delta_status).start()
+        client = UploadClient(server.base_url)
+        sends = []
+
+        def send():
+            client.send("after", rgb_png, after_depth, delta=payload).raise_for_status()
+            sends.append(1)
+
+        stats = summarize(time_calls(send, args.repeat))
+        # Bytes on the wire per capture, including a rejected delta
+        kb = sum(r["bytes"] for r in server.requests) / len(sends) / 1024.0
+        rows.append(dict(mode=mode, kb_per_capture=kb, **stats))
+        client.close()
+        server.stop()
+
+    print_table(rows, ["mode", "kb_per_capture", "mean_ms", "p50_ms", "p99_ms"])
+
+    depth, rgb = apply_delta(before_depth, before_rgb, delta)
+    inside = np.zeros((height, width), dtype=bool)
+    for x, y, w, h in delta.manifest["regions"]:
+        inside[y:y + h, x:x + w] = True
+    changed = np.abs(rgb.astype(np.int16) - after_rgb.astype(np.int16)).max(axis=2)
+    print(f"\ndelta: {len(delta.regions_png)} regions covering {inside.mean() * 100:.1f}% of the frame, "
+          f"rgb {sum(map(len, delta.regions_png)) / 1024.0:.1f} KB, depth {len(delta.depth_delta) / 1024.0:.1f} KB, "
+          f"built in {build_ms:.1f} ms")
+    print(f"rebuilt depth identical to the full-frame CSV: "
+          f"{np.array_equal(quantize_depth(depth), quantize_depth(after_depth))}")
+    print(f"rebuilt rgb exact inside regions: {not changed[inside].any()}, "
+          f"max difference outside: {int(changed[~inside].max())} (sensor noise)")
+
+    moved = inpaint_depth(synthetic_sequence(np.roll(scene, 60, axis=1), 1, rng=4)[0])
+    moved_rgb = recolor(np.roll(before_rgb, 60, axis=1), np.zeros((height, width), dtype=bool), 0, rng)
+    fallback = build_delta("before", "moved", before_depth, moved, before_rgb, moved_rgb)
+    print(f"tray moved 60 px: {'full frame' if fallback is None else 'delta'}")
+
+
+if __name__ == "__main__":
+    main()
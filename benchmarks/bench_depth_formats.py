@@ -0,0 +1,49 @@
+"""
+Write/read time and file size for each depth storage format.
+
+Measures the raw uint16 capture depth and the float32 inpainted depth at
+848x480. "read" for npy is a memory-mapped load followed by a full pass over
+the data, so the mmap laziness doesn't hide the I/O.
+
+    python benchmarks/bench_depth_formats.py [--repeat 10]
+"""
+import argparse
+import os
+import tempfile
+
+from _common import print_table, summarize, time_calls
+
+import numpy as np
+
+from tx2_backend.depth_io import DEPTH_EXTENSIONS, depth_path, load_depth, save_depth
+from tx2_backend.synthetic import synthetic_depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    raw = synthetic_depth(rng=0)
+    inpainted = raw.astype(np.float32) + 0.25
+    workdir = tempfile.mkdtemp(prefix="tx2-bench-")
+
+    rows = []
+    for label, depth in (("raw uint16", raw), ("inpainted float32", inpainted)):
+        for fmt in DEPTH_EXTENSIONS:
+            path = depth_path(workdir, "depth", fmt)
+            write = summarize(time_calls(lambda: save_depth(path, depth), args.repeat))
+            read = summarize(time_calls(lambda: float(np.sum(load_depth(path))), args.repeat))
+            rows.append({
+                "depth": label,
+                "format": fmt,
+                "write_ms": write["mean_ms"],
+                "read_ms": read["mean_ms"],
+                "size_kb": os.path.getsize(path) / 1024.0,
+            })
+
+    print_table(rows, ["depth", "format", "write_ms", "read_ms", "size_kb"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Capture throughput and fairness across a pool of (fake) cameras.
+
+`--clients` threads request frames for `--seconds` from `--cameras`
+FakeDevices with `--latency` seconds per capture. Each client owns one
+tray, so client i always wants camera i % cameras:
+
+- one worker: every camera behind a single capture lock, as with one
+  camera service per process;
+- pool, named: the DevicePool, each request naming its camera, so each
+  camera has its own worker.
+
+Then clients that don't care which camera they get (any tray) share a
+pool where the last camera is `--slow` times slower, routed least busy
+vs round robin. Jain's index over the clients' completed requests is 1.0
+when every client got the same service. Overlapping captures on one
+device raise, so "errors" must stay 0.
+
+    python benchmarks/bench_devices.py [--cameras 4] [--clients 16] [--seconds 3] [--latency 0.05] [--slow 4]
+"""
+import argparse
+import threading
+import time
+
+from _common import print_table, summarize
+
+import django
+
+django.setup()
+
+from tx2_backend.devices import fake_pool
+from tx2_backend.errors import CameraError
+
+
+def jain(values):
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values)) if any(values) else 0.0
+
+
+def run(request_fn, clients, seconds):
+    """Each client calls request_fn(i) until the deadline; (durations, per-client counts, errors, wall)."""
+    durations, counts, errors = [], [0] * clients, []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                request_fn(i)
+            except CameraError:
+                with lock:
+                    errors.append(1)
+                continue
+            with lock:
+                durations.append((time.perf_counter() - started) * 1000.0)
+                counts[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return durations, counts, len(errors), time.perf_counter() - started
+
+
+def row(case, pool, durations, counts, errors, wall):
+    captures = sum(device.arbiter.physical_captures for device in pool._devices.values())
+    result = dict(case=case, requests_per_s=len(durations) / wall, captures_per_s=captures / wall,
+                  errors=errors, fairness=jain(counts))
+    if durations:
+        stats = summarize(durations)
+        result.update(p50_ms=stats["p50_ms"], p99_ms=stats["p99_ms"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow", type=float, default=4.0, help="Latency multiplier of the last camera")
+    args = parser.parse_args()
+    columns = ["case", "requests_per_s", "captures_per_s", "p50_ms", "p99_ms", "errors", "fairness"]
+
+    rows = []
+    pool = fake_pool([args.latency] * args.cameras)
+    serials = pool.serials
+    worker_lock = threading.Lock()
+
+    def one_worker(i):
+        with worker_lock:
+            return pool.device(serials[i % len(serials)]).arbiter.capture("rgbd")
+
+    rows.append(row("one worker", pool, *run(one_worker, args.clients, args.seconds)))
+    pool = fake_pool([args.latency] * args.cameras)
+    rows.append(row("pool, named", pool,
+                    *run(lambda i: pool.capture("rgbd", serials[i % len(serials)]), args.clients, args.seconds)))
+    print(f"{args.cameras} cameras, {args.clients} clients, each pinned to one camera")
+    print_table(rows, columns)
+
+    rows, shares = [], []
+    latencies = [args.latency] * (args.cameras - 1) + [args.latency * args.slow]
+    for routing in ("round_robin", "least_busy"):
+        pool = fake_pool(latencies, routing=routing)
+        rows.append(row(routing, pool, *run(lambda i: pool.capture("rgbd"), args.clients, args.seconds)))
+        total = sum(device.requests for device in pool._devices.values())
+        shares.append(f"{routing}: " + ", ".join(
+            f"{device.serial} {device.requests / total * 100:.0f}%" for device in pool._devices.values()))
+
+    print(f"\nany camera, {serials[-1]} {args.slow:g}x slower")
+    print_table(rows, columns)
+    print()
+    for share in shares:
+        print(f"requests per camera, {share}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Temporal depth fusion: holes, inpaint time and latency per frame count.
+
+Builds a static synthetic scene and a sequence of frames with fresh noise
+and partly moving holes (like a fixed camera), then for each N fuses the
+newest N frames and inpaints the result. Reports the hole fraction left for
+TELEA, fuse / inpaint / total time, the age of the oldest fused frame at
+--fps, and the mean absolute error against the noise-free scene.
+
+    python benchmarks/bench_fusion.py [--frames 1 2 3 4 6 8] [--holes 0.15]
+        [--static 0.5] [--repeat 10]
+"""
+import argparse
+import time
+
+from _common import print_table
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from tx2_backend.fusion import METHODS, DepthFusion, hole_fraction
+from tx2_backend.inpaint import inpaint_depth
+from tx2_backend.synthetic import synthetic_scene, synthetic_sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, nargs="+", default=[1, 2, 3, 4, 6, 8])
+    parser.add_argument("--holes", type=float, default=0.15)
+    parser.add_argument("--static", type=float, default=0.5, help="Fraction of holes that never move")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    scene = synthetic_scene(rng=0)
+    sequence = synthetic_sequence(scene, max(args.frames), args.holes, args.static, rng=1)
+
+    rows = []
+    for method in METHODS:
+        for n in args.frames:
+            fusion = DepthFusion(n, scene.shape, method)
+            fuse_ms, inpaint_ms = [], []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                fused = fusion.fuse(sequence)
+                fused_at = time.perf_counter()
+                filled = inpaint_depth(fused)
+                fuse_ms.append((fused_at - started) * 1000.0)
+                inpaint_ms.append((time.perf_counter() - fused_at) * 1000.0)
+            rows.append({
+                "method": method if n > 1 else "-",
+                "frames": n,
+                "holes_pct": hole_fraction(fused) * 100.0,
+                "fuse_ms": float(np.median(fuse_ms)),
+                "inpaint_ms": float(np.median(inpaint_ms)),
+                "total_ms": float(np.median(np.add(fuse_ms, inpaint_ms))),
+                "window_ms": (n - 1) * 1000.0 / args.fps,
+                "mae_mm": float(np.mean(np.abs(filled - scene))),
+            })
+
+    print_table(rows, ["method", "frames", "holes_pct", "fuse_ms", "inpaint_ms", "total_ms", "window_ms", "mae_mm"])
+
+
+if __name__ == "__main__":
+    main()
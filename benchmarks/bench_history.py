@@ -0,0 +1,135 @@
+"""
+Capture history: insert rate and page latency as the table grows.
+
+Fills a scratch database with --rows captures spread over --patients
+patients and a year of timestamps. They are inserted through the
+HistoryRecorder (bulk_create batches), and the rate is compared with
+one INSERT per row for the first --single rows. Then it times pages of
+50 newest-first: keyset (cursor) vs OFFSET, at the start and deep into
+the table, unfiltered and per patient / capture type. Each keyset query
+prints its SQLite plan, and the endpoint is timed through the Django
+test client.
+
+    python benchmarks/bench_history.py [--rows 200000] [--patients 1000] [--single 2000] [--repeat 20]
+"""
+import argparse
+import tempfile
+import time
+from datetime import timedelta
+
+from _common import print_table, summarize, time_calls
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--single", type=int, default=2000, help="Rows inserted one by one, for comparison")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.DATABASES["default"]["NAME"] = f"{scratch}/history.sqlite3"
+    settings.TX2_SHARED_DB = f"{scratch}/history.sqlite3"
+    settings.ALLOWED_HOSTS = ["*"]
+    call_command("migrate", verbosity=0)
+
+    from tx2_backend.history import HistoryRecorder, encode_cursor, page, query
+    from tx2_backend.models import Capture
+
+    start = timezone.now() - timedelta(days=365)
+    step = timedelta(days=365) / args.rows
+    types = ("before", "after", "meal")
+
+    def fields(i):
+        patient = f"P{i * 7919 % args.patients:04d}"
+        return {
+            "capture_type": types[i % 3],
+            "patient_id": patient,
+            "segment": f"https://tablet.local/{patient}/tray{i // 300 % 3}",
+            "session_id": f"s{i:08d}",
+            "media_dir": f"/media/{types[i % 3]}/s{i:08d}",
+            "files": ["rgb_image.png", "inpainted_depth.npy", "camera.json"],
+            "timings_ms": {"capture": 40.0, "save": 45.0, "inpaint": 100.0, "spool": 0.7},
+            "server_status": 200,
+            "server_response": '{"status": "ok"}',
+            "created_at": start + step * i,
+        }
+
+    rows = []
+    started = time.perf_counter()
+    for i in range(args.single):
+        Capture.objects.create(**fields(i))
+    single_s = time.perf_counter() - started
+    rows.append({"case": "insert, one per row", "rows": args.single, "rows_per_s": args.single / single_s})
+
+    recorder = HistoryRecorder(batch_size=200, flush_interval=1.0)
+    started = time.perf_counter()
+    for i in range(args.single, args.rows):
+        recorder.record(**fields(i))
+    recorder.flush()
+    bulk_s = time.perf_counter() - started
+    rows.append({"case": "insert, HistoryRecorder", "rows": args.rows - args.single,
+                 "rows_per_s": (args.rows - args.single) / bulk_s})
+    print_table(rows, ["case", "rows", "rows_per_s"])
+
+    patient = "P0042"
+    ordered = Capture.objects.order_by("-created_at", "-id")
+    deep = int(args.rows * 0.9)
+    patient_rows = Capture.objects.filter(patient_id=patient).count()
+    cases = [
+        ("all, first page", {}, None, 0),
+        (f"all, at row {deep}", {}, ordered[deep - 1], deep),
+        (f"patient {patient}, first page", {"patient_id": patient}, None, 0),
+        (f"capture_type=meal, at row {deep // 3}", {"capture_type": "meal"},
+         ordered.filter(capture_type="meal")[deep // 3 - 1], deep // 3),
+    ]
+    # Few rows per patient (--patients close to --rows) leave no deep page to time
+    if patient_rows > 60:
+        cases.insert(3, (f"patient {patient}, at row {patient_rows - 60}", {"patient_id": patient},
+                         ordered.filter(patient_id=patient)[patient_rows - 61], patient_rows - 60))
+
+    rows, plans = [], []
+    for label, filters, last, offset in cases:
+        cursor = encode_cursor(last) if last is not None else None
+        keyset = summarize(time_calls(lambda: page(cursor=cursor, limit=50, **filters), args.repeat))
+        offset_page = lambda: list(ordered.filter(**filters)[offset:offset + 50])
+        by_offset = summarize(time_calls(offset_page, args.repeat))
+        rows.append({"case": label, "keyset_mean_ms": keyset["mean_ms"], "keyset_p99_ms": keyset["p99_ms"],
+                     "offset_mean_ms": by_offset["mean_ms"], "offset_p99_ms": by_offset["p99_ms"]})
+
+        sql, params = query(cursor=cursor, **filters)[:51].query.sql_with_params()
+        with connection.cursor() as c:
+            c.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plans.append((label, "; ".join(row[-1] for row in c.fetchall())))
+
+    print()
+    print_table(rows, ["case", "keyset_mean_ms", "keyset_p99_ms", "offset_mean_ms", "offset_p99_ms"])
+    print()
+    for label, plan in plans:
+        print(f"{label}: {plan}")
+
+    client = Client()
+    url = f"/api/capture/history/?patient_id={patient}&limit=50"
+    first = client.get(url).json()
+    if first["next_cursor"]:
+        follow, which = f"{url}&cursor={first['next_cursor']}", "second"
+    else:
+        follow, which = url, "first (and only)"
+    stats = summarize(time_calls(lambda: client.get(follow), args.repeat))
+    print(f"\nendpoint, patient {patient}, {which} page: mean {stats['mean_ms']:.2f} ms, "
+          f"p99 {stats['p99_ms']:.2f} ms ({len(client.get(follow).json()['results'])} rows)")
+
+
+if __name__ == "__main__":
+    main()
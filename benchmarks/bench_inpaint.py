@@ -0,0 +1,70 @@
+"""
+Inpainting modes: full-frame TELEA vs ROI-restricted vs pyramid.
+
+Runs each mode on synthetic frames with known noise-free depth and reports
+median latency and the mean absolute error of the filled pixels inside the
+tray ROI (the region the segmentation server uses), against the scene and
+against full-frame TELEA.
+
+    python benchmarks/bench_inpaint.py [--holes 0.05 0.15 0.3] [--repeat 10]
+        [--scale 4] [--band 2]
+"""
+import argparse
+import time
+
+from _common import print_table
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from tx2_backend.inpaint import detect_roi, inpaint_depth
+from tx2_backend.synthetic import synthetic_scene, synthetic_sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--holes", type=float, nargs="+", default=[0.05, 0.15, 0.3])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--band", type=int, default=2)
+    args = parser.parse_args()
+
+    modes = {
+        "full": {},
+        "roi": {"roi": "auto"},
+        "pyramid": {"pyramid": True, "scale": args.scale, "band": args.band},
+        "roi+pyramid": {"roi": "auto", "pyramid": True, "scale": args.scale, "band": args.band},
+    }
+
+    scene = synthetic_scene(rng=0)
+    rows = []
+    for holes in args.holes:
+        depth = synthetic_sequence(scene, 1, holes, rng=1)[0]
+        x, y, w, h = detect_roi(depth)
+        in_roi = np.zeros(depth.shape, dtype=bool)
+        in_roi[y:y + h, x:x + w] = True
+        scored = in_roi & (depth == 0)
+
+        reference = inpaint_depth(depth)
+        for mode, options in modes.items():
+            durations = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                filled = inpaint_depth(depth, **options)
+                durations.append((time.perf_counter() - started) * 1000.0)
+            rows.append({
+                "holes": holes,
+                "mode": mode,
+                "p50_ms": float(np.median(durations)),
+                "mae_mm": float(np.mean(np.abs(filled[scored] - scene[scored]))),
+                "vs_full_mm": float(np.mean(np.abs(filled[scored] - reference[scored]))),
+            })
+
+    print_table(rows, ["holes", "mode", "p50_ms", "mae_mm", "vs_full_mm"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Upload outbox: capture latency and delivery with the server up, down, and back.
+
+Runs --items captures with direct uploads and then with the outbox, first
+against a local stand-in server (--bandwidth Mbit/s, --latency ms per
+request) and then with that server switched off. While the server is off,
+a direct upload blocks the capture and then loses it. A spooled capture
+returns at once and waits in the outbox. After --outage seconds the
+server comes back. The benchmark then times two things: how long the
+first delivery waits (the drainer's backoff) and how fast the rest of
+the backlog drains. Reports capture latency, deliveries, lost captures
+and duplicate deliveries per idempotency key.
+
+    python benchmarks/bench_outbox.py [--items 6] [--bandwidth 100] [--latency 300] [--workers 2] [--outage 3]
+"""
+import argparse
+import tempfile
+import time
+
+from _common import print_table, summarize
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from _standin_server import StandInServer
+
+
+def wait_drained(outbox, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = outbox.stats()
+        if stats["pending"] == 0 and stats["sending"] == 0:
+            return stats
+        time.sleep(0.02)
+    raise RuntimeError(f"Outbox not drained: {outbox.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=6)
+    parser.add_argument("--bandwidth", type=float, default=100.0, help="Mbit/s, 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=300.0, help="ms per request (server processing)")
+    parser.add_argument("--workers", type=int, default=2, help="Outbox drainer threads")
+    parser.add_argument("--outage", type=float, default=3.0, help="Seconds the server stays off")
+    args = parser.parse_args()
+
+    server = StandInServer(args.bandwidth or None, args.latency).start()
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.TX2_SEGMENT_SERVER_URL = server.base_url
+    settings.TX2_MEDIA_ROOT = scratch
+    settings.TX2_SHARED_DB = f"{scratch}/bench.sqlite3"
+    settings.TX2_OUTBOX = {"WORKERS": args.workers, "BACKOFF": 0.2, "MAX_BACKOFF": 2.0}
+    settings.TX2_HISTORY = {"ENABLED": False}
+
+    from tx2_backend.camera import get_camera_service, shutdown_camera_service
+    from tx2_backend.capture import CaptureLog, run_capture
+    from tx2_backend.outbox import get_outbox
+
+    get_camera_service().latest(timeout=30)
+    outbox = get_outbox()
+    rows = []
+
+    def captures(mode, server_state):
+        received = len(server.requests)
+        durations, results = [], []
+        for _ in range(args.items):
+            started = time.perf_counter()
+            results.append(run_capture("before", log=CaptureLog(echo=False), spool=(mode == "outbox")))
+            durations.append((time.perf_counter() - started) * 1000.0)
+        stats = summarize(durations)
+        row = {"mode": mode, "server": server_state, "capture_p50_ms": stats["p50_ms"],
+               "capture_max_ms": stats["max_ms"]}
+        if mode == "direct":
+            row["delivered"] = len(server.requests) - received
+            row["lost"] = sum(r["server_response"] is None for r in results)
+        return row, received
+
+    # Server up
+    rows.append(captures("direct", "up")[0])
+    row, received = captures("outbox", "up")
+    wait_drained(outbox)
+    row["delivered"], row["lost"] = len(server.requests) - received, 0
+    rows.append(row)
+
+    # Server down: direct uploads block and are lost, spooled ones wait
+    server.stop()
+    rows.append(captures("direct", "down")[0])
+    row, received = captures("outbox", "down")
+    time.sleep(args.outage)
+
+    server.start()
+    restarted = time.time()
+    stats = wait_drained(outbox)
+    row["delivered"], row["lost"] = len(server.requests) - received, stats["failed"]
+    sent_at = sorted(e["sent_at"] for e in outbox.recent(args.items) if e["sent_at"])
+    rows.append(row)
+    shutdown_camera_service()
+    outbox.stop()
+    server.stop()
+
+    print_table(rows, ["mode", "server", "capture_p50_ms", "capture_max_ms", "delivered", "lost"])
+    upload_s = args.latency / 1000.0 + server.requests[-1]["bytes"] * 8 / ((args.bandwidth or 1e6) * 1e6)
+    drain_s = sent_at[-1] - sent_at[0]
+    print(f"\nserver back: first delivery after {sent_at[0] - restarted:.2f} s (backoff), "
+          f"remaining {len(sent_at) - 1} in {drain_s:.2f} s "
+          f"({(len(sent_at) - 1) / drain_s if drain_s else float('inf'):.2f} items/s; "
+          f"one upload takes {upload_s:.2f} s, {args.workers} drainer threads)")
+    print(f"duplicate deliveries: {server.duplicates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Live preview fan-out: CPU use and frame delivery vs number of viewers.
+
+Streams the MJPEG preview from a synthetic camera to --viewers clients at
+a time, a quarter of them slow (--slow-ms per frame), for --seconds each.
+Reports process CPU, frames encoded per second, and frames received per
+fast and slow viewer. Encodes per second and CPU should stay flat as
+viewers are added, and slow viewers should receive fewer frames rather
+than fall behind.
+
+    python benchmarks/bench_preview.py [--viewers 0 1 4 16 64] [--seconds 3] [--fps 15]
+"""
+import argparse
+import asyncio
+import time
+
+from _common import print_table
+
+import django
+
+django.setup()
+
+from tx2_backend.camera import CameraService, SyntheticSource
+from tx2_backend.preview import PreviewBroadcaster
+
+
+async def watch(broadcaster, counts, index, slow_s):
+    async for _ in broadcaster.stream():
+        counts[index] += 1
+        if slow_s:
+            await asyncio.sleep(slow_s)
+
+
+async def measure(broadcaster, viewers, seconds, slow_s):
+    counts = [0] * viewers
+    slow = set(range(0, viewers, 4))
+    tasks = [asyncio.ensure_future(watch(broadcaster, counts, i, slow_s if i in slow else 0))
+             for i in range(viewers)]
+    await asyncio.sleep(0.5)  # let the encoder pick up
+
+    encoded, cpu, wall = broadcaster.encoded, time.process_time(), time.perf_counter()
+    start_counts = list(counts)
+    await asyncio.sleep(seconds)
+    encoded = broadcaster.encoded - encoded
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    received = [c - s for c, s in zip(counts, start_counts)]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fast = [r for i, r in enumerate(received) if i not in slow]
+    slow_received = [r for i, r in enumerate(received) if i in slow]
+    return {
+        "viewers": viewers,
+        "cpu_pct": cpu / wall * 100.0,
+        "encodes_per_s": encoded / wall,
+        "fast_fps": sum(fast) / len(fast) / wall if fast else None,
+        "slow_fps": sum(slow_received) / len(slow_received) / wall if slow_received else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--viewers", type=int, nargs="+", default=[0, 1, 4, 16, 64])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--slow-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    service = CameraService(SyntheticSource(fps=30))
+    service.start()
+    service.latest(timeout=30)
+    broadcaster = PreviewBroadcaster(service, fps=args.fps)
+
+    rows = [asyncio.run(measure(broadcaster, n, args.seconds, args.slow_ms / 1000.0)) for n in args.viewers]
+    service.stop()
+    print_table(rows, ["viewers", "cpu_pct", "encodes_per_s", "fast_fps", "slow_fps"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Micro-benchmarks for every capture pipeline stage on synthetic frames.
+
+Times each stage on its own and the whole chain, for several hole
+fractions, and reports mean / p50 / p99 and peak traced memory. Results are
+written as JSON so runs can be compared (--compare a previous file); no
+camera or network is used.
+
+    python benchmarks/bench_stages.py [--repeat 30] [--holes 0.05 0.15 0.3]
+        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+
+from _common import print_table, summarize, time_calls
+
+import django
+
+django.setup()
+
+import cv2
+import numpy as np
+
+from tx2_backend.capture import save_depth_and_rgb, telea_inpaint_and_save
+from tx2_backend.synthetic import synthetic_frame
+from tx2_backend.upload import UploadClient
+
+
+def quiet(*parts):
+    pass
+
+
+def build_stages(frames, media_dir):
+    """Return {stage name: zero-argument callable} cycling over `frames`."""
+    client = UploadClient("http://127.0.0.1:9/api/segment")
+    state = {"i": 0}
+    inpainted = [telea_inpaint_and_save(d, media_dir=media_dir, log=quiet) for d, _ in frames]
+    pngs = [cv2.imencode(".png", c)[1].tobytes() for _, c in frames]
+
+    def pick():
+        state["i"] = (state["i"] + 1) % len(frames)
+        return state["i"]
+
+    def save():
+        depth, color = frames[pick()]
+        save_depth_and_rgb(depth, color, media_dir=media_dir, log=quiet)
+
+    def inpaint():
+        telea_inpaint_and_save(frames[pick()][0], media_dir=media_dir, log=quiet)
+
+    def jpeg_encode():
+        cv2.imencode(".jpg", frames[pick()][1])
+
+    def payload():
+        i = pick()
+        client.prepare("before", pngs[i], inpainted[i], client.compression)
+
+    def pipeline():
+        depth, color = frames[pick()]
+        rgb_png = save_depth_and_rgb(depth, color, media_dir=media_dir, log=quiet)
+        depth_inpainted = telea_inpaint_and_save(depth, media_dir=media_dir, log=quiet)
+        client.prepare("before", rgb_png, depth_inpainted, client.compression)
+
+    return {
+        "save_depth_and_rgb": save,
+        "telea_inpaint_and_save": inpaint,
+        "jpeg_encode": jpeg_encode,
+        "upload_payload": payload,
+        "pipeline": pipeline,
+    }
+
+
+def peak_memory_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--holes", type=float, nargs="+", default=[0.05, 0.15, 0.3])
+    parser.add_argument("--frames", type=int, default=4, help="distinct frames per hole fraction")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    media_dir = tempfile.mkdtemp(prefix="tx2-bench-")
+    rng = np.random.default_rng(0)
+    rows = []
+    for hole_fraction in args.holes:
+        frames = [synthetic_frame(hole_fraction=hole_fraction, rng=rng) for _ in range(args.frames)]
+        for stage, fn in build_stages(frames, media_dir).items():
+            row = {"stage": stage, "holes": hole_fraction}
+            row.update(summarize(time_calls(fn, args.repeat, warmup=2)))
+            row["peak_kb"] = peak_memory_kb(fn)
+            rows.append(row)
+
+    columns = ["stage", "holes", "n", "mean_ms", "p50_ms", "p99_ms", "peak_kb"]
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["stage"], r["holes"]): r for r in json.load(f)["results"]}
+        for row in rows:
+            base = baseline.get((row["stage"], row["holes"]))
+            if base:
+                row["vs_baseline"] = row["mean_ms"] / base["mean_ms"]
+        columns.append("vs_baseline")
+    print_table(rows, columns)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": time.time(),
+                    "platform": platform.platform(),
+                    "machine": platform.machine(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "opencv": cv2.__version__,
+                    "repeat": args.repeat,
+                },
+                "results": rows,
+            }, f, indent=2)
+        print(f"Saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
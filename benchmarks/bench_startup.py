@@ -0,0 +1,101 @@
+"""
+Startup cost: import time of the URLconf and latency of the first request.
+
+Each measurement runs in a fresh interpreter. "import" rows time
+django.setup() plus importing the URLconf, which is what every manage.py
+command pays. They compare the lazy capture imports against importing the
+capture stack eagerly, which the views used to do. "request" rows time
+process startup and the first few meal captures with and without the
+warm-up that TX2_WARMUP runs in a server process's AppConfig.ready().
+
+    python benchmarks/bench_startup.py [--runs 5] [--requests 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from _common import print_table, summarize
+
+HEAVY = ("cv2", "numpy", "requests", "pyrealsense2")
+
+
+def child(mode, requests, warmup):
+    import tempfile
+
+    started = time.perf_counter()
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.TX2_MEDIA_ROOT = scratch
+    settings.TX2_SHARED_DB = f"{scratch}/bench.sqlite3"
+    import tx2_backend.urls  # noqa: F401
+    if mode == "eager":
+        import tx2_backend.batch, tx2_backend.jobs, tx2_backend.preview, tx2_backend.weight  # noqa: F401,E401
+    if warmup:
+        from tx2_backend.apps import warm_up
+
+        warm_up(log=lambda *args: None)
+    result = {"startup_ms": (time.perf_counter() - started) * 1000.0,
+              "heavy": sorted(m for m in HEAVY if m in sys.modules)}
+
+    if requests:
+        from django.test import Client
+
+        client = Client()
+        result["requests_ms"] = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get("/api/capture/meal/?save=0")
+            assert response.status_code == 200, response.status_code
+            result["requests_ms"].append((time.perf_counter() - started) * 1000.0)
+    print(json.dumps(result))
+
+
+def spawn(mode, requests=0, warmup=False):
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--requests", str(requests)]
+    if warmup:
+        command.append("--warmup")
+    out = subprocess.run(
+        command, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=3)
+    parser.add_argument("--child", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.requests, args.warmup)
+
+    rows = []
+    for mode in ("lazy", "eager"):
+        runs = [spawn(mode) for _ in range(args.runs)]
+        stats = summarize([r["startup_ms"] for r in runs])
+        rows.append({"case": f"import ({mode})", "startup_ms": stats["p50_ms"],
+                     "heavy_loaded": ",".join(runs[0]["heavy"]) or "-"})
+
+    for warmup in (False, True):
+        runs = [spawn("lazy", args.requests, warmup) for _ in range(args.runs)]
+        row = {"case": f"request (warm-up {'on' if warmup else 'off'})",
+               "startup_ms": summarize([r["startup_ms"] for r in runs])["p50_ms"],
+               "first_ms": summarize([r["requests_ms"][0] for r in runs])["p50_ms"]}
+        if args.requests > 1:
+            row["next_ms"] = summarize([ms for r in runs for ms in r["requests_ms"][1:]])["p50_ms"]
+        rows.append(row)
+
+    print_table(rows, ["case", "startup_ms", "heavy_loaded", "first_ms", "next_ms"])
+
+
+if __name__ == "__main__":
+    main()
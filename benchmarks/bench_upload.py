@@ -0,0 +1,65 @@
+"""
+Upload time and bytes per capture: one-off requests.post vs the pooled,
+compressed UploadClient, against a local stand-in server.
+
+The stand-in throttles to --bandwidth Mbit/s with --latency ms per request
+to roughly mimic the dev tunnel.
+
+    python benchmarks/bench_upload.py [--repeat 10] [--bandwidth 20] [--latency 30]
+"""
+import argparse
+
+from _common import print_table, summarize, time_calls
+from _standin_server import StandInServer
+
+import cv2
+import numpy as np
+import requests
+
+from tx2_backend.depth_io import depth_to_csv_bytes
+from tx2_backend.inpaint import inpaint_depth
+from tx2_backend.synthetic import synthetic_frame
+from tx2_backend.upload import UploadClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="Mbit/s, 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=30.0, help="ms per request")
+    args = parser.parse_args()
+
+    depth, color = synthetic_frame(rng=0)
+    depth = inpaint_depth(depth)
+    rgb_png = cv2.imencode(".png", color)[1].tobytes()
+
+    server = StandInServer(args.bandwidth or None, args.latency).start()
+    rows = []
+
+    def one_off():
+        files = {
+            "rgb_image": ("rgb_image.png", rgb_png, "image/png"),
+            "depth_csv": ("inpainted_depth.csv", depth_to_csv_bytes(depth), "text/csv"),
+        }
+        requests.post(server.base_url + "/before", files=files, timeout=(5, 120)).raise_for_status()
+
+    for mode, compression, send in (
+        ("one-off post, plain csv", None, one_off),
+        ("pooled, plain csv", None, None),
+        ("pooled, gzip csv", "gzip", None),
+    ):
+        client = UploadClient(server.base_url, compression=compression)
+        if send is None:
+            send = lambda c=client: c.send("before", rgb_png, depth).raise_for_status()
+        server.requests.clear()
+        stats = summarize(time_calls(send, args.repeat))
+        rows.append(dict(mode=mode, kb_per_capture=np.mean([r["bytes"] for r in server.requests]) / 1024.0,
+                         **stats))
+        client.close()
+
+    server.stop()
+    print_table(rows, ["mode", "n", "mean_ms", "p50_ms", "max_ms", "kb_per_capture"])
+
+
+if __name__ == "__main__":
+    main()
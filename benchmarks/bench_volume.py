@@ -0,0 +1,94 @@
+"""
+On-device volume estimate: accuracy and cost, direct and through the endpoint.
+
+Builds a synthetic tray (before), removes one food mound of known size
+(after), and estimates the consumed volume over the auto-detected tray ROI
+and over the whole frame. The true volume is the space between the two
+noise-free surfaces. The same pair is then stored as media sessions and
+fetched from /api/capture/volume/, first computed and then from the
+cache.
+
+    python benchmarks/bench_volume.py [--repeat 20] [--peak 30] [--radius 45]
+"""
+import argparse
+import json
+import tempfile
+
+from _common import print_table, summarize, time_calls
+
+import django
+
+django.setup()
+
+import numpy as np
+from django.conf import settings
+from django.test import Client
+
+from tx2_backend.camera import default_intrinsics
+from tx2_backend.depth_io import save_depth
+from tx2_backend.synthetic import synthetic_scene, synthetic_sequence
+from tx2_backend.volume import estimate_volume
+
+
+def store_session(store, kind, depth, intrinsics):
+    session = store.open_session(kind)
+    save_depth(session.path_for("inpainted_depth.npy"), depth)
+    session.write("camera.json", json.dumps({"intrinsics": intrinsics._asdict(), "depth_scale": 0.001}).encode())
+    session.close()
+    return session.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--peak", type=float, default=30.0, help="Mound height in mm")
+    parser.add_argument("--radius", type=float, default=45.0, help="Mound radius (sigma) in pixels")
+    args = parser.parse_args()
+
+    scene = synthetic_scene(rng=1)
+    height, width = scene.shape
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    mound = args.peak * np.exp(-((xx - width / 2) ** 2 + (yy - height / 2) ** 2) / (2 * args.radius ** 2))
+    intrinsics = default_intrinsics(width, height)
+
+    # Fresh sensor noise in each frame, no holes (the stored depth is inpainted)
+    before = synthetic_sequence(scene - mound, 1, hole_fraction=0, rng=2)[0].astype(np.float32)
+    after = synthetic_sequence(scene, 1, hole_fraction=0, rng=3)[0].astype(np.float32)
+    z_after, z_before = scene * 0.001, (scene - mound) * 0.001
+    truth_ml = float(((z_after ** 3 - z_before ** 3) / (3 * intrinsics.fx * intrinsics.fy)).sum()) * 1e6
+
+    rows = []
+    for label, roi in (("auto ROI", "auto"), ("full frame", None)):
+        result = estimate_volume(before, after, intrinsics, roi=roi)
+        stats = summarize(time_calls(lambda: estimate_volume(before, after, intrinsics, roi=roi), args.repeat))
+        rows.append({"case": label, "mean_ms": stats["mean_ms"], "p99_ms": stats["p99_ms"],
+                     "consumed_ml": result["consumed_ml"], "truth_ml": truth_ml,
+                     "error_pct": (result["consumed_ml"] - truth_ml) / truth_ml * 100.0,
+                     "area_cm2": result["consumed_area_cm2"]})
+
+    scratch = tempfile.mkdtemp(prefix="tx2-bench-")
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.TX2_MEDIA_ROOT = scratch
+    settings.TX2_SHARED_DB = f"{scratch}/bench.sqlite3"
+    from tx2_backend.media_store import get_media_store
+
+    store = get_media_store()
+    before_id = store_session(store, "before", before, intrinsics)
+    after_id = store_session(store, "after", after, intrinsics)
+    client = Client()
+    url = f"/api/capture/volume/?before={before_id}&after={after_id}"
+    for label in ("endpoint (computed)", "endpoint (cached)"):
+        response = client.get(url)
+        result = response.json()
+        assert response.status_code == 200 and result["cached"] == (label == "endpoint (cached)"), result
+        durations = time_calls(lambda: client.get(url), args.repeat, warmup=0) if result["cached"] else []
+        rows.append({"case": label, "mean_ms": summarize(durations)["mean_ms"] if durations else None,
+                     "consumed_ml": result["consumed_ml"], "truth_ml": truth_ml,
+                     "error_pct": (result["consumed_ml"] - truth_ml) / truth_ml * 100.0,
+                     "area_cm2": result["consumed_area_cm2"]})
+
+    print_table(rows, ["case", "mean_ms", "p99_ms", "consumed_ml", "truth_ml", "error_pct", "area_cm2"])
+
+
+if __name__ == "__main__":
+    main()
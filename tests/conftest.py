@@ -0,0 +1,39 @@
+"""
+Shared setup for the test suite.
+
+Tests use the synthetic camera and fake devices, so no camera or network
+is needed, and the `scratch` fixture points the shared SQLite tables and
+media files at a temporary directory, so db.sqlite3 and media/ are never
+touched. Run from the project root:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tx2_backend.settings")
+os.environ.setdefault("TX2_CAMERA_SOURCE", "synthetic")
+os.environ["TX2_HISTORY"] = "0"  # no capture history rows in the project database
+
+import django
+
+django.setup()
+
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    """A temporary directory holding the shared database and media root."""
+    with override_settings(
+        TX2_SHARED_DB=str(tmp_path / "shared.sqlite3"),
+        TX2_MEDIA_ROOT=str(tmp_path / "media"),
+        ALLOWED_HOSTS=["testserver"],
+    ):
+        yield tmp_path
@@ -0,0 +1,92 @@
+"""CameraArbiter: no overlapping captures, coalescing, bounded waits."""
+import threading
+import time
+
+import pytest
+
+from tx2_backend.arbiter import CameraArbiter, FakeDevice
+from tx2_backend.errors import CameraBusyError, CameraError
+
+
+def run_clients(request_fn, clients, requests):
+    """`clients` threads, released together, each calling request_fn() `requests` times; (results, errors)."""
+    results, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client():
+        barrier.wait()
+        for _ in range(requests):
+            try:
+                result = request_fn()
+            except CameraError as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_fake_device_detects_overlap():
+    # Without the arbiter concurrent captures collide, so the tests below can see overlaps
+    device = FakeDevice(latency=0.05)
+    _, errors = run_clients(device.capture, clients=8, requests=2)
+    assert errors
+
+
+def test_captures_never_overlap():
+    device = FakeDevice(latency=0.02)
+    arbiter = CameraArbiter(device.capture, timeout=5.0)
+    results, errors = run_clients(arbiter.capture, clients=16, requests=5)
+    assert errors == []
+    assert len(results) == 80
+    assert arbiter.physical_captures == device.captures
+    assert arbiter.physical_captures + arbiter.coalesced == 80
+
+
+def test_concurrent_requests_share_one_capture():
+    device = FakeDevice(latency=0.3)
+    arbiter = CameraArbiter(device.capture, timeout=5.0)
+    results, errors = run_clients(arbiter.capture, clients=8, requests=1)
+    assert errors == []
+    assert device.captures == 1
+    assert arbiter.coalesced == 7
+    assert len({result["index"] for result in results}) == 1
+
+
+def test_kinds_are_captured_separately():
+    device = FakeDevice(latency=0.05)
+    arbiter = CameraArbiter(device.capture, timeout=5.0)
+    kinds = iter(["rgbd", "color"])
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            kind = next(kinds)
+        return arbiter.capture(kind)
+
+    results, errors = run_clients(request, clients=2, requests=1)
+    assert errors == []
+    assert sorted(result["kind"] for result in results) == ["color", "rgbd"]
+    assert device.captures == 2
+
+
+def test_wait_for_a_busy_device_is_bounded():
+    device = FakeDevice(latency=0.5)
+    arbiter = CameraArbiter(device.capture, timeout=5.0)
+    leader = threading.Thread(target=arbiter.capture, args=("rgbd",))
+    leader.start()
+    while not arbiter.physical_captures:
+        time.sleep(0.005)
+    # Another kind can't join the running capture and must wait for the device
+    with pytest.raises(CameraBusyError):
+        arbiter.capture("color", timeout=0.1)
+    leader.join()
+    assert device.captures == 1
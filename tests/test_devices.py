@@ -0,0 +1,110 @@
+"""DevicePool on fake cameras: parallel devices, routing and segment pins."""
+import sys
+import threading
+import time
+
+import pytest
+from django.conf import settings
+from django.test import Client, override_settings
+
+from tx2_backend.devices import enumerate_devices, fake_pool, shutdown_device_pool
+from tx2_backend.errors import CameraError, UnknownCameraError
+
+
+def test_named_cameras_capture_in_parallel():
+    pool = fake_pool([0.2] * 4)
+    errors = []
+
+    def capture(serial):
+        try:
+            pool.capture("rgbd", serial)
+        except CameraError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=capture, args=(serial,)) for serial in pool.serials]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    assert errors == []
+    assert elapsed < 0.6  # one after another would take 0.8 s
+    assert [device["physical_captures"] for device in pool.status()] == [1, 1, 1, 1]
+
+
+def test_least_busy_avoids_a_slow_camera():
+    pool = fake_pool([0.02, 0.02, 0.2])
+    errors = []
+    deadline = time.monotonic() + 1.0
+
+    def client():
+        while time.monotonic() < deadline:
+            try:
+                pool.capture("rgbd")
+            except CameraError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=client) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    requests = {device["serial"]: device["requests"] for device in pool.status()}
+    assert errors == []
+    assert requests["fake-2"] < 0.15 * sum(requests.values())
+
+
+def test_round_robin_takes_turns():
+    pool = fake_pool([0.0] * 3, routing="round_robin")
+    serials = [pool.capture("rgbd")[0].serial for _ in range(6)]
+    assert serials == ["fake-0", "fake-1", "fake-2"] * 2
+
+
+def test_pinned_captures_stay_on_one_camera():
+    pool = fake_pool([0.0] * 2)
+    first = pool.capture("rgbd", pin="ward1/bed3")[0].serial
+    # Other traffic in between makes the other camera the least recently used
+    other = pool.capture("rgbd")[0].serial
+    assert other != first
+    assert pool.capture("rgbd", pin="ward1/bed3")[0].serial == first
+    assert pool.pinned("ward1/bed3") == first
+
+
+def test_named_camera_wins_over_pin():
+    pool = fake_pool([0.0] * 2)
+    first = pool.capture("rgbd", pin="ward1/bed3")[0].serial
+    other = next(serial for serial in pool.serials if serial != first)
+    assert pool.capture("rgbd", other, pin="ward1/bed3")[0].serial == other
+    assert pool.pinned("ward1/bed3") == other
+
+
+def test_unknown_camera():
+    pool = fake_pool([0.0])
+    with pytest.raises(UnknownCameraError):
+        pool.capture("rgbd", "nope")
+    assert pool.status()[0]["inflight"] == 0
+
+
+@pytest.fixture
+def no_sdk(monkeypatch):
+    """The RealSense source configured on a host without pyrealsense2."""
+    monkeypatch.setitem(sys.modules, "pyrealsense2", None)  # import raises ImportError
+    shutdown_device_pool()
+    with override_settings(TX2_CAMERA={**settings.TX2_CAMERA, "SOURCE": "realsense", "DEVICES": None}):
+        yield
+    shutdown_device_pool()
+
+
+def test_missing_sdk_is_a_camera_error(no_sdk):
+    with pytest.raises(CameraError, match="pyrealsense2 is not installed"):
+        enumerate_devices("realsense")
+
+
+@pytest.mark.parametrize("path", ["/api/cameras/", "/api/capture/preview/", "/api/capture/meal/?save=0"])
+def test_views_answer_503_without_the_sdk(scratch, no_sdk, path):
+    response = Client().get(path)
+    assert response.status_code == 503
+    assert response.json()["message"] == "pyrealsense2 is not installed"
@@ -0,0 +1,88 @@
+"""Bounded executors: a full pool rejects at once, and views answer 503 + Retry-After."""
+import asyncio
+import threading
+import time
+
+import pytest
+from django.test import AsyncClient, Client
+
+from _common import summarize
+from tx2_backend import executors
+from tx2_backend.camera import get_camera_service, shutdown_camera_service
+from tx2_backend.executors import BoundedExecutor, ExecutorFullError
+
+
+@pytest.fixture
+def blocked():
+    """An event the submitted calls wait on; set at the end of the test."""
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+def test_full_executor_rejects_at_once(blocked):
+    executor = BoundedExecutor("test", workers=1, max_queue=1, retry_after=3)
+    running = [executor.submit(blocked.wait), executor.submit(blocked.wait)]
+    with pytest.raises(ExecutorFullError) as e:
+        executor.submit(blocked.wait)
+    assert e.value.retry_after == 3
+
+    blocked.set()
+    for future in running:
+        future.result(timeout=5)
+    # Finished calls give their slots back
+    assert executor.submit(lambda: 42).result(timeout=5) == 42
+
+
+def test_view_answers_503_with_retry_after(scratch, blocked, monkeypatch):
+    executor = BoundedExecutor("io", workers=1, max_queue=0, retry_after=7)
+    executor.submit(blocked.wait)
+    monkeypatch.setitem(executors._executors, "io", executor)
+
+    response = Client().post("/api/weight/set/", {"weight": 250.0}, content_type="application/json")
+    assert response.status_code == 503
+    assert response["Retry-After"] == "7"
+    assert response.json()["status"] == "error"
+
+
+def test_view_runs_when_there_is_room(scratch, monkeypatch):
+    monkeypatch.setitem(executors._executors, "io", BoundedExecutor("io", workers=1, max_queue=0))
+
+    response = Client().post("/api/weight/set/", {"weight": 250.0}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["received"] == 1
+
+
+@pytest.fixture
+def camera():
+    get_camera_service().latest(timeout=30)
+    yield
+    shutdown_camera_service()
+
+
+async def open_loop(client, path, rate, seconds):
+    """Requests sent at `rate` per second however slow the answers; (status, Retry-After, ms) each."""
+    async def one():
+        started = time.perf_counter()
+        response = await client.get(path)
+        return response.status_code, response.get("Retry-After"), (time.perf_counter() - started) * 1000.0
+
+    tasks = []
+    for _ in range(int(rate * seconds)):
+        tasks.append(asyncio.ensure_future(one()))
+        await asyncio.sleep(1.0 / rate)
+    return await asyncio.gather(*tasks)
+
+
+def test_latency_stays_bounded_under_overload(scratch, camera, monkeypatch):
+    # The configured executors, fresh for this test
+    monkeypatch.setattr(executors, "_executors", {})
+    results = asyncio.run(open_loop(AsyncClient(), "/api/capture/meal/?save=0", rate=300, seconds=1.5))
+
+    assert {status for status, _, _ in results} <= {200, 503}
+    ok = [ms for status, _, ms in results if status == 200]
+    busy = [retry_after for status, retry_after, _ in results if status == 503]
+    assert ok and busy  # served what it could, shed the rest
+    assert all(busy)
+    # Unbounded queues let this grow with the length of the run (about 0.8 s at 3 s)
+    assert summarize(ok)["p99_ms"] < 1000.0
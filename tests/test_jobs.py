@@ -0,0 +1,111 @@
+"""Capture jobs: status is shared between worker processes through the SQLite store."""
+import threading
+import time
+
+import pytest
+from django.test import Client
+
+from tx2_backend import jobs
+from tx2_backend.errors import QueueFullError
+from tx2_backend.jobs import FAILED, SUCCEEDED, JobQueue, JobStore
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Stands in for the capture pipeline: each job runs one stage, then waits for the event."""
+    release = threading.Event()
+
+    def run_capture(capture_type, log, timer, segment_url=None, patient_id=None, camera=None):
+        with timer.stage("capture"):
+            release.wait(5)
+        if capture_type == "broken":
+            raise RuntimeError("camera unplugged")
+        return {"camera": "synthetic-0", "session_id": "s1", "server_response": {"ok": True}}
+
+    monkeypatch.setattr(jobs, "run_capture", run_capture)
+    yield release
+    release.set()
+
+
+@pytest.fixture
+def queues(scratch, release):
+    """Builds JobQueues whose jobs all finish before the scratch database goes away."""
+    built = []
+
+    def build(**kwargs):
+        built.append(JobQueue(workers=1, **kwargs))
+        return built[-1]
+
+    yield build
+    release.set()
+    for queue in built:
+        queue._executor.shutdown(wait=True)
+
+
+def wait_for(queue, job_id, condition, timeout=5.0):
+    """The job's status from `queue` once condition(status) holds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job is not None and condition(job):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} never got there: {queue.status(job_id)}")
+
+
+def finished(job):
+    return job["status"] in (SUCCEEDED, FAILED)
+
+
+def test_other_workers_see_progress_and_result(queues, release):
+    # Two queues on one database, as in two Gunicorn/Uvicorn workers
+    worker, other = queues(), queues()
+    job = worker.submit("before", "http://server/ward1/bed3/before")
+
+    running = wait_for(other, job.id, lambda job: job["stage"] == "capture")
+    assert running["status"] == "running"
+    assert running["received_url"] == "http://server/ward1/bed3/before"
+
+    release.set()
+    done = wait_for(other, job.id, finished)
+    assert done["status"] == SUCCEEDED
+    assert done["session_id"] == "s1"
+    assert done["server_response"] == {"ok": True}
+    assert "capture" in done["timings_ms"]
+
+
+def test_failed_job_reports_its_error(queues, release):
+    worker, other = queues(), queues()
+    release.set()
+    job = worker.submit("broken")
+    done = wait_for(other, job.id, finished)
+    assert done["status"] == FAILED
+    assert done["error"] == "camera unplugged"
+
+
+def test_status_endpoint_answers_for_jobs_of_another_worker(queues, release, monkeypatch):
+    monkeypatch.setattr(jobs, "_queue", queues())  # this process's queue
+    release.set()
+    job = queues().submit("before")
+    wait_for(jobs._queue, job.id, finished)
+
+    response = Client().get(f"/api/capture/jobs/{job.id}/")
+    assert response.status_code == 200
+    assert response.json()["job_id"] == job.id
+    assert Client().get("/api/capture/jobs/nope/").status_code == 404
+
+
+def test_pending_jobs_are_bounded(queues):
+    queue = queues(max_pending=2)
+    queue.submit("before")
+    queue.submit("before")
+    with pytest.raises(QueueFullError):
+        queue.submit("before")
+
+
+def test_store_keeps_the_newest_finished_jobs(queues, release):
+    queue = queues(store=JobStore(history=3))
+    release.set()
+    ids = [queue.submit("before").id for _ in range(6)]
+    queue._executor.shutdown(wait=True)
+    assert [queue.status(job_id) is not None for job_id in ids] == [False] * 3 + [True] * 3
@@ -0,0 +1,148 @@
+"""Outbox against the stand-in server: delivery across a restart, exactly once per key."""
+import os
+import sqlite3
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from _standin_server import StandInServer
+from tx2_backend.delta import build_delta
+from tx2_backend.depth_io import save_depth
+from tx2_backend.outbox import FAILED, SENT, Outbox
+from tx2_backend.upload import UploadClient
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(latency_ms=20).start()
+    yield server
+    server.stop()
+
+
+# Claims by UPDATE ... RETURNING, and by the transaction used before SQLite 3.35
+CLAIMS = pytest.mark.parametrize("returning", [True, False], ids=["returning", "transaction"])
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "transaction"])
+def outbox(scratch, server, request):
+    client = UploadClient(server.base_url, retries=0, timeout=(1, 10))
+    outbox = Outbox(db_path=str(scratch / "outbox.sqlite3"), workers=2, backoff=0.05, max_backoff=0.2,
+                    lease=2.0, poll=0.1, client=client, returning=request.param)
+    yield outbox
+    outbox.stop(timeout=5)
+    client.close()
+
+
+def write_capture(directory, depth_mm=500.0, delta=None):
+    """rgb_image.png and inpainted_depth.npy of a small frame; returns their paths."""
+    os.makedirs(directory)
+    rgb_path = os.path.join(directory, "rgb_image.png")
+    depth_path = os.path.join(directory, "inpainted_depth.npy")
+    cv2.imwrite(rgb_path, np.full((48, 64, 3), 128, dtype=np.uint8))
+    save_depth(depth_path, np.full((48, 64), depth_mm, dtype=np.float32))
+    if delta is not None:
+        delta.save(directory)
+    return rgb_path, depth_path
+
+
+def wait_drained(outbox, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = outbox.stats()
+        if stats["pending"] == 0 and stats["sending"] == 0:
+            return stats
+        time.sleep(0.02)
+    raise AssertionError(f"Outbox not drained: {outbox.stats()}")
+
+
+def test_delivers_everything_after_a_server_restart(scratch, server, outbox):
+    server.stop()
+    ids = [outbox.enqueue("before", *write_capture(str(scratch / f"capture{i}"))) for i in range(8)]
+    time.sleep(0.5)  # the drainers fail and back off
+    assert outbox.stats()["sent"] == 0
+    assert max(outbox.get(entry_id)["attempts"] for entry_id in ids) >= 1
+
+    server.start()  # same port
+    stats = wait_drained(outbox)
+    assert stats["sent"] == 8 and stats["failed"] == 0
+    keys = [request["headers"]["Idempotency-Key"] for request in server.requests]
+    assert sorted(keys) == sorted(ids)
+    assert server.duplicates == 0
+
+
+def test_resend_after_a_lost_reply_is_dropped_by_key(scratch, server, outbox):
+    # The request reached the server, but the process died before recording it
+    rgb_path, depth_path = write_capture(str(scratch / "capture"))
+    entry_id = outbox.enqueue("before", rgb_path, depth_path)
+    wait_drained(outbox)
+    assert outbox.get(entry_id)["status"] == SENT
+    with open(rgb_path, "rb") as f:
+        outbox.client.send("before", f.read(), np.load(depth_path), headers={"Idempotency-Key": entry_id})
+    assert server.duplicates == 1
+    assert len(server.requests) == 1
+
+
+def test_rejected_delta_falls_back_to_the_full_frame(scratch, outbox):
+    rejecting = StandInServer(delta_status=409).start()
+    outbox.client.base_url = rejecting.base_url.rstrip("/")
+    before_rgb = np.full((48, 64, 3), 128, dtype=np.uint8)
+    after_rgb = before_rgb.copy()
+    after_rgb[10:30, 10:30] = 255
+    before_depth = np.full((48, 64), 500.0, dtype=np.float32)
+    after_depth = before_depth.copy()
+    after_depth[10:30, 10:30] = 520.0
+    delta = build_delta("before-id", "after-id", before_depth, after_depth, before_rgb, after_rgb,
+                        min_region=10)
+    assert delta is not None
+
+    try:
+        entry_id = outbox.enqueue("after", *write_capture(str(scratch / "capture"), delta=delta))
+        wait_drained(outbox)
+        assert outbox.get(entry_id)["status"] == SENT
+        modes = [(r["headers"].get("X-Upload-Mode"), r["headers"]["Idempotency-Key"]) for r in rejecting.requests]
+        assert modes == [("delta", f"{entry_id}:delta"), (None, entry_id)]
+    finally:
+        rejecting.stop()
+
+
+def test_unreachable_server_is_retried_not_failed(scratch, outbox):
+    outbox.client.base_url = "http://127.0.0.1:1/api/segment"  # nothing listens
+    entry_id = outbox.enqueue("before", *write_capture(str(scratch / "capture")))
+    time.sleep(0.3)
+    entry = outbox.get(entry_id)
+    assert entry["status"] != FAILED
+    assert entry["attempts"] >= 2
+
+
+@CLAIMS
+def test_concurrent_claims_take_each_entry_once(scratch, returning):
+    # Two outboxes on one database, as in two worker processes, four claimers each
+    db_path = str(scratch / "outbox.sqlite3")
+    outboxes = [Outbox(db_path=db_path, returning=returning) for _ in range(2)]
+    rgb_path, depth_path = write_capture(str(scratch / "capture"))
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO tx2_outbox (id, capture_type, rgb_path, depth_path, status, next_attempt_at, created_at)"
+        " VALUES (?, 'before', ?, ?, 'pending', 0, ?)",
+        [(f"e{i:03d}", rgb_path, depth_path, i) for i in range(100)],
+    )
+    conn.commit()
+    conn.close()
+
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer(outbox):
+        while (entry := outbox.claim()) is not None:
+            with lock:
+                claimed.append(entry[0])
+
+    threads = [threading.Thread(target=claimer, args=(outbox,)) for outbox in outboxes for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == [f"e{i:03d}" for i in range(100)]
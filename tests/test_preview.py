@@ -0,0 +1,70 @@
+"""Preview fan-out on a synthetic camera: one encode per frame however many viewers watch."""
+import asyncio
+import time
+
+import pytest
+
+from tx2_backend.camera import CameraService, SyntheticSource
+from tx2_backend.preview import PreviewBroadcaster
+
+FPS = 10.0
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = CameraService(SyntheticSource(width=320, height=240, fps=30, seed=0), warmup_frames=0)
+    service.start()
+    service.latest(timeout=30)
+    yield service
+    service.stop()
+
+
+async def watch(broadcaster, viewers, seconds):
+    """Frames received per viewer, and encodes per second, over `seconds`."""
+    counts = [0] * viewers
+
+    async def viewer(index):
+        async for _ in broadcaster.stream():
+            counts[index] += 1
+
+    tasks = [asyncio.ensure_future(viewer(i)) for i in range(viewers)]
+    await asyncio.sleep(0.5)  # let the encoder pick up
+    encoded, started = broadcaster.encoded, time.perf_counter()
+    counts[:] = [0] * viewers
+    await asyncio.sleep(seconds)
+    rate = (broadcaster.encoded - encoded) / (time.perf_counter() - started)
+    received = list(counts)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return received, rate
+
+
+def test_encodes_stay_flat_as_viewers_are_added(service):
+    broadcaster = PreviewBroadcaster(service, fps=FPS, max_dim=320)
+    rates = {}
+    for viewers in (1, 4, 16):
+        received, rates[viewers] = asyncio.run(watch(broadcaster, viewers, seconds=1.5))
+        assert min(received) > 0
+        assert broadcaster.viewers == 0
+    assert rates[1] <= FPS * 1.2
+    assert rates[16] == pytest.approx(rates[1], rel=0.25)
+
+
+def test_encoder_idles_without_viewers(service):
+    broadcaster = PreviewBroadcaster(service, fps=FPS, max_dim=320)
+    asyncio.run(watch(broadcaster, 2, seconds=0.5))
+    time.sleep(0.3)  # a frame in progress when the last viewer left
+    encoded = broadcaster.encoded
+    time.sleep(0.5)
+    assert broadcaster.encoded == encoded
+
+
+def test_blocking_stream_for_wsgi(service):
+    broadcaster = PreviewBroadcaster(service, fps=FPS, max_dim=320)
+    stream = broadcaster.stream_sync()
+    chunks = [next(stream) for _ in range(3)]
+    assert broadcaster.viewers == 1
+    stream.close()
+    assert broadcaster.viewers == 0
+    assert all(chunk.startswith(b"--frame\r\nContent-Type: image/jpeg") for chunk in chunks)
@@ -0,0 +1,84 @@
+"""Weight samples: kept in time order, back-dated and non-finite input rejected."""
+import numpy as np
+import pytest
+from django.test import Client
+
+from tx2_backend import weight
+from tx2_backend.weight import StabilityDetector, WeightMonitor, WeightSeries, WeightStore
+
+
+@pytest.fixture
+def monitor(scratch, monkeypatch):
+    """A fresh monitor behind the views, on the scratch database."""
+    monitor = WeightMonitor(WeightStore(), WeightSeries(64), StabilityDetector())
+    monkeypatch.setattr(weight, "_monitor", monitor)
+    return monitor
+
+
+def post(samples):
+    return Client().post("/api/weight/set/", {"samples": samples}, content_type="application/json")
+
+
+def test_batches_are_stored_in_time_order():
+    series = WeightSeries(8)
+    series.extend([3.0, 1.0, 2.0], [30.0, 10.0, 20.0])
+    series.extend([5.0, 4.0], [50.0, 40.0])
+    t, w = series.samples()
+    assert t.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert w.tolist() == [10.0, 20.0, 30.0, 40.0, 50.0]
+    assert series.samples(since=3.0)[1].tolist() == [40.0, 50.0]
+
+
+def test_back_dated_samples_are_dropped():
+    series = WeightSeries(8)
+    series.extend([10.0, 11.0], [1.0, 2.0])
+    kept_t, kept_w = series.extend([9.0, 11.0, 12.0], [0.0, 3.0, 4.0])
+    assert kept_t.tolist() == [11.0, 12.0]
+    assert kept_w.tolist() == [3.0, 4.0]
+    assert np.all(np.diff(series.samples()[0]) >= 0)
+
+
+def test_a_large_unsorted_batch_keeps_the_newest_samples():
+    series = WeightSeries(4)
+    series.extend([6.0, 1.0, 5.0, 2.0, 4.0, 3.0], [6.0, 1.0, 5.0, 2.0, 4.0, 3.0])
+    assert series.samples()[0].tolist() == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_out_of_order_batch_still_settles(scratch):
+    monitor = WeightMonitor(WeightStore(), WeightSeries(64), StabilityDetector(window_s=1.0, min_samples=5))
+    t = 1000.0 + np.arange(20) * 0.1
+    shuffled = np.random.default_rng(0).permutation(20)
+    accepted, event = monitor.ingest(t[shuffled].tolist(), np.full(20, 250.0)[shuffled].tolist())
+    assert accepted == 20
+    assert event["capture_type"] == "before"
+
+
+def test_view_reports_accepted_samples(monitor):
+    response = post([{"weight": 250.0, "timestamp": 1002.0}, {"weight": 251.0, "timestamp": 1001.0}])
+    assert response.json()["accepted"] == 2
+    assert WeightStore().get()["weight"] == 250.0  # the newest sample, not the last posted
+
+    response = post([{"weight": 1.0, "timestamp": 1000.0}, {"weight": 252.0, "timestamp": 1003.0}])
+    assert response.status_code == 200
+    assert response.json()["received"] == 2
+    assert response.json()["accepted"] == 1
+    assert monitor.series.samples()[1].tolist() == [251.0, 250.0, 252.0]
+
+
+@pytest.mark.parametrize("sample", [
+    {"weight": float("nan")},
+    {"weight": float("inf")},
+    {"weight": 250.0, "timestamp": float("-inf")},
+])
+def test_view_rejects_non_finite_values(monitor, sample):
+    response = post([{"weight": 250.0}, sample])
+    assert response.status_code == 400
+    assert len(monitor.series) == 0
+
+
+def test_store_bumps_the_sequence_on_each_write(scratch):
+    store = WeightStore()
+    assert store.get() == {"weight": 0.0, "updated_at": None, "seq": 0}
+    store.set(250.0, 1000.0)
+    store.set(240.0, 1001.0)
+    assert store.get() == {"weight": 240.0, "updated_at": 1001.0, "seq": 2}
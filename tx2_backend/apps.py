@@ -0,0 +1,82 @@
+"""
+App config for the capture backend.
+
+Nothing heavy happens at import time: the capture subsystem (OpenCV,
+NumPy, the RealSense SDK) loads on the first request that needs it, so
+`manage.py migrate/shell/check` stay fast and work without the SDK.
+
+With TX2_WARMUP on, a server process instead pays that cost in `ready()`,
+before it accepts traffic: it loads the modules, starts every camera, and
+runs one capture through inpainting and JPEG encoding, so the first real
+request is as fast as the rest.
+
+Server processes also start the upload outbox drainer, so uploads left
+over from before a restart go out without waiting for a new capture.
+"""
+import os
+import sys
+import time
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+SERVER_PROGRAMS = ("gunicorn", "uvicorn", "daphne", "hypercorn", "uwsgi")
+
+
+def _is_server_process():
+    """True under a WSGI/ASGI server and in the runserver child, not for other commands or scripts."""
+    program = os.path.basename(sys.argv[0])
+    if program in SERVER_PROGRAMS:
+        return True
+    if program != "manage.py" or len(sys.argv) < 2 or sys.argv[1] != "runserver":
+        return False
+    # With the autoreloader only the child (RUN_MAIN) serves requests
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
+def warm_up(log=print):
+    """Load the capture stack and run one dummy capture + encode; returns stage timings in ms."""
+    timings = {}
+
+    started = time.perf_counter()
+    from . import batch, jobs, preview, weight  # noqa: F401  (pull in cv2 / numpy / requests)
+    from .capture import INPAINT_OPTIONS, capture_realsense_image
+    from .devices import get_device_pool
+    from .inpaint import inpaint_depth
+    from .meal import encode_image, encode_options
+    timings["import"] = (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    for serial in get_device_pool().serials:
+        depth, color = capture_realsense_image(camera=serial)
+    timings["capture"] = (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    inpaint_depth(depth, **INPAINT_OPTIONS)
+    encode_image(color, *encode_options())
+    timings["process"] = (time.perf_counter() - started) * 1000.0
+
+    weight.get_weight_store()  # creates the shared table
+    log("🔥 Warm-up done: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
+    return timings
+
+
+class Tx2BackendConfig(AppConfig):
+    name = "tx2_backend"
+    verbose_name = "TX2 capture backend"
+
+    def ready(self):
+        if not _is_server_process():
+            return
+        from .outbox import get_outbox, outbox_config
+
+        if outbox_config()["ENABLED"]:
+            get_outbox().start()
+        if not getattr(settings, "TX2_WARMUP", False):
+            return
+        try:
+            warm_up()
+        except Exception as e:
+            # A missing camera must not stop the server; captures report 503
+            print(f"⚠ Warm-up failed: {e!r}")
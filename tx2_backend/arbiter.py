@@ -0,0 +1,125 @@
+"""
+Camera arbitration and request coalescing.
+
+Every capture endpoint goes through one `CameraArbiter` per device (the
+device pool in devices.py owns them):
+
+- physical captures on a device are serialised by a device lock;
+- requests for the same kind of frame that arrive while one is in flight
+  join it, so one physical capture serves all of them;
+- waiting is bounded, and a request that can't be served in time gets a
+  `CameraBusyError` instead of queueing forever.
+
+`FakeDevice` simulates capture latency (and detects overlapping access)
+so the arbiter can be exercised under load without a camera.
+"""
+import threading
+import time
+
+from .errors import CameraBusyError, CameraError
+from .metrics import CAMERA_REQUESTS
+
+
+class _Flight:
+    """One physical capture that any number of requests are waiting on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 1
+
+
+class CameraArbiter:
+    def __init__(self, capture_fn, timeout=5.0, name="camera"):
+        """`capture_fn(kind)` performs one physical capture and returns its result."""
+        self.capture_fn = capture_fn
+        self.timeout = timeout
+        self.name = name
+        self.physical_captures = 0
+        self.coalesced = 0
+        self._device_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def capture(self, kind="rgbd", timeout=None):
+        """
+        Return a capture of `kind`, sharing one already in flight for the
+        same kind if there is one. Raises CameraBusyError after `timeout`.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            flight = self._inflight.get(kind)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[kind] = _Flight()
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            self._lead(kind, flight, deadline)
+        elif not flight.done.wait(max(deadline - time.monotonic(), 0)):
+            CAMERA_REQUESTS.inc(kind=kind, outcome="timeout")
+            raise CameraBusyError(f"Timed out after {timeout:.1f}s waiting for {self.name}")
+
+        if flight.error is not None:
+            outcome = "timeout" if isinstance(flight.error, CameraBusyError) else "error"
+            CAMERA_REQUESTS.inc(kind=kind, outcome=outcome)
+            raise flight.error
+        CAMERA_REQUESTS.inc(kind=kind, outcome="captured" if leader else "coalesced")
+        return flight.result
+
+    def _lead(self, kind, flight, deadline):
+        try:
+            if not self._device_lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise CameraBusyError(f"{self.name} is busy")
+            try:
+                self.physical_captures += 1
+                flight.result = self.capture_fn(kind)
+            finally:
+                self._device_lock.release()
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Later arrivals start a new capture rather than get this one
+            with self._lock:
+                self._inflight.pop(kind, None)
+            flight.done.set()
+
+
+class FakeDevice:
+    """
+    Test double for a camera: each capture takes `latency` seconds and
+    fails if another capture is already running on the device.
+    """
+
+    def __init__(self, latency=0.05, serial="fake-0"):
+        self.latency = latency
+        self.serial = serial
+        self.captures = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def capture(self, kind="rgbd"):
+        with self._lock:
+            if self._active:
+                raise CameraError(f"Device {self.serial} busy")
+            self._active += 1
+            self.captures += 1
+            index = self.captures
+        try:
+            time.sleep(self.latency)
+            return {"serial": self.serial, "kind": kind, "index": index, "timestamp": time.time()}
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+def get_camera_arbiter(serial=None):
+    """The arbiter of the named camera in the device pool, or of the first one."""
+    from .devices import get_device_pool
+
+    return get_device_pool().device(serial).arbiter
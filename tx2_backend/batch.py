@@ -0,0 +1,195 @@
+"""
+Pipelined batch capture.
+
+A meal session needs several captures. Run one after another, the camera
+idles while a frame is inpainted and the CPU idles while it uploads. Here
+each stage has its own thread, joined by bounded queues:
+
+    capture --> process (save + inpaint) --> upload
+
+so frame k+1 is captured while frame k is inpainted and frame k-1 uploads,
+and a batch takes about as long as its slowest stage times the item
+count. Uploads mostly wait on the server, so that stage can run several
+workers (`TX2_CAPTURE_BATCH_UPLOADS`). The queues hold at most `queue_size`
+items between stages, which bounds the frames in memory. Results come back
+per item as soon as each finishes, tagged with the item's index, through
+a blocking iterator (WSGI) or an async one (ASGI), which waits for each
+result on a thread of its own instead of the event loop.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .capture import CaptureLog, CaptureRun, capture_type_from_url
+from .jobs import QueueFullError
+
+_DONE = object()
+
+_slots = threading.BoundedSemaphore(getattr(settings, "TX2_CAPTURE_BATCH_CONCURRENCY", 1))
+
+
+def _item_result(index, segment_url, run, error):
+    result = {
+        "index": index,
+        "segment_url": segment_url,
+        "status": "failed" if error else "succeeded",
+        "error": str(error) if error else None,
+    }
+    if run is not None:
+        result.update(run.result())
+        result["logs"] = run.log.text()
+    return result
+
+
+def run_batch(segment_urls, upload=True, queue_size=1, upload_workers=None, patient_id=None,
+              camera=None):
+    """
+    Capture every segment URL through the pipeline. Returns a BatchResults:
+    iterate it (`for` or `async for`) for one result dict per item as it
+    finishes, then a summary dict. Every item uses `camera`
+    if given, else its segment's camera (see `run_capture`). Raises QueueFullError if
+    TX2_CAPTURE_BATCH_CONCURRENCY batches are already running.
+    """
+    if upload_workers is None:
+        upload_workers = getattr(settings, "TX2_CAPTURE_BATCH_UPLOADS", 2)
+    if not _slots.acquire(blocking=False):
+        raise QueueFullError("A capture batch is already running")
+    return _run_batch(list(segment_urls), upload, queue_size, max(upload_workers, 1), patient_id, camera)
+
+
+def _run_batch(segment_urls, upload, queue_size, upload_workers, patient_id=None, camera=None):
+    stop = threading.Event()
+    to_process = queue.Queue(maxsize=queue_size)
+    to_upload = queue.Queue(maxsize=queue_size)
+    results = queue.Queue()
+
+    def capture_stage():
+        for index, segment_url in enumerate(segment_urls):
+            if stop.is_set():
+                break
+            run = error = None
+            try:
+                run = CaptureRun(capture_type_from_url(segment_url), upload, log=CaptureLog(echo=False),
+                                 segment_url=segment_url, patient_id=patient_id, camera=camera)
+                run.capture()
+            except Exception as e:
+                error = e
+            to_process.put((index, segment_url, run, error))
+        to_process.put(_DONE)
+
+    def process_stage():
+        while True:
+            item = to_process.get()
+            if item is _DONE:
+                to_upload.put(_DONE)
+                return
+            index, segment_url, run, error = item
+            if error is None:
+                try:
+                    run.process()
+                except Exception as e:
+                    error = e
+            to_upload.put((index, segment_url, run, error))
+
+    remaining_uploaders = [upload_workers]
+    uploaders_lock = threading.Lock()
+
+    def upload_stage():
+        try:
+            while True:
+                item = to_upload.get()
+                if item is _DONE:
+                    to_upload.put(_DONE)  # for the other upload workers
+                    break
+                index, segment_url, run, error = item
+                if error is None:
+                    try:
+                        run.send()
+                    except Exception as e:
+                        error = e
+                if run is not None:
+                    run.finish(error)
+                results.put(_item_result(index, segment_url, run, error))
+        finally:
+            with uploaders_lock:
+                remaining_uploaders[0] -= 1
+                last = remaining_uploaders[0] == 0
+            if last:
+                results.put(_DONE)
+                _slots.release()
+
+    threads = [
+        threading.Thread(target=capture_stage, name="batch-capture", daemon=True),
+        threading.Thread(target=process_stage, name="batch-process", daemon=True),
+    ] + [
+        threading.Thread(target=upload_stage, name=f"batch-upload-{i}", daemon=True)
+        for i in range(upload_workers)
+    ]
+
+    for thread in threads:
+        thread.start()
+    return BatchResults(results, stop)
+
+
+class BatchResults:
+    """
+    Item results of a running batch, then a summary. Iterate once, with
+    `for` or `async for`. Stopping early (the client went away) captures
+    nothing more; items already captured drain through the stages, then
+    the batch slot is freed.
+    """
+
+    def __init__(self, results, stop):
+        self._results = results
+        self._stop = stop
+        self._started = time.perf_counter()
+        self._succeeded = self._failed = 0
+
+    def _count(self, result):
+        if result["status"] == "succeeded":
+            self._succeeded += 1
+        else:
+            self._failed += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self._started
+        items = self._succeeded + self._failed
+        return {
+            "status": "done",
+            "items": items,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "elapsed_ms": round(elapsed * 1000.0, 3),
+            "items_per_s": round(items / elapsed, 3) if elapsed > 0 else None,
+        }
+
+    def __iter__(self):
+        try:
+            while True:
+                result = self._results.get()
+                if result is _DONE:
+                    break
+                self._count(result)
+                yield result
+            yield self.summary()
+        finally:
+            self._stop.set()
+
+    async def __aiter__(self):
+        waiter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-results")
+        try:
+            while True:
+                result = await asyncio.wrap_future(waiter.submit(self._results.get))
+                if result is _DONE:
+                    break
+                self._count(result)
+                yield result
+            yield self.summary()
+        finally:
+            self._stop.set()
+            # A get() still waiting ends with the next result the stages put
+            waiter.shutdown(wait=False)
@@ -0,0 +1,358 @@
+"""
+Long-lived camera service.
+
+Instead of building a new `rs.pipeline()`, warming it up and stopping it for
+every capture, the Django process owns one streaming pipeline. A background
+thread keeps reading aligned depth + color framesets into a small ring buffer
+and a capture simply takes the newest one.
+
+The frame source is pluggable so the service can run without a device:
+
+    realsense  - Intel RealSense via pyrealsense2 (default)
+    synthetic  - generated tray frames (see tx2_backend.synthetic)
+    replay     - loops over depth/RGB files saved by an earlier capture
+
+With several cameras there is one service per device, owned by the device
+pool (devices.py); `get_camera_service` returns one of them.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .depth_io import find_depth, load_depth
+from .errors import CameraError
+from .metrics import CAMERA_ERRORS, observe_stage
+from .synthetic import synthetic_color, synthetic_scene, synthetic_sequence
+
+FrameSet = namedtuple("FrameSet", ["index", "timestamp", "depth", "color"])
+
+# Pinhole intrinsics of the (color-aligned) depth stream, in pixels
+Intrinsics = namedtuple("Intrinsics", ["width", "height", "fx", "fy", "ppx", "ppy"])
+
+
+def default_intrinsics(width, height, hfov=69.0, vfov=42.0):
+    """Intrinsics from a field of view in degrees (D4xx color sensor by default)."""
+    return Intrinsics(
+        width, height,
+        fx=width / (2.0 * math.tan(math.radians(hfov) / 2.0)),
+        fy=height / (2.0 * math.tan(math.radians(vfov) / 2.0)),
+        ppx=(width - 1) / 2.0,
+        ppy=(height - 1) / 2.0,
+    )
+
+
+# ================================================================
+#                         FRAME SOURCES
+# ================================================================
+class RealSenseSource:
+    """Depth + color streams from a RealSense device, depth aligned to color."""
+
+    def __init__(self, width=848, height=480, fps=30, serial=None, visual_preset=1.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.serial = serial
+        self.visual_preset = visual_preset
+        self.depth_scale = 0.001
+        self.intrinsics = default_intrinsics(width, height)
+        self._pipeline = None
+        self._align = None
+
+    def start(self):
+        # Imported here so the synthetic/replay sources work without the SDK
+        try:
+            import pyrealsense2 as rs
+        except ImportError:
+            raise CameraError("pyrealsense2 is not installed") from None
+
+        pipeline = rs.pipeline()
+        config = rs.config()
+        if self.serial:
+            config.enable_device(self.serial)
+        config.enable_stream(rs.stream.depth, self.width, self.height, rs.format.z16, self.fps)
+        config.enable_stream(rs.stream.color, self.width, self.height, rs.format.bgr8, self.fps)
+
+        profile = pipeline.start(config)
+        depth_sensor = profile.get_device().first_depth_sensor()
+
+        # Use numeric preset (RealSense enums break in some SDK versions)
+        depth_sensor.set_option(rs.option.visual_preset, self.visual_preset)
+        self.depth_scale = depth_sensor.get_depth_scale()
+
+        # Depth is aligned to color, so the color stream's intrinsics apply
+        intr = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+        self.intrinsics = Intrinsics(intr.width, intr.height, intr.fx, intr.fy, intr.ppx, intr.ppy)
+
+        self._align = rs.align(rs.stream.color)
+        self._pipeline = pipeline
+
+    def read(self):
+        frames = self._pipeline.wait_for_frames()
+        started = time.perf_counter()
+        aligned = self._align.process(frames)
+        observe_stage("align", time.perf_counter() - started)
+
+        depth_frame = aligned.get_depth_frame()
+        color_frame = aligned.get_color_frame()
+        if not depth_frame or not color_frame:
+            raise CameraError("Could not retrieve frames")
+
+        # Copy out of the SDK frame pool so buffered frames don't starve it
+        depth_image = np.array(depth_frame.get_data(), copy=True)
+        color_image = np.array(color_frame.get_data(), copy=True)
+        return depth_image, color_image
+
+    def stop(self):
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+
+
+class SyntheticSource:
+    """Generated frames at the configured frame rate."""
+
+    def __init__(self, width=848, height=480, fps=30, hole_fraction=0.1, seed=None, variants=8):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.depth_scale = 0.001
+        self.intrinsics = default_intrinsics(width, height)
+        self._rng = np.random.default_rng(seed)
+        # One static scene with per-frame noise and holes, like a fixed camera
+        scene = synthetic_scene(width, height, self._rng)
+        depths = synthetic_sequence(scene, variants, hole_fraction, rng=self._rng)
+        color = synthetic_color(depths[0], self._rng)
+        self._variants = [(depth, color) for depth in depths]
+        self._count = 0
+        self._next_at = 0.0
+
+    def start(self):
+        self._next_at = time.monotonic()
+
+    def read(self):
+        if self.fps:
+            self._next_at += 1.0 / self.fps
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_at = time.monotonic()
+        depth, color = self._variants[self._count % len(self._variants)]
+        self._count += 1
+        return depth.copy(), color.copy()
+
+    def stop(self):
+        pass
+
+
+class ReplaySource:
+    """Loops over a depth/RGB pair saved by an earlier capture."""
+
+    def __init__(self, depth_path=None, rgb_path=None, fps=30, **_):
+        self.media_dir = os.path.join(settings.BASE_DIR, "media")
+        self.depth_path = depth_path
+        self.rgb_path = rgb_path or os.path.join(self.media_dir, "rgb_image.png")
+        self.fps = fps
+        self.depth_scale = 0.001
+        self.intrinsics = None
+        self._depth = None
+        self._color = None
+
+    def start(self):
+        depth_path = self.depth_path or find_depth(self.media_dir, "depth_image")
+        self._depth = np.asarray(load_depth(depth_path)).astype(np.uint16)
+        self._color = cv2.imread(self.rgb_path)
+        if self._color is None:
+            raise CameraError(f"Could not read {self.rgb_path}")
+        self.intrinsics = default_intrinsics(self._depth.shape[1], self._depth.shape[0])
+
+    def read(self):
+        if self.fps:
+            time.sleep(1.0 / self.fps)
+        return self._depth.copy(), self._color.copy()
+
+    def stop(self):
+        pass
+
+
+SOURCES = {
+    "realsense": RealSenseSource,
+    "synthetic": SyntheticSource,
+    "replay": ReplaySource,
+}
+
+
+def build_source(name, **options):
+    try:
+        source_cls = SOURCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown camera source '{name}' (choose from {', '.join(SOURCES)})")
+    return source_cls(**options)
+
+
+# ================================================================
+#                         CAMERA SERVICE
+# ================================================================
+class CameraService:
+    """
+    Keeps a frame source streaming on a background thread.
+
+    The newest `buffer_size` framesets are kept in a ring buffer; readers
+    wait on a condition variable for a frame newer than the one they saw.
+    """
+
+    def __init__(self, source, buffer_size=4, warmup_frames=5, retry_delay=1.0):
+        self.source = source
+        self.warmup_frames = warmup_frames
+        self.retry_delay = retry_delay
+        self.last_error = None
+        self.error_count = 0
+
+        self._frames = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._index = 0
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def intrinsics(self):
+        return getattr(self.source, "intrinsics", None)
+
+    @property
+    def depth_scale(self):
+        return getattr(self.source, "depth_scale", 0.001)
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-service", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _open(self):
+        started = time.perf_counter()
+        self.source.start()
+        opened = time.perf_counter()
+        observe_stage("device_open", opened - started)
+
+        # Warm-up frames (critical for RealSense auto-exposure) are paid once
+        for _ in range(self.warmup_frames):
+            self.source.read()
+        observe_stage("warmup", time.perf_counter() - opened)
+
+    def _run(self):
+        opened = False
+        try:
+            while self._running:
+                try:
+                    if not opened:
+                        self._open()
+                        opened = True
+                    depth, color = self.source.read()
+                except Exception as e:
+                    with self._cond:
+                        self.last_error = e
+                        self.error_count += 1
+                        self._cond.notify_all()
+                    CAMERA_ERRORS.inc()
+                    print(f"❌ Camera error: {e!r}")
+                    if opened:
+                        self._safe_stop_source()
+                        opened = False
+                    time.sleep(self.retry_delay)
+                    continue
+
+                with self._cond:
+                    self._index += 1
+                    self._frames.append(FrameSet(self._index, time.time(), depth, color))
+                    self.last_error = None
+                    self._cond.notify_all()
+        finally:
+            if opened:
+                self._safe_stop_source()
+
+    def _safe_stop_source(self):
+        try:
+            self.source.stop()
+        except Exception as e:
+            print(f"⚠ Failed to stop camera source: {e!r}")
+
+    def latest(self, newer_than=0, timeout=5.0):
+        """
+        Return the newest FrameSet with an index above `newer_than`.
+
+        Pass the index of a frame you already used to guarantee a fresh one.
+        Raises CameraError if none arrives within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._frames or self._frames[-1].index <= newer_than:
+                if not self._running:
+                    raise CameraError("Camera service is not running")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    message = "Timed out waiting for a camera frame"
+                    if self.last_error is not None:
+                        message += f" (last error: {self.last_error})"
+                    raise CameraError(message)
+                self._cond.wait(remaining)
+            return self._frames[-1]
+
+    def recent(self):
+        """Return the buffered framesets, oldest first."""
+        with self._cond:
+            return list(self._frames)
+
+
+# ================================================================
+#                        CONFIGURATION
+# ================================================================
+def camera_config():
+    config = {
+        "SOURCE": "realsense",
+        "DEVICES": None,
+        "ROUTING": "least_busy",
+        "WIDTH": 848,
+        "HEIGHT": 480,
+        "FPS": 30,
+        "BUFFER_SIZE": 4,
+        "WARMUP_FRAMES": 5,
+        "OPTIONS": {},
+    }
+    config.update(getattr(settings, "TX2_CAMERA", {}))
+    return config
+
+
+def get_camera_service(serial=None):
+    """Return the named camera's service (default: the first camera), starting it on first use."""
+    from .devices import get_device_pool
+
+    service = get_device_pool().device(serial).service
+    service.start()
+    return service
+
+
+def shutdown_camera_service():
+    """Stop every camera in the device pool."""
+    from .devices import shutdown_device_pool
+
+    shutdown_device_pool()
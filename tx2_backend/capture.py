@@ -0,0 +1,502 @@
+"""
+Before/after capture pipeline.
+
+One code path for both segment types: capture -> save -> TELEA inpaint ->
+upload to the segmentation server. In the server the upload goes through
+the durable outbox (see outbox.py) unless TX2_OUTBOX["ENABLED"] is off.
+`capture_api` calls `run_capture` in-process; `capture_before.py` /
+`capture_after.py` are thin CLI wrappers around `main` that upload directly.
+Every run, failed or not, is recorded in the capture history (history.py).
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import django
+import requests
+from django.conf import settings
+
+from . import metrics
+from .camera import shutdown_camera_service
+from .colorize import colorize_depth, validity_mask
+from .delta import build_delta, delta_config
+from .devices import get_device_pool
+from .depth_io import depth_path, find_depth, load_depth, save_depth
+from .fusion import get_depth_fusion
+from .history import get_history_recorder, history_config, segment_key, timestamp
+from .inpaint import inpaint_depth
+from .media_store import atomic_path, get_media_store, write_atomic
+from .metrics import StageTimer
+from .outbox import get_outbox, outbox_config
+from .upload import get_upload_client
+from .volume import get_volume_estimator, volume_config
+
+# ================================================================
+#                       CONFIGURATION
+# ================================================================
+
+SEGMENT_TYPES = ("before", "after")
+
+# Local depth storage format ("npy", "png" or "csv"); CSV copies are opt-in
+DEPTH_FORMAT = getattr(settings, "TX2_DEPTH_FORMAT", "npy")
+DEPTH_CSV_EXPORT = getattr(settings, "TX2_DEPTH_CSV_EXPORT", False)
+
+# Fuse the last N depth frames before inpainting (1 = single frame)
+_FUSION = getattr(settings, "TX2_DEPTH_FUSION", {})
+FUSION_FRAMES = _FUSION.get("FRAMES", 1)
+FUSION_METHOD = _FUSION.get("METHOD", "median")
+
+# cv2.inpaint options (ROI / pyramid modes, see inpaint.py)
+_INPAINT = getattr(settings, "TX2_INPAINT", {})
+INPAINT_OPTIONS = {
+    "radius": _INPAINT.get("RADIUS", 3),
+    "roi": tuple(_INPAINT["ROI"]) if isinstance(_INPAINT.get("ROI"), (list, tuple)) else _INPAINT.get("ROI"),
+    "pyramid": _INPAINT.get("PYRAMID", False),
+    "scale": _INPAINT.get("PYRAMID_SCALE", 4),
+    "band": _INPAINT.get("PYRAMID_BAND", 2),
+}
+
+# Also write the mask and JET visualisations (not needed by the pipeline)
+DEBUG_ARTIFACTS = getattr(settings, "TX2_DEBUG_ARTIFACTS", False)
+
+MEDIA_DIR = os.path.join(settings.BASE_DIR, "media")
+
+
+def capture_type_from_url(segment_url, default="before"):
+    """Map a frontend segment URL ending in /before or /after to a segment type."""
+    if segment_url:
+        for capture_type in SEGMENT_TYPES:
+            if segment_url.rstrip("/").endswith("/" + capture_type):
+                return capture_type
+    return default
+
+
+class CaptureLog:
+    """Prints like the old scripts did, and keeps the lines for the response."""
+
+    def __init__(self, echo=True):
+        self.echo = echo
+        self.lines = []
+
+    def __call__(self, *parts):
+        line = " ".join(str(p) for p in parts)
+        self.lines.append(line)
+        if self.echo:
+            print(line)
+
+    def text(self):
+        return "\n".join(self.lines) + "\n" if self.lines else ""
+
+
+# ================================================================
+#                    1. REALSENSE CAPTURE
+# ================================================================
+def capture_rgbd(camera=None, timeout=None, fusion_frames=None, pin=None):
+    """
+    (device, depth, color) from the named camera, the camera `pin` (a
+    segment) captured on before, or the least busy one. Concurrent captures
+    on a device share one fresh frame instead of queueing.
+    """
+    device, frameset = get_device_pool().capture("rgbd", camera, timeout=timeout, pin=pin)
+    depth = frameset.depth
+
+    fusion_frames = FUSION_FRAMES if fusion_frames is None else fusion_frames
+    if fusion_frames > 1:
+        # Earlier frames are already in the camera's ring buffer: no extra wait
+        started = time.perf_counter()
+        depths = [f.depth for f in device.service.recent() if f.index <= frameset.index]
+        fusion = get_depth_fusion(fusion_frames, depth.shape, FUSION_METHOD)
+        depth = fusion.fuse(depths)
+        metrics.observe_stage("fuse", time.perf_counter() - started)
+
+    return device, depth, frameset.color
+
+
+def capture_realsense_image(timeout=None, fusion_frames=None, camera=None):
+    _, depth, color = capture_rgbd(camera, timeout, fusion_frames)
+    return depth, color
+
+
+# ================================================================
+#                     2. SAVE IMAGES & COLORMAPS
+# ================================================================
+def imwrite_atomic(path, image):
+    with atomic_path(path) as tmp_path:
+        if not cv2.imwrite(tmp_path, image):
+            raise IOError(f"Could not write {path}")
+    return path
+
+
+def save_depth_artifacts(depth, media_dir, stem, log=print):
+    """Save depth in DEPTH_FORMAT, plus a CSV copy when DEPTH_CSV_EXPORT is on."""
+    path = save_depth(depth_path(media_dir, stem, DEPTH_FORMAT), depth)
+    log("Saved:", path)
+    if DEPTH_CSV_EXPORT and DEPTH_FORMAT != "csv":
+        csv_path = save_depth(depth_path(media_dir, stem, "csv"), depth)
+        log("Saved:", csv_path)
+    return path
+
+
+def save_depth_and_rgb(depth_image, color_image, media_dir=MEDIA_DIR, log=print,
+                       debug=DEBUG_ARTIFACTS,
+                       rgb_filename="rgb_image.png",
+                       depth_stem="depth_image",
+                       depth_jet_filename="depth_image_jet.png",
+                       mask_filename="depth_mask.png"):
+
+    """Save the capture; returns the RGB PNG bytes so the upload can reuse them."""
+    rgb_path = os.path.join(media_dir, rgb_filename)
+
+    ok, rgb_png = cv2.imencode(".png", color_image)
+    if not ok:
+        raise RuntimeError("Failed to encode RGB image")
+    rgb_png = rgb_png.tobytes()
+    write_atomic(rgb_path, rgb_png)
+    log("Saved:", rgb_path)
+
+    save_depth_artifacts(depth_image, media_dir, depth_stem, log)
+
+    # The mask and JET images are only for humans; inpainting works in memory
+    if debug:
+        mask_path = os.path.join(media_dir, mask_filename)
+        mask = validity_mask(depth_image)
+        imwrite_atomic(mask_path, mask)
+        log("Saved:", mask_path)
+
+        depth_jet_path = os.path.join(media_dir, depth_jet_filename)
+        imwrite_atomic(depth_jet_path, colorize_depth(depth_image))
+        log("Saved:", depth_jet_path)
+
+    return rgb_png
+
+
+def save_camera_info(media_dir, intrinsics, depth_scale, log=print, filename="camera.json"):
+    """Record the stream intrinsics and depth scale, so the depth can be deprojected later."""
+    path = os.path.join(media_dir, filename)
+    info = {"intrinsics": intrinsics._asdict() if intrinsics else None, "depth_scale": depth_scale}
+    write_atomic(path, json.dumps(info).encode())
+    log("Saved:", path)
+    return path
+
+
+# ================================================================
+#                3. TELEA INPAINTING & NUMERIC DEPTH SAVE
+# ================================================================
+def telea_inpaint_and_save(depth_image, media_dir=MEDIA_DIR, log=print, debug=DEBUG_ARTIFACTS):
+    """Inpaint the captured depth in memory and save the numeric result."""
+    log("\n=== Running TELEA Inpainting ===")
+
+    depth_inpainted = inpaint_depth(depth_image, **INPAINT_OPTIONS)
+
+    save_depth_artifacts(depth_inpainted, media_dir, "inpainted_depth", log)
+
+    if debug:
+        out_img_path = os.path.join(media_dir, "inpainted_depth.png")
+        imwrite_atomic(out_img_path, colorize_depth(depth_inpainted))
+        log(f"Saved: {out_img_path}")
+
+    return depth_inpainted
+
+
+def build_session_delta(session_id, depth, color, log=print, segment="", camera=""):
+    """
+    Delta of an "after" capture against the newest "before" session of its
+    segment and camera, or None when there is no usable before capture or
+    most of the frame changed.
+    """
+    newest = get_media_store().recent("before", limit=1, segment=segment, camera=camera) if segment else []
+    if not newest:
+        log("No before capture of this segment to diff against; sending the full frame")
+        return None
+    before = newest[0]
+    try:
+        before_depth = load_depth(find_depth(before["path"], "inpainted_depth"))
+    except (FileNotFoundError, ValueError) as e:
+        log(f"Before capture unusable ({e}); sending the full frame")
+        return None
+    before_rgb = cv2.imread(os.path.join(before["path"], "rgb_image.png"), cv2.IMREAD_COLOR)
+    if before_rgb is None:
+        log("Before capture has no RGB image; sending the full frame")
+        return None
+
+    config = delta_config()
+    delta = build_delta(
+        before["session_id"], session_id, before_depth, depth, before_rgb, color,
+        min_change_mm=config["MIN_CHANGE_MM"], color_threshold=config["COLOR_THRESHOLD"],
+        margin=config["MARGIN"], max_regions=config["MAX_REGIONS"], max_area=config["MAX_AREA"],
+        min_region=config["MIN_REGION"],
+    )
+    if delta is None:
+        log("Most of the frame changed; sending the full frame")
+    else:
+        log(f"Delta against {before['session_id']}: {len(delta.regions_png)} regions, {delta.size} bytes")
+    get_media_store().touch(before["session_id"])
+    return delta
+
+
+# ================================================================
+#                  4. SEND TO RTX 5090 SERVER
+# ================================================================
+def send_to_server(capture_type, media_dir=MEDIA_DIR, log=print, rgb_png=None, depth=None,
+                   delta=None, session_id=None):
+    """
+    Upload the RGB image and inpainted depth. Returns (status_code, text) or None.
+
+    Bodies come from memory: `rgb_png` / `depth` when the caller has them,
+    otherwise the artifacts saved in `media_dir`. A `delta` payload is sent
+    in their place when the server takes it.
+    """
+    log("\n=== Sending to RTX 5090 Server ===")
+
+    if rgb_png is None:
+        with open(os.path.join(media_dir, "rgb_image.png"), "rb") as f:
+            rgb_png = f.read()
+    if depth is None:
+        depth = load_depth(depth_path(media_dir, "inpainted_depth", DEPTH_FORMAT))
+
+    log("Uploading... (This takes time due to AI processing)")
+
+    try:
+        headers = {"X-Session-Id": session_id} if session_id else None
+        response = get_upload_client().send(capture_type, rgb_png, depth, headers=headers, delta=delta)
+        metrics.UPLOADS.inc(outcome=str(response.status_code))
+        metrics.UPLOAD_BYTES.inc(response.sent_bytes)
+
+        log(f"Server Response Code: {response.status_code}")
+        log(f"Server Message: {response.text}")
+        log(f"Uploaded {response.sent_bytes} bytes")
+        return response.status_code, response.text
+
+    except requests.exceptions.ReadTimeout:
+        metrics.UPLOADS.inc(outcome="read_timeout")
+        log("\nSUCCESS (Probable): Data sent, but server took too long to reply.")
+        return None
+
+    except Exception as e:
+        metrics.UPLOADS.inc(outcome="error")
+        log(f"Failed to connect to 5090 Server: {e}")
+        return None
+
+
+# ================================================================
+#                        FULL PIPELINE
+# ================================================================
+class CaptureRun:
+    """
+    One capture moving through the pipeline stages.
+
+    `run_capture` calls capture(), process() and send() back to back; the
+    batch pipeline calls each on its own thread. finish() records metrics,
+    closes the media session, records the run in the capture history and
+    drops the frames. With `spool` (default: TX2_OUTBOX["ENABLED"]) send()
+    only records the upload in the outbox.
+    """
+
+    def __init__(self, capture_type="before", upload=True, media_dir=None, log=None, timer=None,
+                 spool=None, segment_url=None, patient_id=None, camera=None):
+        if capture_type not in SEGMENT_TYPES:
+            raise ValueError(f"Unknown capture type '{capture_type}'")
+        self.capture_type = capture_type
+        self.upload = upload
+        self.spool = outbox_config()["ENABLED"] if spool is None else spool
+        self.segment_url = segment_url
+        self.patient_id = patient_id
+        self.camera = camera  # requested serial; the one used once captured
+        self.log = log or CaptureLog()
+        self.timer = timer or StageTimer()
+
+        self.session = None
+        if media_dir is None:
+            self.session = get_media_store().open_session(capture_type, segment=segment_key(segment_url))
+            media_dir = self.session.path
+        else:
+            os.makedirs(media_dir, exist_ok=True)
+        self.media_dir = media_dir
+
+        self.depth = self.color = self.rgb_png = self.depth_inpainted = None
+        self.intrinsics = self.depth_scale = None
+        self.server_response = None
+        self.outbox_id = None
+        self.volume = None
+        self.delta = None
+
+        metrics.CAPTURES.inc(capture_type=capture_type)
+        self.created_at = time.time()
+        self._started = time.perf_counter()
+
+    def segment_camera(self):
+        """
+        The camera this segment's earlier captures used, so before and after
+        show the same tray; None for the pool to choose.
+        """
+        segment = segment_key(self.segment_url)
+        if self.camera is not None or not segment:
+            return self.camera
+        pool = get_device_pool()
+        if pool.pinned(segment) is not None:
+            return None  # the pool routes it
+        # Captured before a restart: the media store remembers the camera
+        camera = get_media_store().segment_camera(segment)
+        if camera and camera not in pool.serials:
+            self.log(f"Camera {camera} of earlier captures of this segment is gone; using another one")
+            return None
+        return camera or None
+
+    def capture(self):
+        # 1. Capture
+        with self.timer.stage("capture"):
+            device, self.depth, self.color = capture_rgbd(self.segment_camera(),
+                                                          pin=segment_key(self.segment_url) or None)
+            self.camera = device.serial
+            if self.session is not None:
+                self.session.camera = device.serial
+            self.intrinsics, self.depth_scale = device.service.intrinsics, device.service.depth_scale
+
+    def process(self):
+        # 2. Save Locally
+        with self.timer.stage("save"):
+            self.rgb_png = save_depth_and_rgb(self.depth, self.color, media_dir=self.media_dir, log=self.log)
+            save_camera_info(self.media_dir, self.intrinsics, self.depth_scale, log=self.log)
+
+        # 3. Process
+        with self.timer.stage("inpaint"):
+            self.depth_inpainted = telea_inpaint_and_save(self.depth, media_dir=self.media_dir, log=self.log)
+
+        # 3b. Amount eaten, on the device, against this segment's before capture
+        if self.capture_type == "after" and self.session is not None and volume_config()["AUTO"]:
+            with self.timer.stage("volume"):
+                try:
+                    self.volume = get_volume_estimator().estimate_capture(
+                        self.session.id, self.depth_inpainted, self.intrinsics, self.depth_scale,
+                        self.session.segment, self.camera)
+                    self.log(f"Consumed volume: {self.volume['consumed_ml']:.1f} ml")
+                except (LookupError, OSError, ValueError) as e:
+                    self.log(f"Volume estimate skipped: {e}")
+
+        # 3c. Changed regions only, for the upload
+        if self.capture_type == "after" and self.session is not None and self.upload and delta_config()["ENABLED"]:
+            with self.timer.stage("delta"):
+                self.delta = build_session_delta(self.session.id, self.depth_inpainted, self.color, log=self.log,
+                                                 segment=self.session.segment, camera=self.camera)
+                if self.delta is not None and self.spool:
+                    self.delta.save(self.media_dir)
+
+    def send(self):
+        # 4. Send (or hand over to the outbox drainer)
+        if self.upload and self.spool:
+            with self.timer.stage("spool"):
+                self.outbox_id = get_outbox().enqueue(
+                    self.capture_type,
+                    os.path.join(self.media_dir, "rgb_image.png"),
+                    depth_path(self.media_dir, "inpainted_depth", DEPTH_FORMAT),
+                    session_id=self.session.id if self.session else None,
+                )
+                self.log(f"Queued upload {self.outbox_id}")
+        elif self.upload:
+            with self.timer.stage("upload"):
+                self.server_response = send_to_server(
+                    self.capture_type, media_dir=self.media_dir, log=self.log,
+                    rgb_png=self.rgb_png, depth=self.depth_inpainted, delta=self.delta,
+                    session_id=self.session.id if self.session else None)
+
+    def finish(self, error=None):
+        if error is not None:
+            metrics.CAPTURE_FAILURES.inc(capture_type=self.capture_type)
+        metrics.CAPTURE_SECONDS.observe(time.perf_counter() - self._started, capture_type=self.capture_type)
+        if self.session is not None:
+            self.session.close()
+        if history_config()["ENABLED"]:
+            get_history_recorder().record(**self.history_row(error))
+        self.depth = self.color = self.rgb_png = self.depth_inpainted = self.delta = None
+
+    def history_row(self, error=None):
+        """Field values of this run's Capture row (models.py)."""
+        status_code, text = self.server_response or (None, "")
+        try:
+            files = sorted(name for name in os.listdir(self.media_dir) if not name.startswith(".tmp-"))
+        except OSError:
+            files = []
+        return {
+            "capture_type": self.capture_type,
+            "status": "failed" if error is not None else "succeeded",
+            "patient_id": self.patient_id or "",
+            "camera": self.camera or "",
+            "segment": segment_key(self.segment_url),
+            "segment_url": self.segment_url or "",
+            "session_id": self.session.id if self.session else None,
+            "media_dir": self.media_dir,
+            "files": files,
+            "timings_ms": dict(self.timer.timings_ms),
+            "outbox_id": self.outbox_id,
+            "server_status": status_code,
+            "server_response": text or "",
+            "volume": self.volume,
+            "error": str(error) if error is not None else "",
+            "created_at": timestamp(self.created_at),
+        }
+
+    def result(self):
+        return {
+            "capture_type": self.capture_type,
+            "session_id": self.session.id if self.session else None,
+            "camera": self.camera,
+            "media_dir": self.media_dir,
+            "server_response": self.server_response,
+            "outbox_id": self.outbox_id,
+            "volume": self.volume,
+            "timings_ms": self.timer.timings_ms,
+        }
+
+
+def run_capture(capture_type="before", upload=True, media_dir=None, log=None,
+                timer=None, spool=None, segment_url=None, patient_id=None, camera=None):
+    """
+    Run capture -> save -> inpaint -> upload for one segment type.
+
+    Artifacts go to a new media store session unless `media_dir` is given.
+    `camera` names the device to use (serial); by default the camera of the
+    segment's earlier captures, or for a new segment the least busy one.
+    Returns a dict with the session, camera, server response
+    (or outbox entry id when spooled) and per-stage timings;
+    the log lines are in `log.lines`. Pass a `StageTimer` to follow progress.
+    Exceptions from capture/save/inpaint propagate to the caller.
+    """
+    run = CaptureRun(capture_type, upload, media_dir, log, timer, spool, segment_url, patient_id, camera)
+    try:
+        run.capture()
+        run.process()
+        run.send()
+    except Exception as e:
+        run.finish(e)
+        raise
+    run.finish()
+    return run.result()
+
+
+def main(capture_type, argv=None):
+    """Entry point for the capture_before.py / capture_after.py wrappers."""
+    parser = argparse.ArgumentParser(description=f"Run a '{capture_type}' capture")
+    parser.add_argument("--segment-url", help="Frontend segment URL (logged and recorded)")
+    parser.add_argument("--patient-id", help="Recorded with the capture")
+    parser.add_argument("--camera", help="Serial of the camera to use (default: the segment's camera, else the least busy one)")
+    parser.add_argument("--no-upload", action="store_true", help="Skip the server upload")
+    parser.add_argument("--media-dir", help="Write the artifacts here instead of a new media session")
+    args = parser.parse_args(argv)
+    django.setup()  # the capture history is written through the ORM
+
+    if args.segment_url:
+        print(f"✓ Received URL: {args.segment_url}")
+
+    try:
+        # The script exits right away, so there is no drainer: upload inline
+        run_capture(capture_type, upload=not args.no_upload, media_dir=args.media_dir, spool=False,
+                    segment_url=args.segment_url, patient_id=args.patient_id, camera=args.camera)
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return 1
+    finally:
+        shutdown_camera_service()
+    return 0
+
@@ -0,0 +1,105 @@
+"""
+Single-pass JET colorization of uint16 depth.
+
+The old path built several masks, copied the frame to float32, sorted the
+valid pixels for np.percentile, then ran normalize, equalizeHist and
+applyColorMap. Depth is uint16, so one `bincount` gives the full value
+histogram; the 2/98 percentiles, the clip + min-max normalisation, the
+histogram equalisation and the JET palette are all computed on that
+histogram (at most 65536 bins) and folded into a single lookup table,
+which is applied to the frame in one indexing pass.
+"""
+import cv2
+import numpy as np
+
+_LEVELS = 65536
+_VALUES = np.arange(_LEVELS, dtype=np.float64)
+_JET = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(-1, 1), cv2.COLORMAP_JET).reshape(256, 3)
+
+
+def depth_histogram(depth):
+    """Counts of every uint16 depth value up to the frame's max (index 0 = invalid pixels)."""
+    return np.bincount(depth.ravel())
+
+
+def histogram_percentiles(hist, percentiles, skip_zero=True):
+    """
+    np.percentile (linear interpolation) of the values counted in `hist`,
+    in O(65536) instead of sorting the pixels. Returns None if empty.
+    """
+    counts = hist[1:] if skip_zero else hist
+    offset = 1 if skip_zero else 0
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1]) if len(cumulative) else 0
+    if total == 0:
+        return None
+    results = []
+    for p in percentiles:
+        rank = (total - 1) * p / 100.0
+        lo, hi = int(np.floor(rank)), int(np.ceil(rank))
+        v_lo = np.searchsorted(cumulative, lo + 1) + offset
+        v_hi = np.searchsorted(cumulative, hi + 1) + offset
+        results.append(float(v_lo + (v_hi - v_lo) * (rank - lo)))
+    return results
+
+
+def _equalize_lut(hist8):
+    """The LUT cv2.equalizeHist builds from a 256-bin histogram."""
+    lut = np.zeros(256, dtype=np.uint8)
+    nonzero = np.flatnonzero(hist8)
+    if len(nonzero) == 0:
+        return lut
+    first = nonzero[0]
+    total = hist8.sum()
+    if hist8[first] == total:
+        lut[:] = first
+        return lut
+    scale = 255.0 / (total - hist8[first])
+    cumulative = np.cumsum(hist8[first + 1:])
+    lut[first + 1:] = np.clip(np.rint(cumulative * scale), 0, 255).astype(np.uint8)
+    return lut
+
+
+def jet_lut(hist, percentiles=(2, 98)):
+    """
+    Lookup table from depth value to JET color for a frame with value
+    histogram `hist`, one entry per histogram bin. Colors are packed BGRA
+    in uint32 so applying the table is a single 4-byte gather per pixel.
+    """
+    lut = np.zeros((len(hist), 4), dtype=np.uint8)
+    clip_range = histogram_percentiles(hist, percentiles)
+    if clip_range is not None:
+        dmin, dmax = clip_range
+
+        # Clip + NORM_MINMAX: the clipped frame always spans exactly
+        # [dmin, dmax] because the extreme valid values lie outside the percentiles
+        scale = 255.0 / (dmax - dmin) if dmax > dmin else 0.0
+        values = _VALUES[:len(hist)]
+        norm8 = ((np.clip(values, dmin, dmax) - dmin) * scale).astype(np.float32).astype(np.uint8)
+
+        # equalizeHist needs the histogram of the 8-bit image: derive it from hist
+        hist8 = np.bincount(norm8, weights=hist, minlength=256).astype(np.int64)
+        lut[:, :3] = _JET[_equalize_lut(hist8)[norm8]]
+        lut[0] = 0  # invalid pixels stay black
+    return lut.view(np.uint32).ravel()
+
+
+def colorize_depth(depth, percentiles=(2, 98)):
+    """
+    Equalised JET visualisation of depth, invalid (0) pixels black.
+
+    Matches the old clip/normalize/equalizeHist/applyColorMap chain within
+    rounding. Non-uint16 depth (e.g. inpainted float32) is rounded first.
+    """
+    if depth.dtype != np.uint16:
+        depth = np.clip(np.rint(depth), 0, _LEVELS - 1).astype(np.uint16)
+    packed = np.take(jet_lut(depth_histogram(depth), percentiles), depth)
+    bgra = packed.view(np.uint8).reshape(depth.shape[0], depth.shape[1], 4)
+    return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+
+
+def validity_mask(depth):
+    """uint8 mask, 255 where depth is valid, in one pass."""
+    if depth.dtype != np.uint16:
+        depth = depth.astype(np.float32)
+    return cv2.compare(depth, 0, cv2.CMP_GT)
@@ -0,0 +1,193 @@
+"""
+Differential "after" uploads.
+
+Most of the tray is unchanged between the before and after captures of a
+meal. Instead of a full-frame RGB PNG and depth CSV, an after capture can
+be sent as:
+
+    manifest     - JSON: both session ids, frame shape, the changed regions
+                   and the depth delta encoding
+    rgb_region_N - PNG crop of the after image for region N; the rest of the
+                   frame is the before image
+    depth_delta  - lossless depth delta against the before frame: both maps
+                   quantised to the CSV's 0.01 unit, after - before as
+                   int16 (int32 if needed), bytes shuffled, zlib compressed
+
+The server rebuilds the frame from the before capture it already has
+(uploads carry X-Session-Id). The rebuilt depth is exactly the depth the
+full-frame CSV would carry (`apply_delta` is the reference). Regions are
+the padded bounding boxes of the areas whose depth or color changed,
+merged into one when there are too many. When they cover most of the
+frame, the full frame is sent instead. A server that can't rebuild the
+frame (409/422: it doesn't have the before capture) gets the full frame
+for that upload; one that doesn't take deltas at all (415) gets full
+frames from then on.
+"""
+import json
+import os
+import zlib
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .media_store import write_atomic
+
+DEPTH_QUANTUM = 100  # 1/100 depth unit, the precision of the "%.2f" CSV
+# Saved next to the session's other files, so the media store counts them
+MANIFEST = "delta_manifest.json"
+
+
+def delta_config():
+    config = {
+        "ENABLED": False,
+        "MIN_CHANGE_MM": 3.0,
+        "COLOR_THRESHOLD": 30,
+        "MARGIN": 8,
+        "MAX_REGIONS": 8,
+        "MAX_AREA": 0.6,
+        "MIN_REGION": 100,
+    }
+    config.update(getattr(settings, "TX2_UPLOAD_DELTA", {}))
+    return config
+
+
+def quantize_depth(depth):
+    return np.rint(np.asarray(depth, dtype=np.float64) * DEPTH_QUANTUM).astype(np.int32)
+
+
+def encode_depth_delta(before, after, level=6):
+    """(body, encoding dict) for the lossless delta of quantised `after` against `before`."""
+    delta = quantize_depth(after) - quantize_depth(before)
+    dtype = np.int16 if delta.min() >= -32768 and delta.max() <= 32767 else np.int32
+    delta = delta.astype(dtype)
+    # Byte shuffle: the high bytes of small deltas are all 0x00/0xFF and compress away
+    shuffled = delta.view(np.uint8).reshape(-1, delta.itemsize).T.tobytes()
+    encoding = {"dtype": np.dtype(dtype).str, "quantum": DEPTH_QUANTUM, "shuffle": True, "compression": "zlib"}
+    return zlib.compress(shuffled, level), encoding
+
+
+def decode_depth_delta(body, encoding, shape):
+    dtype = np.dtype(encoding["dtype"])
+    raw = np.frombuffer(zlib.decompress(body), dtype=np.uint8)
+    if encoding.get("shuffle"):
+        raw = raw.reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape).astype(np.int32)
+
+
+def changed_regions(before_depth, after_depth, before_rgb, after_rgb, min_change_mm=3.0,
+                    color_threshold=30, margin=8, max_regions=8, min_region=100):
+    """
+    Bounding boxes (x, y, w, h), padded by `margin`, of the connected areas
+    of at least `min_region` pixels whose depth or color changed. Smaller
+    specks (mostly holes inpainted differently) are ignored.
+    """
+    depth_change = cv2.blur(np.abs(np.asarray(after_depth, np.float32) - np.asarray(before_depth, np.float32)), (5, 5))
+    color_change = cv2.absdiff(cv2.blur(after_rgb, (5, 5)), cv2.blur(before_rgb, (5, 5))).max(axis=2)
+    changed = ((depth_change > min_change_mm) | (color_change > color_threshold)).astype(np.uint8)
+    changed = cv2.morphologyEx(changed, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    height, width = changed.shape
+    count, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+    regions = []
+    for x, y, w, h, area in stats[1:]:
+        if area >= min_region:
+            x0, y0 = max(x - margin, 0), max(y - margin, 0)
+            x1, y1 = min(x + w + margin, width), min(y + h + margin, height)
+            regions.append((int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+    if len(regions) > max_regions:
+        x0 = min(x for x, _, _, _ in regions)
+        y0 = min(y for _, y, _, _ in regions)
+        x1 = max(x + w for x, _, w, _ in regions)
+        y1 = max(y + h for _, y, _, h in regions)
+        regions = [(x0, y0, x1 - x0, y1 - y0)]
+    return regions
+
+
+class DeltaPayload:
+    """The parts of a differential upload; see the module docstring."""
+
+    def __init__(self, manifest, regions_png, depth_delta):
+        self.manifest = manifest
+        self.regions_png = regions_png
+        self.depth_delta = depth_delta
+
+    @property
+    def size(self):
+        return len(json.dumps(self.manifest)) + sum(map(len, self.regions_png)) + len(self.depth_delta)
+
+    def files(self):
+        """Multipart parts for requests."""
+        files = {"manifest": ("manifest.json", json.dumps(self.manifest).encode(), "application/json")}
+        for i, png in enumerate(self.regions_png):
+            files[f"rgb_region_{i}"] = (f"rgb_region_{i}.png", png, "image/png")
+        files["depth_delta"] = ("depth_delta.bin", self.depth_delta, "application/octet-stream")
+        return files
+
+    def save(self, directory):
+        """Write into `directory`, manifest last so a present manifest means complete."""
+        for i, png in enumerate(self.regions_png):
+            write_atomic(os.path.join(directory, f"delta_rgb_region_{i}.png"), png)
+        write_atomic(os.path.join(directory, "delta_depth.bin"), self.depth_delta)
+        write_atomic(os.path.join(directory, MANIFEST), json.dumps(self.manifest).encode())
+
+    @classmethod
+    def load(cls, directory):
+        """The payload saved in `directory`, or None if it has none."""
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        regions_png = []
+        for i in range(len(manifest["regions"])):
+            with open(os.path.join(directory, f"delta_rgb_region_{i}.png"), "rb") as f:
+                regions_png.append(f.read())
+        with open(os.path.join(directory, "delta_depth.bin"), "rb") as f:
+            depth_delta = f.read()
+        return cls(manifest, regions_png, depth_delta)
+
+
+def build_delta(before_session, after_session, before_depth, after_depth, before_rgb, after_rgb,
+                min_change_mm=3.0, color_threshold=30, margin=8, max_regions=8, max_area=0.6,
+                min_region=100):
+    """
+    DeltaPayload for an after capture against its before capture, or None
+    when the changed regions cover more than `max_area` of the frame.
+    """
+    if np.shape(before_depth) != np.shape(after_depth) or before_rgb.shape != after_rgb.shape:
+        return None
+    regions = changed_regions(before_depth, after_depth, before_rgb, after_rgb,
+                              min_change_mm, color_threshold, margin, max_regions, min_region)
+    height, width = after_rgb.shape[:2]
+    if sum(w * h for _, _, w, h in regions) > max_area * width * height:
+        return None
+
+    regions_png = []
+    for x, y, w, h in regions:
+        ok, png = cv2.imencode(".png", after_rgb[y:y + h, x:x + w])
+        if not ok:
+            raise RuntimeError("Failed to encode RGB region")
+        regions_png.append(png.tobytes())
+    depth_delta, encoding = encode_depth_delta(before_depth, after_depth)
+    manifest = {
+        "mode": "delta",
+        "before_session": before_session,
+        "after_session": after_session,
+        "shape": [height, width],
+        "regions": [list(region) for region in regions],
+        "depth": encoding,
+    }
+    return DeltaPayload(manifest, regions_png, depth_delta)
+
+
+def apply_delta(before_depth, before_rgb, payload):
+    """Rebuild (depth, rgb) of the after frame, as the server would: depth in 1/DEPTH_QUANTUM steps."""
+    manifest = payload.manifest
+    shape = tuple(manifest["shape"])
+    delta = decode_depth_delta(payload.depth_delta, manifest["depth"], shape)
+    depth = (quantize_depth(before_depth) + delta) / manifest["depth"]["quantum"]
+    rgb = before_rgb.copy()
+    for png, (x, y, w, h) in zip(payload.regions_png, manifest["regions"]):
+        rgb[y:y + h, x:x + w] = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+    return depth, rgb
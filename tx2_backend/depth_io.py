@@ -0,0 +1,92 @@
+"""
+Depth map storage.
+
+Depth is stored locally in a binary format and reloaded between stages
+without text parsing:
+
+    npy  - raw NumPy array, memory-mapped on load (default, any dtype)
+    png  - lossless 16-bit PNG, *.depth.png (float depth is rounded to mm)
+    csv  - the old text format, only written when explicitly asked for
+
+The format is picked from the file extension.
+"""
+import io
+import os
+
+import cv2
+import numpy as np
+
+from .media_store import atomic_path
+
+DEPTH_EXTENSIONS = {
+    "npy": ".npy",
+    "png": ".depth.png",  # keeps clear of the *_jet.png / inpainted_depth.png images
+    "csv": ".csv",
+}
+
+
+def depth_path(directory, stem, fmt="npy"):
+    try:
+        return os.path.join(directory, stem + DEPTH_EXTENSIONS[fmt])
+    except KeyError:
+        raise ValueError(f"Unknown depth format '{fmt}' (choose from {', '.join(DEPTH_EXTENSIONS)})")
+
+
+def _format_of(path):
+    for fmt, fmt_ext in DEPTH_EXTENSIONS.items():
+        if path.lower().endswith(fmt_ext):
+            return fmt
+    raise ValueError(f"Unknown depth file extension in '{path}'")
+
+
+def save_depth(path, depth):
+    """Write a depth map to `path` atomically; the extension decides the format."""
+    fmt = _format_of(path)
+    with atomic_path(path) as tmp_path:
+        if fmt == "npy":
+            np.save(tmp_path, depth)
+        elif fmt == "png":
+            if depth.dtype != np.uint16:
+                depth = np.clip(np.rint(depth), 0, 65535).astype(np.uint16)
+            # Fastest zlib level: the PNG is for storage, not for size
+            if not cv2.imwrite(tmp_path, depth, [cv2.IMWRITE_PNG_COMPRESSION, 1]):
+                raise IOError(f"Could not write {path}")
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(depth_to_csv_bytes(depth))
+    return path
+
+
+def load_depth(path, mmap=True):
+    """
+    Read a depth map written by `save_depth`.
+
+    `.npy` files are memory-mapped read-only by default, so only the pages a
+    stage touches are read from disk.
+    """
+    fmt = _format_of(path)
+    if fmt == "npy":
+        return np.load(path, mmap_mode="r" if mmap else None)
+    if fmt == "png":
+        depth = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if depth is None:
+            raise IOError(f"Could not read {path}")
+        return depth
+    return np.loadtxt(path, delimiter=",")
+
+
+def find_depth(directory, stem):
+    """Return the path of `stem` in the first available format (binary first)."""
+    for fmt in DEPTH_EXTENSIONS:
+        path = depth_path(directory, stem, fmt)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Missing depth file for {os.path.join(directory, stem)}")
+
+
+def depth_to_csv_bytes(depth):
+    """CSV text for compatibility exports and the segmentation server."""
+    fmt = "%d" if np.issubdtype(depth.dtype, np.integer) else "%.2f"
+    buffer = io.BytesIO()
+    np.savetxt(buffer, depth, fmt=fmt, delimiter=",")
+    return buffer.getvalue()
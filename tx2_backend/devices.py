@@ -0,0 +1,252 @@
+"""
+Pool of camera devices, one capture worker each.
+
+Devices are enumerated by serial number (RealSense SDK) or configured in
+TX2_CAMERA["DEVICES"]: a list of serials, or for the synthetic / replay
+sources a count. Each device gets its own worker: a `CameraService`
+streaming thread and a `CameraArbiter` that serialises and coalesces
+captures on that device only. Captures on different cameras therefore run
+in parallel, and a slow or failing camera holds up no one else.
+
+A capture is routed to the camera named in the request, or else to the
+least busy healthy one: the shortest expected wait, i.e. requests in
+flight times the camera's average capture time, so a slow camera only
+gets work when the fast ones are backed up. Ties go to the camera
+dispatched to longest ago, so idle cameras take turns
+(TX2_CAMERA["ROUTING"] = "round_robin" ignores load).
+
+A capture can also carry a pin, the segment it is for: every capture of
+a pinned segment goes to the camera its first capture used, so a
+segment's before and after frames show the same tray. `fake_pool`
+builds a pool on `arbiter.FakeDevice`s to test scheduling without
+hardware.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .arbiter import CameraArbiter, FakeDevice
+from .camera import CameraService, build_source, camera_config
+from .errors import CameraError, UnknownCameraError
+from .metrics import CAMERA_DEVICE_CAPTURES
+
+ROUTING = ("least_busy", "round_robin")
+
+# Segments remembered with their camera; the oldest are forgotten first
+MAX_PINS = 4096
+
+
+def enumerate_devices(source="realsense", devices=None):
+    """
+    Serials of the cameras to use. For RealSense: the connected devices,
+    limited to `devices` if given. Other sources have no hardware: `devices`
+    names them, or counts them ("synthetic-0", ...; one by default).
+    """
+    if source == "realsense":
+        try:
+            import pyrealsense2 as rs
+        except ImportError:
+            raise CameraError("pyrealsense2 is not installed") from None
+
+        connected = [d.get_info(rs.camera_info.serial_number) for d in rs.context().query_devices()]
+        if not connected:
+            raise CameraError("No RealSense device connected")
+        if devices is None:
+            return connected
+        missing = [serial for serial in devices if serial not in connected]
+        if missing:
+            raise CameraError(f"RealSense device(s) not connected: {', '.join(missing)}")
+        return list(devices)
+    if devices is None or isinstance(devices, int):
+        return [f"{source}-{i}" for i in range(devices or 1)]
+    return list(devices)
+
+
+class CameraDevice:
+    """One camera: its serial, capture worker and load counters."""
+
+    def __init__(self, serial, capture_fn=None, service=None, timeout=5.0):
+        self.serial = serial
+        self.service = service
+        self.arbiter = CameraArbiter(capture_fn or self._service_capture, timeout=timeout,
+                                     name=f"camera {serial}")
+        self.inflight = 0
+        self.requests = 0
+        self.last_dispatch = 0
+        self.capture_s = 0.0  # moving average, 0 until the first capture
+
+    @property
+    def expected_wait(self):
+        return (self.inflight + 1) * self.capture_s
+
+    @property
+    def healthy(self):
+        return self.service is None or self.service.last_error is None
+
+    def _service_capture(self, kind):
+        # A frame newer than any seen when the capture started, so a coalesced
+        # group never gets a frame older than its first request.
+        self.service.start()
+        newest = self.service.recent()
+        return self.service.latest(newer_than=newest[-1].index if newest else 0)
+
+    def status(self):
+        status = {
+            "serial": self.serial,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "physical_captures": self.arbiter.physical_captures,
+            "coalesced": self.arbiter.coalesced,
+            "capture_ms": round(self.capture_s * 1000.0, 1),
+            "healthy": self.healthy,
+        }
+        if self.service is not None:
+            status["running"] = self.service.running
+            status["last_error"] = str(self.service.last_error) if self.service.last_error else None
+        return status
+
+
+class DevicePool:
+    def __init__(self, devices, routing="least_busy"):
+        if not devices:
+            raise CameraError("No camera devices")
+        if routing not in ROUTING:
+            raise ValueError(f"Unknown routing '{routing}' (choose from {', '.join(ROUTING)})")
+        self.routing = routing
+        self._devices = {device.serial: device for device in devices}
+        self._dispatch = itertools.count(1)
+        self._pins = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def serials(self):
+        return list(self._devices)
+
+    def device(self, serial=None):
+        """The named device, or the first one. Raises UnknownCameraError."""
+        if serial is None:
+            return next(iter(self._devices.values()))
+        try:
+            return self._devices[serial]
+        except KeyError:
+            raise UnknownCameraError(f"Unknown camera '{serial}' (available: {', '.join(self._devices)})")
+
+    def pinned(self, pin):
+        """Serial of the camera `pin` is pinned to, or None."""
+        with self._lock:
+            return self._pins.get(pin)
+
+    def acquire(self, serial=None, pin=None):
+        """
+        Pick the device for one request and count it in flight until
+        `release`. Without a serial, a `pin` seen before goes to the same
+        device; the chosen device is remembered for the pin either way.
+        """
+        with self._lock:
+            if serial is None and pin:
+                serial = self._pins.get(pin)
+            if serial is not None:
+                device = self.device(serial)
+            elif self.routing == "round_robin":
+                device = min(self._devices.values(), key=lambda d: d.last_dispatch)
+            else:
+                device = min(self._devices.values(),
+                             key=lambda d: (not d.healthy, d.expected_wait, d.last_dispatch))
+            device.inflight += 1
+            device.requests += 1
+            device.last_dispatch = next(self._dispatch)
+            if pin:
+                self._pins[pin] = device.serial
+                self._pins.move_to_end(pin)
+                if len(self._pins) > MAX_PINS:
+                    self._pins.popitem(last=False)
+        return device
+
+    def release(self, device, elapsed=None):
+        with self._lock:
+            device.inflight -= 1
+            if elapsed is not None:
+                device.capture_s = elapsed if not device.capture_s else 0.8 * device.capture_s + 0.2 * elapsed
+
+    def capture(self, kind="rgbd", serial=None, timeout=None, pin=None):
+        """(device, frame) from the named camera, the pin's camera or the least busy one."""
+        device = self.acquire(serial, pin)
+        started = time.perf_counter()
+        try:
+            result = device.arbiter.capture(kind, timeout=timeout)
+        except Exception:
+            self.release(device)
+            raise
+        self.release(device, time.perf_counter() - started)
+        CAMERA_DEVICE_CAPTURES.inc(camera=device.serial)
+        return device, result
+
+    def status(self):
+        with self._lock:
+            return [device.status() for device in self._devices.values()]
+
+    def stop(self):
+        for device in self._devices.values():
+            if device.service is not None:
+                device.service.stop()
+
+
+def fake_pool(latencies=(0.05,), routing="least_busy", timeout=5.0):
+    """
+    A pool of FakeDevices ("fake-0", ...), one per capture latency in
+    seconds. Captures return dicts instead of frames; overlapping captures
+    on one device raise, so a scheduling bug shows up as errors.
+    """
+    devices = []
+    for i, latency in enumerate(latencies):
+        fake = FakeDevice(latency=latency, serial=f"fake-{i}")
+        devices.append(CameraDevice(fake.serial, fake.capture, timeout=timeout))
+    return DevicePool(devices, routing=routing)
+
+
+def build_device_pool(config=None):
+    """A pool of the devices and source configured in TX2_CAMERA (services not started)."""
+    config = config or camera_config()
+    fusion_frames = getattr(settings, "TX2_DEPTH_FUSION", {}).get("FRAMES", 1)
+    timeout = getattr(settings, "TX2_CAMERA_TIMEOUT", 5.0)
+    devices = []
+    for i, serial in enumerate(enumerate_devices(config["SOURCE"], config["DEVICES"])):
+        options = dict(config["OPTIONS"])
+        if config["SOURCE"] == "realsense":
+            options["serial"] = serial
+        elif config["SOURCE"] == "synthetic":
+            options.setdefault("seed", i)  # a different tray per camera
+        source = build_source(config["SOURCE"], width=config["WIDTH"], height=config["HEIGHT"],
+                              fps=config["FPS"], **options)
+        # The ring buffer also feeds temporal depth fusion
+        service = CameraService(source, buffer_size=max(config["BUFFER_SIZE"], fusion_frames),
+                                warmup_frames=config["WARMUP_FRAMES"])
+        devices.append(CameraDevice(serial, service=service, timeout=timeout))
+    return DevicePool(devices, routing=config["ROUTING"])
+
+
+# ================================================================
+#                     PROCESS-WIDE SINGLETON
+# ================================================================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_device_pool():
+    """The process-wide pool, built on first use (cameras start on their first capture)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = build_device_pool()
+        return _pool
+
+
+def shutdown_device_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
@@ -0,0 +1,22 @@
+"""
+Exceptions shared by the capture subsystem and the views.
+
+They live apart from camera.py / jobs.py so the views can catch them
+without importing OpenCV, NumPy or the RealSense SDK.
+"""
+
+
+class CameraError(RuntimeError):
+    """Raised when no frame can be obtained from the camera."""
+
+
+class CameraBusyError(CameraError):
+    """Raised when a capture could not get the device within its timeout."""
+
+
+class UnknownCameraError(CameraError):
+    """Raised when a request names a camera that isn't in the device pool."""
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity."""
@@ -0,0 +1,91 @@
+"""
+Bounded executors for the async views.
+
+Under ASGI the views run on the event loop, and blocking work is handed
+to one of three small thread pools:
+
+    camera - waiting on frames (waiters share frames through the arbiter)
+    cpu    - OpenCV / NumPy work such as encoding
+    io     - SQLite and other short blocking calls
+
+Each pool accepts at most WORKERS running plus QUEUE waiting calls
+(TX2_EXECUTORS). Past that, `run` raises ExecutorFullError at once, and
+the view answers 503 with Retry-After. Requests never pile up without
+limit.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from .metrics import EXECUTOR_REJECTED
+
+DEFAULTS = {
+    "camera": {"WORKERS": 4, "QUEUE": 8},
+    "cpu": {"WORKERS": 2, "QUEUE": 8},
+    "io": {"WORKERS": 4, "QUEUE": 32},
+}
+
+
+class ExecutorFullError(RuntimeError):
+    """Raised when an executor already has its maximum of calls in flight."""
+
+    def __init__(self, name, retry_after=1):
+        super().__init__(f"Server busy ({name} executor full), retry shortly")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, workers, max_queue, retry_after=1):
+        self.name = name
+        self.capacity = workers + max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-exec")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            EXECUTOR_REJECTED.inc(executor=self.name)
+            raise ExecutorFullError(self.name, self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+
+def busy_response(error):
+    """503 + Retry-After for a full executor, job queue or busy camera."""
+    retry_after = getattr(error, "retry_after", getattr(settings, "TX2_RETRY_AFTER", 1))
+    response = JsonResponse({
+        "status": "error",
+        "message": str(error)
+    }, status=503)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name):
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            config = dict(DEFAULTS[name])
+            config.update(getattr(settings, "TX2_EXECUTORS", {}).get(name, {}))
+            executor = _executors[name] = BoundedExecutor(
+                name, config["WORKERS"], config["QUEUE"],
+                retry_after=getattr(settings, "TX2_RETRY_AFTER", 1),
+            )
+        return executor
@@ -0,0 +1,110 @@
+"""
+Temporal depth fusion.
+
+The camera service keeps streaming after warm-up, and its ring buffer
+already holds the last few aligned depth frames. With the camera and tray
+still, a pixel that is a hole in one frame is often valid in another, so
+fusing the last N frames leaves far fewer holes for TELEA and also
+averages out sensor noise.
+
+Frames are copied into a preallocated (N, H, W) stack and combined per
+pixel over the valid (non-zero) samples only:
+
+    median - median of the valid samples (robust to flying pixels)
+    mean   - validity-weighted mean (cheaper)
+
+A pixel stays 0 only if it was invalid in every frame.
+"""
+import threading
+
+import numpy as np
+
+METHODS = ("median", "mean")
+
+
+def hole_fraction(depth):
+    """Fraction of invalid (zero) pixels."""
+    return 1.0 - np.count_nonzero(depth) / depth.size
+
+
+def _sort_frames(stack, scratch):
+    """
+    Sort `stack` along the frame axis in place with an odd-even
+    transposition network: N passes of element-wise min/max over whole
+    frames, much faster than np.sort(axis=0) for the few frames we fuse.
+    """
+    n = len(stack)
+    for i in range(n):
+        for j in range(i % 2, n - 1, 2):
+            np.minimum(stack[j], stack[j + 1], out=scratch)
+            np.maximum(stack[j], stack[j + 1], out=stack[j + 1])
+            stack[j] = scratch
+
+
+def _valid_median(stack, scratch):
+    # Zeros sort first, so the valid samples of each pixel are the last
+    # `count` entries of its sorted column. Sorts `stack` in place.
+    n = len(stack)
+    count = (stack != 0).sum(axis=0, dtype=np.uint8)
+    _sort_frames(stack, scratch)
+    plane = stack[0].size
+    offsets = np.arange(plane, dtype=np.intp).reshape(stack.shape[1:])
+    flat = stack.reshape(-1)
+    lo = (n - 1) - (count >> 1)
+    hi = np.minimum(n - ((count + 1) >> 1), n - 1)
+    median = flat.take(lo.astype(np.intp) * plane + offsets).astype(np.uint32)
+    median += flat.take(hi.astype(np.intp) * plane + offsets)
+    median += 1
+    median >>= 1
+    return median.astype(np.uint16)
+
+
+def _valid_mean(stack):
+    total = stack.sum(axis=0, dtype=np.uint32)
+    count = (stack != 0).sum(axis=0, dtype=np.uint32)
+    total += count >> 1  # round half up
+    np.floor_divide(total, np.maximum(count, 1), out=total)
+    return total.astype(np.uint16)
+
+
+class DepthFusion:
+    """Fuses up to `frames` uint16 depth frames of `shape` into one."""
+
+    def __init__(self, frames, shape, method="median"):
+        if method not in METHODS:
+            raise ValueError(f"Unknown fusion method '{method}' (choose from {', '.join(METHODS)})")
+        self.frames = frames
+        self.shape = tuple(shape)
+        self.method = method
+        self._stack = np.zeros((frames,) + self.shape, dtype=np.uint16)
+        self._scratch = np.zeros(self.shape, dtype=np.uint16)
+        self._lock = threading.Lock()
+
+    def fuse(self, depths):
+        """Fuse the newest `frames` of `depths` (oldest first); returns a new array."""
+        depths = list(depths)[-self.frames:]
+        if not depths:
+            raise ValueError("No depth frames to fuse")
+        if len(depths) == 1:
+            return depths[0]
+        with self._lock:
+            stack = self._stack[: len(depths)]
+            for slot, depth in zip(stack, depths):
+                np.copyto(slot, depth, casting="unsafe")
+            if self.method == "median":
+                return _valid_median(stack, self._scratch)
+            return _valid_mean(stack)
+
+
+_fusions = {}
+_fusions_lock = threading.Lock()
+
+
+def get_depth_fusion(frames, shape, method="median"):
+    """Shared DepthFusion (and its buffer) for one frame count, shape and method."""
+    key = (frames, tuple(shape), method)
+    with _fusions_lock:
+        fusion = _fusions.get(key)
+        if fusion is None:
+            fusion = _fusions[key] = DepthFusion(frames, shape, method)
+        return fusion
@@ -0,0 +1,220 @@
+"""
+Capture history in the project database (`models.Capture`).
+
+Every capture run is recorded when it finishes: API jobs, batches and the
+CLI scripts, plus every saved meal photo. Rows are not written on the
+capture thread. `record` puts them on a queue and one writer thread per
+process inserts them with `bulk_create`, up to BATCH_SIZE rows or
+FLUSH_INTERVAL seconds at a time, in one transaction, so SQLite's write
+lock is taken rarely and never by the pipeline. Upload outcomes that
+the outbox reports later go through the same thread, so they always
+land after their row.
+
+`page` lists captures newest first with keyset pagination. The cursor
+is the (created_at, id) of the last row returned, and the next page
+starts from it with an index range scan. A page deep in the history
+costs the same as the first; OFFSET would read and skip every row
+before it.
+"""
+import atexit
+import base64
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+SEGMENT_ENDINGS = ("/before", "/after")
+
+
+def history_config():
+    config = {
+        "ENABLED": True,
+        "BATCH_SIZE": 200,
+        "FLUSH_INTERVAL": 1.0,
+        "PAGE_SIZE": 50,
+        "MAX_PAGE_SIZE": 500,
+    }
+    config.update(getattr(settings, "TX2_HISTORY", {}))
+    return config
+
+
+def segment_key(segment_url):
+    """The segment URL without its /before or /after ending."""
+    segment = (segment_url or "").rstrip("/")
+    for ending in SEGMENT_ENDINGS:
+        if segment.endswith(ending):
+            return segment[: -len(ending)]
+    return segment
+
+
+def timestamp(seconds):
+    """Aware datetime for a time.time() value."""
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def parse_time(value):
+    """Unix seconds or ISO 8601 (naive means the server's time zone); None passes through."""
+    if value in (None, ""):
+        return None
+    try:
+        return timestamp(float(value))
+    except ValueError:
+        pass
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid time '{value}'")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def encode_cursor(capture):
+    raw = f"{capture.created_at.isoformat()}|{capture.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def query(patient_id=None, segment=None, capture_type=None, status=None, since=None, until=None,
+          cursor=None):
+    """Captures matching the filters, newest first, after `cursor` (a QuerySet)."""
+    from .models import Capture
+
+    rows = Capture.objects.all()
+    if patient_id is not None:
+        rows = rows.filter(patient_id=patient_id)
+    if segment is not None:
+        rows = rows.filter(segment=segment_key(segment))
+    if capture_type is not None:
+        rows = rows.filter(capture_type=capture_type)
+    if status is not None:
+        rows = rows.filter(status=status)
+    if since is not None:
+        rows = rows.filter(created_at__gte=since)
+    if until is not None:
+        rows = rows.filter(created_at__lt=until)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # The <= bound is what the index seeks on; the OR only settles ties
+        rows = rows.filter(Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at)
+    return rows.order_by("-created_at", "-id")
+
+
+def page(cursor=None, limit=50, **filters):
+    """
+    (captures, next_cursor): up to `limit` captures matching the filters
+    (see `query`), after `cursor`, the next_cursor of the previous page.
+    next_cursor is None on the last page.
+    """
+    captures = list(query(cursor=cursor, **filters)[: limit + 1])
+    if len(captures) > limit:
+        return captures[:limit], encode_cursor(captures[limit - 1])
+    return captures, None
+
+
+class HistoryRecorder:
+    """Writes Capture rows and upload outcomes from a queue, in batches, on one thread."""
+
+    def __init__(self, batch_size=200, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        """Queue one Capture row, given as model field values."""
+        self._put(("insert", fields))
+
+    def record_upload(self, outbox_id, status_code, text):
+        """Queue the server's answer to an outbox upload for the row that has `outbox_id`."""
+        self._put(("upload", outbox_id, status_code, text))
+
+    def flush(self, timeout=None):
+        """Write everything queued so far; returns False if that took longer than `timeout`."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def _put(self, item):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, 5.0)
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size and items[-1][0] != "flush":
+                try:
+                    items.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(items)
+            except Exception as e:
+                # e.g. the table doesn't exist yet (manage.py migrate)
+                print(f"⚠ Failed to record capture history: {e!r}")
+            for item in items:
+                if item[0] == "flush":
+                    item[1].set()
+
+    def _write(self, items):
+        from .models import Capture
+
+        inserts = [Capture(**item[1]) for item in items if item[0] == "insert"]
+        uploads = [item[1:] for item in items if item[0] == "upload"]
+        if not inserts and not uploads:
+            return
+        self._fill_uploads(inserts)
+        with transaction.atomic():
+            Capture.objects.bulk_create(inserts, batch_size=self.batch_size, ignore_conflicts=True)
+            for outbox_id, status_code, text in uploads:
+                Capture.objects.filter(outbox_id=outbox_id).update(
+                    server_status=status_code, server_response=text or "")
+
+    @staticmethod
+    def _fill_uploads(captures):
+        """Uploads the outbox finished before their row was queued: take the answer from there."""
+        from .outbox import get_outbox
+
+        for capture in captures:
+            if capture.outbox_id and capture.server_status is None:
+                try:
+                    entry = get_outbox().get(capture.outbox_id)
+                except sqlite3.Error:
+                    entry = None
+                if entry and entry["status"] in ("sent", "failed"):
+                    capture.server_status = entry["response_status"]
+                    capture.server_response = entry["response_text"] or entry["last_error"] or ""
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_history_recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            config = history_config()
+            _recorder = HistoryRecorder(config["BATCH_SIZE"], config["FLUSH_INTERVAL"])
+        return _recorder
@@ -0,0 +1,151 @@
+"""
+In-memory TELEA inpainting of numeric depth.
+
+Works straight on the captured depth array: the valid range is clipped to
+the 2nd/98th percentiles, normalised into a single-channel 16-bit image,
+inpainted, and mapped back to depth units. No JET round-trip and no files.
+
+TELEA's cost grows with the hole area, so two options cut it down:
+
+    roi     - only inpaint a region of interest (the tray), given as
+              (x, y, w, h) or "auto" to detect it from the depth; holes
+              outside it stay 0
+    pyramid - fill holes at 1/scale resolution and only run full-resolution
+              TELEA in a `band`-pixel strip next to valid pixels
+"""
+import cv2
+import numpy as np
+
+from .colorize import depth_histogram, histogram_percentiles
+
+_CLOSE_KERNEL = np.ones((3, 3), np.uint8)
+_OPEN_KERNEL = np.ones((3, 3), np.uint8)
+_NORM_MAX = 65535.0
+
+
+def depth_range(depth, valid_mask=None, percentiles=(2, 98)):
+    """Clip range (dmin, dmax) of the valid depth pixels, or None if there are none."""
+    if valid_mask is None and depth.dtype == np.uint16:
+        # Linear-time percentiles from the value histogram, no sort
+        clip_range = histogram_percentiles(depth_histogram(depth), percentiles)
+        return tuple(clip_range) if clip_range is not None else None
+    if valid_mask is None:
+        valid_mask = depth > 0
+    valid_depths = depth[valid_mask]
+    if valid_depths.size == 0:
+        return None
+    dmin, dmax = np.percentile(valid_depths, percentiles)
+    return float(dmin), float(dmax)
+
+
+def hole_mask(valid_mask):
+    """TELEA fill mask (255 = fill), with tiny gaps between holes closed."""
+    mask = np.where(valid_mask, 0, 255).astype(np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
+
+
+def _table_plane(small, valid, min_height):
+    """Least-squares plane z = a + b*x + c*y through the table pixels of `small`."""
+    yy, xx = np.nonzero(valid)
+    z = small[yy, xx].astype(np.float64)
+    design = np.column_stack([np.ones_like(z), xx, yy])
+    table = np.ones(z.shape, dtype=bool)
+    for _ in range(3):
+        # Refit without the pixels standing clear of the last fit (tray, food)
+        coeffs, *_ = np.linalg.lstsq(design[table], z[table], rcond=None)
+        table = z > design @ coeffs - min_height / 2
+    return coeffs
+
+
+def detect_roi(depth, min_height=8, margin=16, step=4):
+    """
+    Bounding box (x, y, w, h) of the largest region standing at least
+    `min_height` depth units above the table plane, padded by `margin`
+    pixels. Works on every `step`-th pixel. Returns None if nothing stands
+    out.
+    """
+    small = depth[::step, ::step].astype(np.float32)
+    valid = small > 0
+    if np.count_nonzero(valid) < 3:
+        return None
+    a, b, c = _table_plane(small, valid, min_height)
+    rows, cols = small.shape
+    plane = a + b * np.arange(cols, dtype=np.float32)[None, :] + c * np.arange(rows, dtype=np.float32)[:, None]
+
+    near = (valid & (small < plane - min_height)).astype(np.uint8)
+    near = cv2.morphologyEx(near, cv2.MORPH_OPEN, _OPEN_KERNEL)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(near, connectivity=8)
+    if count <= 1:
+        return None
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h = (int(v) * step for v in stats[largest, :4])
+
+    height, width = depth.shape
+    x0, y0 = max(x - margin, 0), max(y - margin, 0)
+    x1, y1 = min(x + w + margin, width), min(y + h + margin, height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _pyramid_fill(norm, mask, radius, scale, band):
+    """TELEA at 1/scale resolution, refined at full resolution near valid pixels."""
+    height, width = norm.shape
+    small_size = (max(width // scale, 1), max(height // scale, 1))
+
+    # Downscale the valid pixels only (holes would drag the average to 0)
+    known = (mask == 0).astype(np.float32)
+    weighted = cv2.resize(norm.astype(np.float32) * known, small_size, interpolation=cv2.INTER_AREA)
+    coverage = cv2.resize(known, small_size, interpolation=cv2.INTER_AREA)
+    small = np.divide(weighted, coverage, out=np.zeros_like(weighted), where=coverage > 0)
+    small_mask = np.where(coverage < 0.5, 255, 0).astype(np.uint8)
+    small = cv2.inpaint(small.astype(np.uint16), small_mask, radius, cv2.INPAINT_TELEA)
+    coarse = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    # Hole interiors take the coarse fill; only the band around them is
+    # inpainted at full resolution, seeded by the coarse values
+    interior = cv2.erode(mask, np.ones((2 * band + 1, 2 * band + 1), np.uint8))
+    seeded = np.where(interior > 0, coarse, norm)
+    return cv2.inpaint(seeded, cv2.subtract(mask, interior), radius, cv2.INPAINT_TELEA)
+
+
+def inpaint_depth(depth, valid_mask=None, radius=3, roi=None, pyramid=False, scale=4, band=2):
+    """
+    Fill invalid (zero) depth pixels with TELEA.
+
+    Returns float32 depth in the input's units. Pixels outside the fill mask
+    keep their measured value; filled pixels lie within the 2/98 percentile
+    range of the valid depth (of the ROI, when one is used).
+    """
+    if roi is not None:
+        if isinstance(roi, str):
+            roi = detect_roi(depth)
+        if roi is not None:
+            x, y, w, h = roi
+            out = depth.astype(np.float32)
+            crop_mask = None if valid_mask is None else valid_mask[y:y + h, x:x + w]
+            out[y:y + h, x:x + w] = inpaint_depth(depth[y:y + h, x:x + w], crop_mask, radius,
+                                                  pyramid=pyramid, scale=scale, band=band)
+            return out
+
+    clip_range = depth_range(depth, valid_mask)
+    if valid_mask is None:
+        valid_mask = depth > 0
+    if clip_range is None:
+        return np.zeros(depth.shape, dtype=np.float32)
+    dmin, dmax = clip_range
+    span = max(dmax - dmin, 1e-6)
+
+    depth_f = depth.astype(np.float32)
+    norm = np.clip(depth_f, dmin, dmax)
+    norm -= dmin
+    norm *= _NORM_MAX / span
+    norm = norm.astype(np.uint16)
+
+    mask = hole_mask(valid_mask)
+    if pyramid:
+        filled = _pyramid_fill(norm, mask, radius, scale, band)
+    else:
+        filled = cv2.inpaint(norm, mask, radius, cv2.INPAINT_TELEA)
+
+    fill = mask > 0
+    depth_f[fill] = filled[fill].astype(np.float32) * (span / _NORM_MAX) + dmin
+    return depth_f
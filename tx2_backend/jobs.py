@@ -0,0 +1,193 @@
+"""
+Background capture jobs.
+
+`capture_api` enqueues a job and returns its id straight away; a bounded
+pool of worker threads runs the capture pipeline and records stage
+progress, timings and the server response on the job. The status endpoint
+reads the job back by id.
+
+A snapshot of each job is written to the `tx2_capture_jobs` table of the
+shared SQLite database (WAL) when it is queued, enters a stage and
+finishes, so a poll that lands on another worker process still finds it.
+The process running a job answers from memory, with the live log.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .capture import CaptureLog, run_capture
+from .errors import QueueFullError
+from .metrics import StageTimer
+from .sqlite import connect
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class CaptureJob:
+    def __init__(self, capture_type, segment_url=None, patient_id=None, camera=None, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.capture_type = capture_type
+        self.segment_url = segment_url
+        self.patient_id = patient_id
+        self.camera = camera
+        self.on_change = on_change
+        self.status = QUEUED
+        self.stage = None
+        self.timer = StageTimer(on_enter=self.enter_stage)
+        self.result = None
+        self.error = None
+        self.log = CaptureLog()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def enter_stage(self, stage):
+        self.stage = stage
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "capture_type": self.capture_type,
+            "received_url": self.segment_url,
+            "patient_id": self.patient_id,
+            "camera": self.result.get("camera") if self.result else self.camera,
+            "stage": self.stage,
+            "session_id": self.result.get("session_id") if self.result else None,
+            "timings_ms": self.timer.timings_ms,
+            "server_response": self.result.get("server_response") if self.result else None,
+            "outbox_id": self.result.get("outbox_id") if self.result else None,
+            "volume": self.result.get("volume") if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "logs": self.log.text(),
+        }
+
+
+class JobStore:
+    """Job snapshots in the shared database; the newest `history` finished jobs are kept."""
+
+    def __init__(self, path=None, history=200):
+        self.path = path
+        self.history = history
+        conn = connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tx2_capture_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tx2_capture_jobs_created ON tx2_capture_jobs (created_at)")
+
+    def save(self, job):
+        # The whole row each time, so no ON CONFLICT upsert (SQLite 3.24+) is needed
+        connect(self.path).execute(
+            "INSERT OR REPLACE INTO tx2_capture_jobs (id, status, data, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (job.id, job.status, json.dumps(job.to_dict(), cls=DjangoJSONEncoder), job.created_at, time.time()),
+        )
+
+    def get(self, job_id):
+        row = connect(self.path).execute("SELECT data FROM tx2_capture_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def evict(self):
+        connect(self.path).execute(
+            "DELETE FROM tx2_capture_jobs WHERE status IN (?, ?) AND id NOT IN"
+            " (SELECT id FROM tx2_capture_jobs ORDER BY created_at DESC LIMIT ?)",
+            (SUCCEEDED, FAILED, self.history),
+        )
+
+
+class JobQueue:
+    """
+    Runs capture jobs on `workers` threads with at most `max_pending` jobs
+    waiting in this process. Jobs are recorded in `store` for polling from
+    any process; the ones still running here are also kept in memory.
+    """
+
+    def __init__(self, workers=2, max_pending=16, store=None):
+        self.max_pending = max_pending
+        self.store = store or JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="capture-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, capture_type, segment_url=None, patient_id=None, camera=None):
+        job = CaptureJob(capture_type, segment_url, patient_id, camera, on_change=self._save)
+        with self._lock:
+            if len(self._jobs) >= self.max_pending:
+                raise QueueFullError(f"{len(self._jobs)} capture jobs already pending")
+            self._jobs[job.id] = job
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def status(self, job_id):
+        """The job's to_dict(), from memory if it runs here, else from the store; None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.store.get(job_id)
+
+    def _save(self, job):
+        # A locked or full database must not fail the capture itself
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            print(f"⚠ Saving capture job {job.id} failed: {e!r}")
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = run_capture(job.capture_type, log=job.log, timer=job.timer,
+                                     segment_url=job.segment_url, patient_id=job.patient_id,
+                                     camera=job.camera)
+            job.status = SUCCEEDED
+        except Exception as e:
+            job.log(f"Error occurred: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.stage = None
+            job.finished_at = time.time()
+            self._save(job)
+            with self._lock:
+                del self._jobs[job.id]
+            try:
+                self.store.evict()
+            except sqlite3.Error as e:
+                print(f"⚠ Evicting capture jobs failed: {e!r}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                workers=getattr(settings, "TX2_CAPTURE_WORKERS", 2),
+                max_pending=getattr(settings, "TX2_CAPTURE_MAX_PENDING", 16),
+            )
+        return _queue
@@ -0,0 +1,158 @@
+"""
+Meal photo captures for the tablet.
+
+The frame is encoded in memory with cv2.imencode and returned straight
+from the view. Format (JPEG/WebP), quality and maximum dimension come
+from query options. Each capture keeps its frame and every variant
+encoded so far in a small LRU cache, so repeated previews of the same
+capture (`?capture_id=...`) are served without re-encoding or touching
+the camera. Writing the photo to the media store happens on a background
+thread, off the request path.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .media_store import get_media_store
+
+# Quality flags are cv2 attribute names; cv2 is only imported to encode
+ENCODINGS = {
+    "jpeg": (".jpg", "image/jpeg", "IMWRITE_JPEG_QUALITY"),
+    "webp": (".webp", "image/webp", "IMWRITE_WEBP_QUALITY"),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+def meal_config():
+    config = {
+        "FORMAT": "jpeg",
+        "QUALITY": 95,
+        "MAX_DIM": None,
+        "SAVE": True,
+        "CACHE_SIZE": 8,
+    }
+    config.update(getattr(settings, "TX2_MEAL", {}))
+    return config
+
+
+def encode_options(fmt=None, quality=None, max_dim=None):
+    """Validate and fill in defaults; raises ValueError on bad input."""
+    config = meal_config()
+    fmt = (fmt or config["FORMAT"]).lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in ENCODINGS:
+        raise ValueError(f"Unknown format '{fmt}' (choose from {', '.join(ENCODINGS)})")
+    quality = int(config["QUALITY"] if quality in (None, "") else quality)
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    max_dim = config["MAX_DIM"] if max_dim in (None, "") else int(max_dim)
+    if max_dim is not None and max_dim < 16:
+        raise ValueError("max_dim must be at least 16")
+    return fmt, quality, max_dim
+
+
+def encode_image(image, fmt="jpeg", quality=95, max_dim=None):
+    """Encode a BGR image, downscaled to fit `max_dim` if given. Returns bytes."""
+    import cv2
+
+    height, width = image.shape[:2]
+    if max_dim and max(height, width) > max_dim:
+        scale = max_dim / max(height, width)
+        size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ext, _, quality_flag = ENCODINGS[fmt]
+    ok, encoded = cv2.imencode(ext, image, [getattr(cv2, quality_flag), quality])
+    if not ok:
+        raise RuntimeError(f"Failed to encode meal image as {fmt}")
+    return encoded.tobytes()
+
+
+class MealCapture:
+    def __init__(self, image, camera=None):
+        self.id = uuid.uuid4().hex
+        self.image = image
+        self.camera = camera
+        self.session_id = None
+        self.created_at = time.time()
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def variant(self, fmt, quality, max_dim):
+        """Encoded bytes for these options, encoding only on first request."""
+        key = (fmt, quality, max_dim)
+        with self._lock:
+            data = self._variants.get(key)
+            if data is None:
+                data = self._variants[key] = encode_image(self.image, fmt, quality, max_dim)
+            return data
+
+    def cached(self, fmt, quality, max_dim):
+        return (fmt, quality, max_dim) in self._variants
+
+
+class MealCache:
+    """The newest `capacity` meal captures, least recently used evicted first."""
+
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self._captures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, image, camera=None):
+        capture = MealCapture(image, camera)
+        with self._lock:
+            self._captures[capture.id] = capture
+            while len(self._captures) > self.capacity:
+                self._captures.popitem(last=False)
+        return capture
+
+    def get(self, capture_id):
+        with self._lock:
+            capture = self._captures.get(capture_id)
+            if capture is not None:
+                self._captures.move_to_end(capture_id)
+            return capture
+
+
+# Disk writes happen here, one at a time, so the view never waits on eMMC
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="meal-writer")
+
+
+def _save(capture, fmt, quality, max_dim, patient_id=None):
+    from .history import get_history_recorder, history_config, timestamp
+
+    row = {"capture_type": "meal", "patient_id": patient_id or "", "camera": capture.camera or "",
+           "created_at": timestamp(capture.created_at)}
+    try:
+        data = capture.variant(fmt, quality, max_dim)
+        name = "captured_meal" + ENCODINGS[fmt][0]
+        with get_media_store().open_session("meals") as session:
+            session.write(name, data)
+        capture.session_id = session.id
+        row.update(session_id=session.id, media_dir=session.path, files=[name])
+    except Exception as e:
+        print(f"⚠ Failed to save meal capture {capture.id}: {e!r}")
+        row.update(status="failed", error=str(e))
+    if history_config()["ENABLED"]:
+        get_history_recorder().record(**row)
+
+
+def save_async(capture, fmt, quality, max_dim, patient_id=None):
+    """Queue the photo for the media store (and capture history); returns the Future."""
+    return _writer.submit(_save, capture, fmt, quality, max_dim, patient_id)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_meal_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MealCache(meal_config()["CACHE_SIZE"])
+        return _cache
@@ -0,0 +1,257 @@
+"""
+Session-scoped media storage.
+
+Every capture gets its own session directory (`<root>/<kind>/<session id>`),
+so concurrent captures never write to the same file. Files are written to a
+temporary name in the same directory and renamed into place, so a reader
+never sees a half-written image or depth map.
+
+Sessions are recorded in a SQLite index (the shared WAL database) with
+their size, last access time, segment (the segment URL without its
+/before or /after ending) and camera. The index answers "newest before
+capture of this segment on this camera" and similar lookups without
+walking the disk. When a new session would push the total over
+`TX2_MEDIA_QUOTA_MB`, the least recently used sessions are deleted
+first. Sessions whose upload is still waiting in the outbox are kept,
+and so is the newest "before" session of each segment and camera from
+the last BEFORE_KEEP seconds: volume estimates and delta uploads of the
+segment's "after" capture need it.
+"""
+import contextlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+
+from .outbox import create_outbox_table
+from .sqlite import add_missing_columns, connect
+
+# Sessions still being written are left alone by eviction, unless they
+# were abandoned (e.g. the process died) longer ago than this
+OPEN_SESSION_GRACE = 600.0
+
+# How long the newest before session of a segment is kept for its after
+BEFORE_KEEP = 12 * 3600.0
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """
+    Yield a temporary path next to `path` to write to; it is renamed over
+    `path` when the block succeeds and removed when it raises. The temporary
+    name keeps the extension, so cv2/np writers still pick the right format.
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex[:8]}-{name}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def write_atomic(path, data):
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    return path
+
+
+class MediaSession:
+    """One capture's directory. Use as a context manager, or call `close()`."""
+
+    def __init__(self, store, session_id, kind, path, segment="", camera=""):
+        self.store = store
+        self.id = session_id
+        self.kind = kind
+        self.path = path
+        self.segment = segment
+        self.camera = camera  # recorded on close, once the capture knows it
+
+    def path_for(self, name):
+        return os.path.join(self.path, name)
+
+    def write(self, name, data):
+        return write_atomic(self.path_for(name), data)
+
+    def close(self):
+        self.store.commit(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MediaStore:
+    def __init__(self, root, quota_bytes, db_path=None):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.db_path = db_path
+        conn = connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tx2_media_sessions ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " bytes INTEGER NOT NULL DEFAULT 0,"
+            " files TEXT NOT NULL DEFAULT '',"
+            " is_open INTEGER NOT NULL DEFAULT 1,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " segment TEXT NOT NULL DEFAULT '',"
+            " camera TEXT NOT NULL DEFAULT '')"
+        )
+        # Tables created before sessions recorded their segment and camera
+        add_missing_columns(conn, "tx2_media_sessions", {
+            "segment": "TEXT NOT NULL DEFAULT ''",
+            "camera": "TEXT NOT NULL DEFAULT ''",
+        })
+        conn.execute("CREATE INDEX IF NOT EXISTS tx2_media_sessions_kind ON tx2_media_sessions (kind, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS tx2_media_sessions_segment"
+                     " ON tx2_media_sessions (segment, kind, camera, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS tx2_media_sessions_lru ON tx2_media_sessions (accessed_at)")
+        create_outbox_table(conn)  # eviction skips sessions with unsent uploads
+
+    def open_session(self, kind, segment="", camera=""):
+        now = time.time()
+        session_id = f"{datetime.fromtimestamp(now):%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.root, kind, session_id)
+        os.makedirs(path)
+        connect(self.db_path).execute(
+            "INSERT INTO tx2_media_sessions (id, kind, path, created_at, accessed_at, segment, camera)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, kind, path, now, now, segment or "", camera or ""),
+        )
+        return MediaSession(self, session_id, kind, path, segment or "", camera or "")
+
+    def commit(self, session):
+        """Record the session's files, size and camera, then enforce the quota."""
+        files, total = [], 0
+        with os.scandir(session.path) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    files.append(entry.name)
+                    total += entry.stat().st_size
+        connect(self.db_path).execute(
+            "UPDATE tx2_media_sessions SET bytes = ?, files = ?, camera = ?, is_open = 0, accessed_at = ?"
+            " WHERE id = ?",
+            (total, ",".join(sorted(files)), session.camera or "", time.time(), session.id),
+        )
+        self.evict(keep=session.id)
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used sessions (other than `keep`, the newest
+        recent before session of each segment and camera, and those with
+        unsent outbox entries) until the total fits the quota.
+        """
+        conn = connect(self.db_path)
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM tx2_media_sessions").fetchone()[0]
+        if total <= self.quota_bytes:
+            return []
+        now = time.time()
+        candidates = conn.execute(
+            "SELECT id, path, bytes FROM tx2_media_sessions AS s"
+            " WHERE (is_open = 0 OR created_at < ?) AND id IS NOT ?"
+            " AND NOT (kind = 'before' AND is_open = 0 AND segment != '' AND created_at > ?"
+            "  AND NOT EXISTS (SELECT 1 FROM tx2_media_sessions WHERE kind = 'before' AND is_open = 0"
+            "   AND segment = s.segment AND camera = s.camera AND created_at > s.created_at))"
+            " AND NOT EXISTS (SELECT 1 FROM tx2_outbox WHERE session_id = s.id"
+            "  AND status IN ('pending', 'sending'))"
+            " ORDER BY accessed_at",
+            (now - OPEN_SESSION_GRACE, keep, now - BEFORE_KEEP),
+        ).fetchall()
+        evicted = []
+        for session_id, path, size in candidates:
+            if total <= self.quota_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            conn.execute("DELETE FROM tx2_media_sessions WHERE id = ?", (session_id,))
+            total -= size
+            evicted.append(session_id)
+        return evicted
+
+    def touch(self, session_id):
+        connect(self.db_path).execute(
+            "UPDATE tx2_media_sessions SET accessed_at = ? WHERE id = ?", (time.time(), session_id)
+        )
+
+    def get(self, session_id):
+        row = connect(self.db_path).execute(
+            f"SELECT {_COLUMNS} FROM tx2_media_sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return _session_dict(row) if row else None
+
+    def recent(self, kind=None, limit=20, older_than=None, segment=None, camera=None):
+        """
+        Newest finished sessions, optionally of one kind, segment and camera
+        and created before `older_than`.
+        """
+        query = f"SELECT {_COLUMNS} FROM tx2_media_sessions WHERE is_open = 0"
+        params = []
+        for column, value in (("kind", kind), ("segment", segment), ("camera", camera)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        if older_than is not None:
+            query += " AND created_at < ?"
+            params.append(older_than)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [_session_dict(row) for row in connect(self.db_path).execute(query, params)]
+
+    def segment_camera(self, segment):
+        """The camera of the segment's newest finished session ("" if none recorded)."""
+        row = connect(self.db_path).execute(
+            "SELECT camera FROM tx2_media_sessions WHERE segment = ? AND is_open = 0 AND camera != ''"
+            " ORDER BY created_at DESC LIMIT 1",
+            (segment,),
+        ).fetchone()
+        return row[0] if row else ""
+
+    def usage(self):
+        count, total = connect(self.db_path).execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM tx2_media_sessions"
+        ).fetchone()
+        return {"sessions": count, "bytes": total, "quota_bytes": self.quota_bytes}
+
+
+_COLUMNS = "id, kind, path, bytes, files, created_at, accessed_at, segment, camera"
+
+
+def _session_dict(row):
+    session_id, kind, path, size, files, created_at, accessed_at, segment, camera = row
+    return {
+        "session_id": session_id,
+        "kind": kind,
+        "path": path,
+        "segment": segment,
+        "camera": camera,
+        "bytes": size,
+        "files": files.split(",") if files else [],
+        "created_at": created_at,
+        "accessed_at": accessed_at,
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_media_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MediaStore(
+                root=getattr(settings, "TX2_MEDIA_ROOT", os.path.join(settings.BASE_DIR, "media")),
+                quota_bytes=int(getattr(settings, "TX2_MEDIA_QUOTA_MB", 1024) * 1024 * 1024),
+            )
+        return _store
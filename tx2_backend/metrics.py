@@ -0,0 +1,146 @@
+"""
+Process-local capture metrics in Prometheus text format.
+
+Counters and fixed-bucket histograms are plain Python objects guarded by a
+lock, so recording a value costs a few microseconds. `StageTimer` times the
+stages of one capture, keeps the durations for the response and feeds the
+`tx2_stage_seconds` histogram; `/metrics` renders everything.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+CAPTURES = _register(Counter("tx2_captures_total", "Captures started, by type."))
+CAPTURE_FAILURES = _register(Counter("tx2_capture_failures_total", "Captures that raised, by type."))
+UPLOADS = _register(Counter("tx2_uploads_total", "Uploads to the segmentation server, by outcome."))
+UPLOAD_BYTES = _register(Counter("tx2_upload_bytes_total", "Request body bytes sent to the segmentation server."))
+CAMERA_ERRORS = _register(Counter("tx2_camera_errors_total", "Errors reading frames from the camera source."))
+EXECUTOR_REJECTED = _register(Counter("tx2_executor_rejected_total", "Calls refused because an executor was full, by executor."))
+CAMERA_REQUESTS = _register(Counter("tx2_camera_requests_total", "Frame requests to the camera arbiter, by kind and outcome."))
+CAMERA_DEVICE_CAPTURES = _register(Counter("tx2_camera_device_captures_total", "Frame requests served, by camera serial."))
+STAGE_SECONDS = _register(Histogram("tx2_stage_seconds", "Duration of each capture stage."))
+CAPTURE_SECONDS = _register(Histogram("tx2_capture_seconds", "End-to-end capture duration, by type."))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Times the stages of one capture.
+
+        timer = StageTimer()
+        with timer.stage("inpaint"):
+            ...
+        timer.timings_ms  # {"inpaint": 41.3}
+
+    `on_enter(stage)` is called as each stage starts (job progress).
+    """
+
+    def __init__(self, on_enter=None):
+        self.on_enter = on_enter
+        self.timings_ms = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.on_enter is not None:
+            self.on_enter(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings_ms[name] = round(elapsed * 1000.0, 3)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+
+    def server_timing(self):
+        """Value for a `Server-Timing` response header."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings_ms.items())
+
+
+def observe_stage(name, seconds):
+    """Record a stage timed elsewhere (e.g. the camera thread's device open)."""
+    STAGE_SECONDS.observe(seconds, stage=name)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Capture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capture_type', models.CharField(max_length=16)),
+                ('status', models.CharField(default='succeeded', max_length=16)),
+                ('patient_id', models.CharField(blank=True, default='', max_length=64)),
+                ('segment', models.CharField(blank=True, default='', max_length=255)),
+                ('segment_url', models.TextField(blank=True, default='')),
+                ('session_id', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('media_dir', models.CharField(blank=True, default='', max_length=500)),
+                ('files', models.JSONField(blank=True, default=list)),
+                ('timings_ms', models.JSONField(blank=True, default=dict)),
+                ('outbox_id', models.CharField(blank=True, db_index=True, max_length=32, null=True)),
+                ('server_status', models.IntegerField(blank=True, null=True)),
+                ('server_response', models.TextField(blank=True, default='')),
+                ('volume', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['patient_id', '-created_at', '-id'], name='capture_patient'), models.Index(fields=['segment', '-created_at', '-id'], name='capture_segment'), models.Index(fields=['capture_type', '-created_at', '-id'], name='capture_type'), models.Index(fields=['-created_at', '-id'], name='capture_created')],
+            },
+        ),
+    ]
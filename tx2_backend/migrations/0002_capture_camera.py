@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tx2_backend', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capture',
+            name='camera',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Capture(models.Model):
+    """
+    One before/after/meal capture: who and which segment it was for, where
+    its files are, how long each stage took and what the server answered.
+    Written in batches by history.py; listed newest first with keyset
+    pagination on (created_at, id), which every index below ends in.
+    """
+
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    capture_type = models.CharField(max_length=16)
+    status = models.CharField(max_length=16, default=SUCCEEDED)
+    patient_id = models.CharField(max_length=64, blank=True, default="")
+    camera = models.CharField(max_length=64, blank=True, default="")  # device serial
+    # The segment URL without its /before or /after ending, shared by both captures
+    segment = models.CharField(max_length=255, blank=True, default="")
+    segment_url = models.TextField(blank=True, default="")
+
+    session_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    media_dir = models.CharField(max_length=500, blank=True, default="")
+    files = models.JSONField(default=list, blank=True)
+    timings_ms = models.JSONField(default=dict, blank=True)
+
+    outbox_id = models.CharField(max_length=32, null=True, blank=True, db_index=True)
+    server_status = models.IntegerField(null=True, blank=True)
+    server_response = models.TextField(blank=True, default="")
+    volume = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["patient_id", "-created_at", "-id"], name="capture_patient"),
+            models.Index(fields=["segment", "-created_at", "-id"], name="capture_segment"),
+            models.Index(fields=["capture_type", "-created_at", "-id"], name="capture_type"),
+            models.Index(fields=["-created_at", "-id"], name="capture_created"),
+        ]
+
+    def __str__(self):
+        return f"{self.capture_type} capture {self.session_id or self.pk}"
+
+    def to_dict(self):
+        return {
+            "id": self.pk,
+            "capture_type": self.capture_type,
+            "status": self.status,
+            "patient_id": self.patient_id,
+            "camera": self.camera,
+            "segment": self.segment,
+            "segment_url": self.segment_url,
+            "session_id": self.session_id,
+            "media_dir": self.media_dir,
+            "files": self.files,
+            "timings_ms": self.timings_ms,
+            "outbox_id": self.outbox_id,
+            "server_status": self.server_status,
+            "server_response": self.server_response,
+            "volume": self.volume,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+        }
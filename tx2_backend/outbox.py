@@ -0,0 +1,324 @@
+"""
+Durable store-and-forward outbox for uploads to the segmentation server.
+
+A finished capture is not uploaded on the request path. Its payload (the
+RGB PNG and inpainted depth already saved in its media session) is
+recorded in the `tx2_outbox` table of the shared SQLite database (WAL),
+and the capture returns. Drainer threads send the entries:
+
+- WORKERS threads per process upload concurrently.
+- A failed send (connection error, timeout, 408/429/5xx) is retried after
+  an exponential backoff of BACKOFF * 2**(attempts - 1) seconds, up to
+  MAX_BACKOFF, with jitter. Other 4xx responses fail the entry for good.
+- Once any send succeeds, the server is back, so the rest of the backlog
+  is pulled forward and drains at link speed instead of waiting out its
+  backoff.
+
+Every request carries `Idempotency-Key: <entry id>` (with a suffix for
+delta and uncompressed bodies, see upload.py) and the capture's
+`X-Session-Id`; an "after" session that holds a delta payload (delta.py)
+is sent as that delta. The final answer is also written to the capture's
+history row (history.py). An entry is claimed
+with a lease, so drainers in other worker processes skip it. If a process
+dies mid-send, the lease runs out and the entry is sent again with the
+same key, and the server can drop the duplicate. Entries survive restarts;
+the media store keeps a session's files until its entries are sent.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import metrics
+from .sqlite import connect
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+RETRY_STATUSES = (408, 429)
+
+# UPDATE ... RETURNING needs SQLite 3.35; the system Python of JetPack
+# (Ubuntu 18.04) ships 3.22, where claims take a write transaction instead
+RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_DUE = "(status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?)"
+
+_COLUMNS = ("id, capture_type, session_id, rgb_path, depth_path, status, attempts, next_attempt_at,"
+            " created_at, sent_at, response_status, response_text, last_error")
+
+
+def create_outbox_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS tx2_outbox ("
+        " id TEXT PRIMARY KEY,"
+        " capture_type TEXT NOT NULL,"
+        " session_id TEXT,"
+        " rgb_path TEXT NOT NULL,"
+        " depth_path TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " next_attempt_at REAL NOT NULL,"
+        " lease_until REAL,"
+        " created_at REAL NOT NULL,"
+        " sent_at REAL,"
+        " response_status INTEGER,"
+        " response_text TEXT,"
+        " last_error TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS tx2_outbox_due ON tx2_outbox (status, next_attempt_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS tx2_outbox_session ON tx2_outbox (session_id)")
+
+
+def _entry_dict(row):
+    return dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+
+
+def outbox_config():
+    config = {
+        "ENABLED": True,
+        "WORKERS": 2,
+        "BACKOFF": 1.0,
+        "MAX_BACKOFF": 300.0,
+        "MAX_ATTEMPTS": 0,
+        "LEASE": 300.0,
+        "POLL": 5.0,
+    }
+    config.update(getattr(settings, "TX2_OUTBOX", {}))
+    return config
+
+
+class Outbox:
+    def __init__(self, db_path=None, workers=2, backoff=1.0, max_backoff=300.0, max_attempts=0,
+                 lease=300.0, poll=5.0, client=None, returning=RETURNING):
+        self.db_path = db_path
+        self.returning = returning
+        self.workers = workers
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.poll = poll
+        self._client = client
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        create_outbox_table(connect(self.db_path))
+
+    @property
+    def client(self):
+        if self._client is None:
+            from .upload import build_upload_client
+
+            # Retrying is the outbox's job; don't also block in urllib3 backoff
+            self._client = build_upload_client(retries=0, pool_size=self.workers)
+        return self._client
+
+    def enqueue(self, capture_type, rgb_path, depth_path, session_id=None):
+        """Record a finished capture for upload and wake the drainer; returns the entry id."""
+        entry_id = uuid.uuid4().hex
+        now = time.time()
+        connect(self.db_path).execute(
+            "INSERT INTO tx2_outbox (id, capture_type, session_id, rgb_path, depth_path, status,"
+            " next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry_id, capture_type, session_id, rgb_path, depth_path, PENDING, now, now),
+        )
+        self.start()
+        self._wake.set()
+        return entry_id
+
+    def get(self, entry_id):
+        row = connect(self.db_path).execute(
+            f"SELECT {_COLUMNS} FROM tx2_outbox WHERE id = ?", (entry_id,)
+        ).fetchone()
+        return _entry_dict(row) if row else None
+
+    def recent(self, limit=20):
+        rows = connect(self.db_path).execute(
+            f"SELECT {_COLUMNS} FROM tx2_outbox ORDER BY created_at DESC LIMIT ?", (limit,)
+        )
+        return [_entry_dict(row) for row in rows]
+
+    def stats(self):
+        conn = connect(self.db_path)
+        counts = {status: 0 for status in (PENDING, SENDING, SENT, FAILED)}
+        counts.update(conn.execute("SELECT status, COUNT(*) FROM tx2_outbox GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM tx2_outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+        ).fetchone()[0]
+        counts["oldest_pending_s"] = time.time() - oldest if oldest else None
+        return counts
+
+    # ------------------------------------------------------------
+    #                        DRAINING
+    # ------------------------------------------------------------
+    def claim(self):
+        """Take the oldest due entry (or one whose lease ran out) for sending; None if there is none."""
+        now = time.time()
+        due = (PENDING, now, SENDING, now)
+        conn = connect(self.db_path)
+        if self.returning:
+            return conn.execute(
+                "UPDATE tx2_outbox SET status = ?, lease_until = ?, attempts = attempts + 1"
+                f" WHERE id = (SELECT id FROM tx2_outbox WHERE {_DUE} ORDER BY created_at LIMIT 1)"
+                " RETURNING id, capture_type, session_id, rgb_path, depth_path, attempts",
+                (SENDING, now + self.lease, *due),
+            ).fetchone()
+
+        # The write lock keeps drainers in other processes from claiming the same entry
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id FROM tx2_outbox WHERE {_DUE} ORDER BY created_at LIMIT 1", due
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE tx2_outbox SET status = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (SENDING, now + self.lease, row[0]),
+                )
+                row = conn.execute(
+                    "SELECT id, capture_type, session_id, rgb_path, depth_path, attempts"
+                    " FROM tx2_outbox WHERE id = ?", (row[0],),
+                ).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def deliver(self, entry):
+        """Upload one claimed entry and record the outcome."""
+        from .delta import DeltaPayload
+        from .depth_io import load_depth
+
+        entry_id, capture_type, session_id, rgb_path, depth_path, attempts = entry
+        try:
+            with open(rgb_path, "rb") as f:
+                rgb_png = f.read()
+            depth = load_depth(depth_path)
+            delta = DeltaPayload.load(os.path.dirname(rgb_path))
+        except (OSError, ValueError) as e:
+            self._finish(entry_id, FAILED, error=f"Payload unavailable: {e}")
+            return FAILED
+
+        headers = {"Idempotency-Key": entry_id}
+        if session_id:
+            headers["X-Session-Id"] = session_id
+        try:
+            response = self.client.send(capture_type, rgb_png, depth, headers=headers, delta=delta)
+        except Exception as e:
+            metrics.UPLOADS.inc(outcome="error")
+            return self._retry(entry_id, attempts, repr(e))
+
+        metrics.UPLOADS.inc(outcome=str(response.status_code))
+        metrics.UPLOAD_BYTES.inc(response.sent_bytes)
+        if response.ok:
+            self._finish(entry_id, SENT, response.status_code, response.text)
+            self._pull_forward()
+            return SENT
+        if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+            return self._retry(entry_id, attempts, f"HTTP {response.status_code}", response.status_code)
+        self._finish(entry_id, FAILED, response.status_code, response.text, f"HTTP {response.status_code}")
+        return FAILED
+
+    def _retry(self, entry_id, attempts, error, status_code=None):
+        if self.max_attempts and attempts >= self.max_attempts:
+            self._finish(entry_id, FAILED, status_code, error=error)
+            return FAILED
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        delay *= random.uniform(0.5, 1.0)  # spread retries of a backlog out
+        connect(self.db_path).execute(
+            "UPDATE tx2_outbox SET status = ?, next_attempt_at = ?, lease_until = NULL,"
+            " response_status = ?, last_error = ? WHERE id = ?",
+            (PENDING, time.time() + delay, status_code, error, entry_id),
+        )
+        return PENDING
+
+    def _finish(self, entry_id, status, status_code=None, text=None, error=None):
+        from .history import get_history_recorder, history_config
+
+        connect(self.db_path).execute(
+            "UPDATE tx2_outbox SET status = ?, sent_at = ?, lease_until = NULL, response_status = ?,"
+            " response_text = ?, last_error = ? WHERE id = ?",
+            (status, time.time() if status == SENT else None, status_code, text, error, entry_id),
+        )
+        if history_config()["ENABLED"]:
+            get_history_recorder().record_upload(entry_id, status_code, text or error)
+
+    def _pull_forward(self):
+        """The server answered: make entries waiting out a backoff due now."""
+        now = time.time()
+        cursor = connect(self.db_path).execute(
+            "UPDATE tx2_outbox SET next_attempt_at = ? WHERE status = ? AND next_attempt_at > ?",
+            (now, PENDING, now),
+        )
+        if cursor.rowcount:
+            self._wake.set()
+
+    def _idle_wait(self):
+        next_due = connect(self.db_path).execute(
+            "SELECT MIN(next_attempt_at) FROM tx2_outbox WHERE status = ?", (PENDING,)
+        ).fetchone()[0]
+        if next_due is None:
+            return self.poll
+        return min(max(next_due - time.time(), 0.01), self.poll)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                entry = self.claim()
+                if entry is None:
+                    self._wake.wait(self._idle_wait())
+                    continue
+                self.deliver(entry)
+            except Exception as e:
+                print(f"⚠ Outbox drainer error: {e!r}")
+                self._stop.wait(1.0)
+
+    def start(self):
+        """Start this process's drainer threads (once)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            config = outbox_config()
+            _outbox = Outbox(
+                workers=config["WORKERS"],
+                backoff=config["BACKOFF"],
+                max_backoff=config["MAX_BACKOFF"],
+                max_attempts=config["MAX_ATTEMPTS"],
+                lease=config["LEASE"],
+                poll=config["POLL"],
+            )
+        return _outbox
@@ -0,0 +1,147 @@
+"""
+Live MJPEG preview from the persistent camera service.
+
+One encoder thread per camera and process takes the newest color frame
+at most `TX2_PREVIEW["FPS"]` times a second, encodes it to JPEG once and
+keeps the bytes. Every viewer's stream sends whichever frame is newest when it
+is ready for the next one. The encoding cost does not depend on the number
+of viewers, and a slow client simply skips frames instead of building a
+backlog. With no viewers the encoder sleeps. Viewers stream from an async
+iterator under ASGI and a plain one under WSGI, where each viewer holds
+a worker thread.
+"""
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+
+from .camera import get_camera_service
+from .devices import get_device_pool
+from .meal import encode_image
+
+BOUNDARY = "frame"
+
+
+def _part(jpeg):
+    header = f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+    return header.encode() + jpeg + b"\r\n"
+
+
+class PreviewBroadcaster:
+    """Encodes frames from `service` once, for any number of viewers."""
+
+    def __init__(self, service, fps=5.0, quality=70, max_dim=640):
+        self.service = service
+        self.interval = 1.0 / fps
+        self.poll = min(self.interval / 2, 0.05)
+        self.quality = quality
+        self.max_dim = max_dim
+        self.latest = None  # (seq, multipart chunk)
+        self.encoded = 0
+        self.viewers = 0
+        self._wanted = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="preview-encoder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        last_index = 0
+        next_at = time.monotonic()
+        while True:
+            if not self._wanted.is_set():
+                self._wanted.wait()
+                next_at = time.monotonic()
+            try:
+                frameset = self.service.latest(newer_than=last_index, timeout=5.0)
+                last_index = frameset.index
+                chunk = _part(encode_image(frameset.color, "jpeg", self.quality, self.max_dim))
+            except Exception as e:
+                print(f"⚠ Preview frame failed: {e!r}")
+                time.sleep(1.0)
+                continue
+            self.encoded += 1
+            self.latest = (self.encoded, chunk)
+
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()
+
+    def _join(self):
+        with self._lock:
+            self.viewers += 1
+            self._wanted.set()
+
+    def _leave(self):
+        with self._lock:
+            self.viewers -= 1
+            if self.viewers == 0:
+                self._wanted.clear()
+
+    def _chunks(self):
+        """Each new frame's chunk, with None whenever the viewer should wait and look again."""
+        last_seq = None
+        while True:
+            latest = self.latest
+            if latest is not None and latest[0] != last_seq:
+                last_seq = latest[0]
+                yield latest[1]
+            else:
+                yield None
+
+    async def stream(self):
+        """multipart/x-mixed-replace chunks: each new frame, skipping any this viewer was too slow for."""
+        self.start()
+        self._join()
+        try:
+            for chunk in self._chunks():
+                if chunk is None:
+                    await asyncio.sleep(self.poll)
+                else:
+                    yield chunk
+        finally:
+            self._leave()
+
+    def stream_sync(self):
+        """`stream` for WSGI servers, which can only send from a blocking iterator."""
+        self.start()
+        self._join()
+        try:
+            for chunk in self._chunks():
+                if chunk is None:
+                    time.sleep(self.poll)
+                else:
+                    yield chunk
+        finally:
+            self._leave()
+
+
+_broadcasters = {}
+_broadcaster_lock = threading.Lock()
+
+
+def get_preview_broadcaster(camera=None):
+    """The broadcaster of the named camera (default: the first one)."""
+    # Keyed by the resolved serial: one encoder per camera however it is named
+    serial = get_device_pool().device(camera).serial
+    with _broadcaster_lock:
+        service = get_camera_service(serial)
+        broadcaster = _broadcasters.get(serial)
+        if broadcaster is None or broadcaster.service is not service:
+            config = {"FPS": 5.0, "QUALITY": 70, "MAX_DIM": 640}
+            config.update(getattr(settings, "TX2_PREVIEW", {}))
+            broadcaster = _broadcasters[serial] = PreviewBroadcaster(
+                service,
+                fps=config["FPS"],
+                quality=config["QUALITY"],
+                max_dim=config["MAX_DIM"],
+            )
+        return broadcaster
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "corsheaders",
+    "tx2_backend.apps.Tx2BackendConfig",
 ]
 
 MIDDLEWARE = [
@@ -153,4 +155,189 @@ CSRF_TRUSTED_ORIGINS = [
     "http://localhost:4200",
     "http://127.0.0.1:4200",
     "https://h3vkhzth-4200.asse.devtunnels.ms"
-]
\ No newline at end of file
+]
+
+# ================================================================
+#                       TX2 CAPTURE SETTINGS
+# ================================================================
+
+# Persistent camera service (see tx2_backend/camera.py).
+# SOURCE is "realsense", "synthetic" or "replay"; OPTIONS go to the source.
+# DEVICES: RealSense serials to use (None = every connected camera), or for
+# the other sources a count. Captures without ?camera= stay on the camera of
+# their segment's earlier captures; a new segment goes to the least busy
+# camera ("least_busy") or takes turns ("round_robin"); see devices.py. Keep
+# the camera executor WORKERS and TX2_CAPTURE_WORKERS >= the camera count.
+TX2_CAMERA = {
+    "SOURCE": os.environ.get("TX2_CAMERA_SOURCE", "realsense"),
+    "WIDTH": 848,
+    "HEIGHT": 480,
+    "FPS": 30,
+    "BUFFER_SIZE": 4,
+    "WARMUP_FRAMES": 5,
+    "OPTIONS": {},
+    "DEVICES": None,
+    "ROUTING": "least_busy",
+}
+
+# Load the capture stack, start the camera and run one capture + encode at
+# startup (server processes only), so the first request isn't the slow one.
+# Off by default: imports stay lazy and the camera starts on first use.
+TX2_WARMUP = os.environ.get("TX2_WARMUP", "0") == "1"
+
+# Temporal depth fusion: fill holes and average noise over the last FRAMES
+# depth frames from the camera ring buffer ("median" or "mean" of the valid
+# samples per pixel). 1 disables it; see benchmarks/bench_fusion.py.
+TX2_DEPTH_FUSION = {
+    "FRAMES": 1,
+    "METHOD": "median",
+}
+
+# Longest a capture request waits for the camera (shared or its own frame)
+# before failing with 503 + Retry-After.
+TX2_CAMERA_TIMEOUT = 5.0
+
+# On-device volume estimate (api/capture/volume/): tray ROI ("auto", None or
+# [x, y, w, h]) and the height drop in mm that counts as food eaten. With
+# AUTO, every "after" capture computes it against the newest "before" of
+# the same segment and camera (none without one).
+TX2_VOLUME = {
+    "ROI": "auto",
+    "MIN_CHANGE_MM": 3.0,
+    "AUTO": True,
+}
+
+# Depth artifacts are stored as "npy" (memory-mapped), "png" (16-bit) or "csv".
+# Set TX2_DEPTH_CSV_EXPORT to also write the old CSV files next to them.
+TX2_DEPTH_FORMAT = "npy"
+TX2_DEPTH_CSV_EXPORT = False
+
+# TELEA inpainting. ROI: None (whole frame), "auto" (detect the tray from the
+# depth) or [x, y, w, h]; holes outside it are left at 0. PYRAMID fills hole
+# interiors at 1/PYRAMID_SCALE resolution and refines a PYRAMID_BAND-pixel
+# strip at full resolution. See benchmarks/bench_inpaint.py.
+TX2_INPAINT = {
+    "RADIUS": 3,
+    "ROI": None,
+    "PYRAMID": False,
+    "PYRAMID_SCALE": 4,
+    "PYRAMID_BAND": 2,
+}
+
+# Also save depth_mask.png and the JET visualisations for debugging.
+TX2_DEBUG_ARTIFACTS = False
+
+# Each capture is written to its own session directory under TX2_MEDIA_ROOT;
+# the least recently used sessions are deleted beyond TX2_MEDIA_QUOTA_MB.
+TX2_MEDIA_ROOT = BASE_DIR / "media"
+TX2_MEDIA_QUOTA_MB = 1024
+
+# Meal photos from /api/capture/meal/: defaults for the format, quality and
+# max_dim query options, whether to also save each photo to the media store
+# (in the background), and how many captures keep their encoded variants.
+TX2_MEAL = {
+    "FORMAT": "jpeg",
+    "QUALITY": 95,
+    "MAX_DIM": None,
+    "SAVE": True,
+    "CACHE_SIZE": 8,
+}
+
+# Live MJPEG preview (/api/capture/preview/): frames encoded per second (once,
+# shared by all viewers), JPEG quality and longest side in pixels.
+TX2_PREVIEW = {
+    "FPS": 5.0,
+    "QUALITY": 70,
+    "MAX_DIM": 640,
+}
+
+# Segmentation server: uploads go to <URL>/before and <URL>/after.
+TX2_SEGMENT_SERVER_URL = "https://h3vkhzth-8000.asse.devtunnels.ms/api/segment"
+TX2_UPLOAD_TIMEOUT = (5, 120)  # (connect, read) seconds
+TX2_UPLOAD_COMPRESSION = "gzip"  # gzip the depth CSV part; None to send it plain
+TX2_UPLOAD_RETRIES = 3  # connect errors and 502/503/504, with exponential backoff
+TX2_UPLOAD_BACKOFF = 0.5
+TX2_UPLOAD_VERIFY_TLS = False
+
+# Differential "after" uploads (see tx2_backend/delta.py): only the regions
+# that changed since the segment's newest "before" capture, plus a lossless depth
+# delta. The server must hold the before capture (X-Session-Id); it answers
+# 409/422 to get the full frame instead. Regions are where depth changed by
+# MIN_CHANGE_MM or color by COLOR_THRESHOLD, at least MIN_REGION pixels,
+# padded by MARGIN; over MAX_AREA of the frame the full frame is sent.
+TX2_UPLOAD_DELTA = {
+    "ENABLED": False,
+    "MIN_CHANGE_MM": 3.0,
+    "COLOR_THRESHOLD": 30,
+    "MARGIN": 8,
+    "MAX_REGIONS": 8,
+    "MAX_AREA": 0.6,
+    "MIN_REGION": 100,
+}
+
+# Upload outbox (see tx2_backend/outbox.py): captures are recorded in the
+# shared database and uploaded by WORKERS drainer threads per process, so a
+# capture never waits on the tunnel and nothing is lost while the server is
+# down. Failed sends back off BACKOFF * 2**n seconds up to MAX_BACKOFF;
+# MAX_ATTEMPTS 0 retries forever. LEASE must exceed the upload read timeout.
+TX2_OUTBOX = {
+    "ENABLED": True,
+    "WORKERS": 2,
+    "BACKOFF": 1.0,
+    "MAX_BACKOFF": 300.0,
+    "MAX_ATTEMPTS": 0,
+    "LEASE": 300.0,
+    "POLL": 5.0,
+}
+
+# Background capture jobs started by /api/capture/. MAX_PENDING is per
+# worker process; job status is kept in the shared SQLite database, so
+# /api/capture/jobs/<id>/ answers from any worker.
+TX2_CAPTURE_WORKERS = 2
+TX2_CAPTURE_MAX_PENDING = 16
+
+# Capture history (see tx2_backend/history.py): every capture gets a row in
+# the project database, written by a background thread in bulk_create
+# batches of up to BATCH_SIZE rows or every FLUSH_INTERVAL seconds.
+# api/capture/history/ pages through it (PAGE_SIZE rows, at most MAX_PAGE_SIZE).
+# TX2_HISTORY=0 in the environment turns recording off (e.g. for benchmarks).
+TX2_HISTORY = {
+    "ENABLED": os.environ.get("TX2_HISTORY", "1") != "0",
+    "BATCH_SIZE": 200,
+    "FLUSH_INTERVAL": 1.0,
+    "PAGE_SIZE": 50,
+    "MAX_PAGE_SIZE": 500,
+}
+
+# Thread pools behind the async views: at most WORKERS running plus QUEUE
+# waiting calls each; beyond that requests get 503 with Retry-After
+# (seconds) instead of queueing.
+TX2_EXECUTORS = {
+    "camera": {"WORKERS": 4, "QUEUE": 8},
+    "cpu": {"WORKERS": 2, "QUEUE": 8},
+    "io": {"WORKERS": 4, "QUEUE": 32},
+}
+TX2_RETRY_AFTER = 1
+
+# Batch capture (api/capture/batch/): most URLs per request, batches allowed
+# to run at once, and concurrent uploads within a batch.
+TX2_CAPTURE_BATCH_MAX = 16
+TX2_CAPTURE_BATCH_CONCURRENCY = 1
+TX2_CAPTURE_BATCH_UPLOADS = 2
+
+# Live weight: shared through SQLite (WAL) so all workers agree; the event
+# stream at /api/weight/stream/ pushes at most this many updates per second.
+TX2_WEIGHT_STREAM_HZ = 5.0
+
+# Weight history and settle detection (per process). AUTO_CAPTURE queues a
+# "before" job when a loaded tray settles and an "after" job when it settles
+# again at least MIN_CHANGE grams lighter.
+TX2_WEIGHT_MONITOR = {
+    "CAPACITY": 4096,  # samples kept in the ring buffer
+    "WINDOW_S": 1.5,
+    "MAX_STD": 2.0,
+    "MIN_SAMPLES": 5,
+    "EMPTY_BELOW": 20.0,
+    "MIN_CHANGE": 10.0,
+    "AUTO_CAPTURE": False,
+}
@@ -0,0 +1,40 @@
+"""
+Small helpers for the raw SQLite tables shared by all worker processes.
+
+Connections run in WAL mode so readers in other Gunicorn/ASGI workers never
+block the writer, and are cached per thread.
+"""
+import sqlite3
+import threading
+
+from django.conf import settings
+
+_local = threading.local()
+
+
+def database_path():
+    return str(getattr(settings, "TX2_SHARED_DB", settings.DATABASES["default"]["NAME"]))
+
+
+def connect(path=None):
+    """Return this thread's autocommit connection to `path` (WAL mode)."""
+    path = path or database_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        connections[path] = conn
+    return conn
+
+
+def add_missing_columns(conn, table, columns):
+    """ALTER TABLE ADD COLUMN each of `columns` ({name: definition}) the table lacks."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
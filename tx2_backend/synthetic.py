@@ -0,0 +1,112 @@
+"""
+Synthetic RealSense-like frames.
+
+Used by the synthetic camera source and the benchmarks so the capture
+pipeline can be exercised without a device attached.
+"""
+import cv2
+import numpy as np
+
+
+def synthetic_scene(width=848, height=480, rng=None):
+    """Noise-free float32 depth (millimetres) of a tray with food on a table."""
+    rng = np.random.default_rng(rng)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    # Slightly tilted table about 420 mm from the camera
+    depth = 420.0 + 0.015 * yy - 0.005 * xx
+
+    # Tray raised 15 mm off the table in the middle of the frame
+    tray = (np.abs(xx - width / 2) < width * 0.32) & (np.abs(yy - height / 2) < height * 0.34)
+    depth[tray] -= 15.0
+
+    # A few food mounds on the tray
+    for _ in range(4):
+        cx = rng.uniform(width * 0.25, width * 0.75)
+        cy = rng.uniform(height * 0.25, height * 0.75)
+        radius = rng.uniform(30, 80)
+        peak = rng.uniform(10, 40)
+        depth -= peak * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2))
+    return depth
+
+
+def _hole_field(width, height, rng, left_band=True):
+    """Smooth noise; thresholding it at a quantile gives blob-shaped holes."""
+    coarse = rng.random((max(height // 24, 2), max(width // 24, 2))).astype(np.float32)
+    field = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    if left_band:
+        field[:, : width // 40] = -1.0  # invalid left band
+    return field
+
+
+def _noisy(scene, rng):
+    depth = scene + rng.normal(0.0, 0.8, size=scene.shape)
+    return np.clip(depth, 1, 65535).astype(np.uint16)
+
+
+def synthetic_depth(width=848, height=480, hole_fraction=0.1, rng=None):
+    """
+    Build a tray-on-a-table uint16 depth frame (millimetres) with holes.
+
+    About `hole_fraction` of the pixels are set to 0 (invalid), grouped in
+    blobs plus an invalid band on the left edge like a real D4xx sensor.
+    """
+    rng = np.random.default_rng(rng)
+    depth = _noisy(synthetic_scene(width, height, rng), rng)
+
+    if hole_fraction > 0:
+        field = _hole_field(width, height, rng)
+        depth[field <= np.quantile(field, hole_fraction)] = 0
+
+    return depth
+
+
+def synthetic_sequence(scene, count, hole_fraction=0.1, static_fraction=0.5, rng=None):
+    """
+    `count` uint16 frames of one static `scene`, like consecutive frames
+    from a fixed camera: fresh sensor noise each frame, and holes of which
+    `static_fraction` stay put (left band, dark or shiny surfaces) while the
+    rest move from frame to frame.
+    """
+    rng = np.random.default_rng(rng)
+    height, width = scene.shape
+    static_mask = np.zeros(scene.shape, dtype=bool)
+    if hole_fraction > 0 and static_fraction > 0:
+        field = _hole_field(width, height, rng)
+        static_mask = field <= np.quantile(field, hole_fraction * static_fraction)
+
+    dynamic_fraction = hole_fraction * (1.0 - static_fraction)
+    frames = []
+    for _ in range(count):
+        depth = _noisy(scene, rng)
+        depth[static_mask] = 0
+        if dynamic_fraction > 0:
+            field = _hole_field(width, height, rng, left_band=False)
+            depth[field <= np.quantile(field, dynamic_fraction)] = 0
+        frames.append(depth)
+    return frames
+
+
+def synthetic_color(depth, rng=None):
+    """Build a BGR frame that roughly follows the depth frame's layout."""
+    rng = np.random.default_rng(rng)
+    height, width = depth.shape
+    color = np.empty((height, width, 3), dtype=np.uint8)
+    color[:] = (70, 90, 110)  # table
+
+    valid = depth > 0
+    near = valid & (depth < np.median(depth[valid]) - 5) if np.any(valid) else valid
+    color[near] = (200, 200, 205)  # tray
+
+    food = valid & (depth < np.percentile(depth[valid], 20)) if np.any(valid) else valid
+    color[food] = (40, 120, 190)
+
+    noise = rng.integers(-6, 7, size=color.shape, dtype=np.int16)
+    return np.clip(color.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_frame(width=848, height=480, hole_fraction=0.1, rng=None):
+    """Return an aligned (depth, color) pair."""
+    rng = np.random.default_rng(rng)
+    depth = synthetic_depth(width, height, hole_fraction, rng)
+    return depth, synthetic_color(depth, rng)
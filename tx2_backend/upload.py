@@ -0,0 +1,164 @@
+"""
+Upload client for the GPU segmentation server.
+
+One keep-alive `requests.Session` per process, so captures reuse pooled
+connections to the tunnel instead of a new TCP/TLS handshake each time.
+Multipart bodies are built from in-memory bytes, the depth CSV is gzip
+compressed, and connection failures / 502-504 responses are retried with
+exponential backoff.
+
+Compression is negotiated: the request carries `X-Depth-Encoding: gzip`
+and the depth part is sent with `Content-Encoding: gzip`. A server that
+answers 415 gets the plain CSV from then on.
+
+"After" captures can be sent as a delta against the before capture (see
+delta.py), marked `X-Upload-Mode: delta`. If the server answers 409/422
+that upload is sent again as a full frame; after a 415, deltas are no
+longer offered.
+
+Each kind of body gets its own `Idempotency-Key`, derived from the one
+passed in: the full frame keeps it, a delta sends `<key>:delta` and a
+plain (uncompressed) depth CSV `<key>:plain`. A server that stores
+replies per key would otherwise answer a fallback with the reply it
+stored for the rejected body.
+"""
+import gzip
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .depth_io import depth_to_csv_bytes
+
+
+def body_headers(headers, variant):
+    """`headers` with the Idempotency-Key (if any) made specific to one body variant."""
+    key = (headers or {}).get("Idempotency-Key")
+    if not key:
+        return headers
+    return dict(headers, **{"Idempotency-Key": f"{key}:{variant}"})
+
+
+class UploadClient:
+    def __init__(self, base_url, compression="gzip", compression_level=3, timeout=(5, 120),
+                 retries=3, backoff=0.5, pool_size=4, verify=False, delta=True):
+        self.base_url = base_url.rstrip("/")
+        self.compression = compression
+        self.delta = delta
+        self.compression_level = compression_level
+        self.timeout = timeout
+        self.verify = verify
+
+        # POSTs are retried on connect errors and gateway statuses only:
+        # a read timeout means the server may already be processing it.
+        retry = Retry(
+            total=retries, connect=retries, read=0, status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url_for(self, capture_type):
+        return f"{self.base_url}/{capture_type}"
+
+    def encode_depth(self, depth, compression):
+        """Return (filename, body, part_headers) for the depth CSV part."""
+        body = depth_to_csv_bytes(depth)
+        if compression == "gzip":
+            body = gzip.compress(body, compresslevel=self.compression_level)
+            return "inpainted_depth.csv.gz", body, {"Content-Encoding": "gzip"}
+        return "inpainted_depth.csv", body, {}
+
+    def send(self, capture_type, rgb_png, depth, headers=None, delta=None):
+        """
+        POST one capture. `rgb_png` is the encoded PNG bytes and `depth` the
+        inpainted depth array; `delta` an optional DeltaPayload sent in their
+        place. Returns the `requests.Response`; connection errors and
+        timeouts are raised.
+        """
+        if delta is not None and self.delta:
+            prepared, sent_bytes = self.prepare_delta(capture_type, delta, headers)
+            response = self.session.send(prepared, timeout=self.timeout, verify=self.verify)
+            if response.status_code not in (409, 415, 422):
+                response.sent_bytes = sent_bytes
+                return response
+            if response.status_code == 415:
+                # Server doesn't take deltas; stop offering them
+                self.delta = False
+        response, sent_bytes = self._post(capture_type, rgb_png, depth, self.compression, headers)
+        if response.status_code == 415 and self.compression:
+            # Server can't take compressed depth; stop offering it
+            self.compression = None
+            response, sent_bytes = self._post(capture_type, rgb_png, depth, None, headers)
+        response.sent_bytes = sent_bytes
+        return response
+
+    def prepare(self, capture_type, rgb_png, depth, compression, headers=None):
+        """Build the multipart request (no I/O). Returns (PreparedRequest, body bytes)."""
+        filename, depth_body, part_headers = self.encode_depth(depth, compression)
+        files = {
+            "rgb_image": ("rgb_image.png", rgb_png, "image/png"),
+            "depth_csv": (filename, depth_body, "text/csv", part_headers),
+        }
+        request_headers = dict((headers if compression else body_headers(headers, "plain")) or {})
+        if compression:
+            request_headers["X-Depth-Encoding"] = compression
+        request = requests.Request("POST", self.url_for(capture_type), files=files,
+                                   headers=request_headers)
+        prepared = self.session.prepare_request(request)
+        return prepared, len(rgb_png) + len(depth_body)
+
+    def prepare_delta(self, capture_type, delta, headers=None):
+        """Build the multipart request for a DeltaPayload. Returns (PreparedRequest, body bytes)."""
+        request_headers = dict(body_headers(headers, "delta") or {})
+        request_headers["X-Upload-Mode"] = "delta"
+        request_headers["X-Before-Session-Id"] = delta.manifest["before_session"]
+        request = requests.Request("POST", self.url_for(capture_type), files=delta.files(),
+                                   headers=request_headers)
+        return self.session.prepare_request(request), delta.size
+
+    def _post(self, capture_type, rgb_png, depth, compression, headers):
+        prepared, sent_bytes = self.prepare(capture_type, rgb_png, depth, compression, headers)
+        response = self.session.send(prepared, timeout=self.timeout, verify=self.verify)
+        return response, sent_bytes
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def build_upload_client(**overrides):
+    """A new UploadClient configured from settings; keyword arguments override them."""
+    options = {
+        "compression": getattr(settings, "TX2_UPLOAD_COMPRESSION", "gzip"),
+        "timeout": getattr(settings, "TX2_UPLOAD_TIMEOUT", (5, 120)),
+        "retries": getattr(settings, "TX2_UPLOAD_RETRIES", 3),
+        "backoff": getattr(settings, "TX2_UPLOAD_BACKOFF", 0.5),
+        "verify": getattr(settings, "TX2_UPLOAD_VERIFY_TLS", False),
+        "delta": getattr(settings, "TX2_UPLOAD_DELTA", {}).get("ENABLED", False),
+    }
+    options.update(overrides)
+    return UploadClient(
+        getattr(settings, "TX2_SEGMENT_SERVER_URL",
+                "https://h3vkhzth-8000.asse.devtunnels.ms/api/segment"),
+        **options,
+    )
+
+
+def get_upload_client():
+    """Return the process-wide upload client (one connection pool per process)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = build_upload_client()
+        return _client
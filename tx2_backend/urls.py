@@ -17,11 +17,40 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path
-from .views import capture_api, capture_meal
+from .views import (
+    camera_list,
+    capture_api,
+    capture_batch,
+    capture_history,
+    capture_job_status,
+    capture_meal,
+    capture_preview,
+    get_weight,
+    meal_volume,
+    metrics_view,
+    set_weight,
+    upload_outbox,
+    upload_outbox_entry,
+    weight_history,
+    weight_stream,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/capture/", capture_api),
+    path("api/capture/batch/", capture_batch),
+    path("api/capture/history/", capture_history),
+    path("api/capture/jobs/<str:job_id>/", capture_job_status),
     path("api/capture/meal/", capture_meal),
+    path("api/capture/preview/", capture_preview),
+    path("api/capture/outbox/", upload_outbox),
+    path("api/capture/outbox/<str:entry_id>/", upload_outbox_entry),
+    path("api/capture/volume/", meal_volume),
+    path("api/cameras/", camera_list),
+    path("api/weight/", get_weight),
+    path("api/weight/set/", set_weight),
+    path("api/weight/stream/", weight_stream),
+    path("api/weight/history/", weight_history),
+    path("metrics", metrics_view),
 ]
 
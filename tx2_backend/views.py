@@ -1,57 +1,136 @@
-from django.http import FileResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 import json
-import subprocess
-import os
-import sys
-import cv2
-import numpy as np
-import pyrealsense2 as rs
-from datetime import datetime
+import math
+import time
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MEDIA_DIR = os.path.join(BASE_DIR, "../media/meals")
+from . import metrics
+from .errors import CameraBusyError, CameraError, QueueFullError, UnknownCameraError
+from .executors import ExecutorFullError, busy_response, get_executor
+from .meal import ENCODINGS, encode_options, get_meal_cache, meal_config, save_async
+from .metrics import StageTimer
+from .outbox import get_outbox
 
-os.makedirs(MEDIA_DIR, exist_ok=True)
+# The capture subsystem (OpenCV, NumPy, RealSense SDK) is imported inside
+# the views that use it, so manage.py commands don't load it. Set
+# TX2_WARMUP to load it at startup instead (see apps.py).
 
-# Global variable to store the weight
-current_live_weight = 0.0
+def is_asgi(request):
+    """
+    Streaming bodies must be async iterators under ASGI and plain ones under
+    WSGI: Django would otherwise collect the whole stream before sending it.
+    """
+    return isinstance(request, ASGIRequest)
+
+# ==========================================================
+#                   LIVE WEIGHT
+#   Stored in SQLite (WAL) so every worker sees the same value
+# ==========================================================
 
 @csrf_exempt
-def set_weight(request):
-    global current_live_weight
+async def set_weight(request):
+    """
+    Ingest scale readings. Accepts {"weight": w} or a batch
+    {"samples": [{"weight": w, "timestamp": unix_seconds}, ...]};
+    timestamps default to the time the request arrived. Samples older than
+    the newest one already received are dropped ("accepted" counts the
+    rest); non-finite values are a 400.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            current_live_weight = data.get('weight', 0.0)
-            return JsonResponse({'status': 'ok'})
-        except:
+            now = time.time()
+            samples = data['samples'] if 'samples' in data else [data]
+            weights = [float(s.get('weight', 0.0)) for s in samples]
+            timestamps = [float(s.get('timestamp') or now) for s in samples]
+        except (ValueError, TypeError, AttributeError, KeyError):
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        # json.loads accepts NaN and Infinity
+        if not all(math.isfinite(v) for v in weights + timestamps):
+            return JsonResponse({'status': 'error', 'message': 'Weights and timestamps must be finite'},
+                                status=400)
+        try:
+            accepted, event = await get_executor("io").run(_ingest_weight, timestamps, weights)
+        except ExecutorFullError as e:
+            return busy_response(e)
+        return JsonResponse({'status': 'ok', 'received': len(weights), 'accepted': accepted, 'event': event})
     return JsonResponse({'error': 'POST only'}, status=405)
 
-def get_weight(request):
-    return JsonResponse({'weight': current_live_weight})
+def _ingest_weight(timestamps, weights):
+    from .weight import get_weight_monitor
+    return get_weight_monitor().ingest(timestamps, weights)
+
+async def get_weight(request):
+    from .weight import get_weight_store
+    try:
+        reading = await get_executor("io").run(lambda: get_weight_store().get())
+    except ExecutorFullError as e:
+        return busy_response(e)
+    return JsonResponse({'weight': reading['weight'], 'updated_at': reading['updated_at']})
+
+async def weight_history(request):
+    """Recent samples, downsampled: ?seconds=60&points=200."""
+    try:
+        seconds = float(request.GET.get('seconds', 60))
+        points = max(int(request.GET.get('points', 200)), 1)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid query'}, status=400)
+    try:
+        history = await get_executor("cpu").run(_weight_history, seconds, points)
+    except ExecutorFullError as e:
+        return busy_response(e)
+    return JsonResponse(history)
+
+def _weight_history(seconds, points):
+    from .weight import get_weight_monitor
+    monitor = get_weight_monitor()
+    history = monitor.series.history(seconds, points)
+    history['last_event'] = monitor.last_event
+    return history
+
+def weight_stream(request):
+    """Server-sent events with the live weight, coalesced to TX2_WEIGHT_STREAM_HZ."""
+    from .weight import get_weight_broadcaster
+    broadcaster = get_weight_broadcaster()
+    response = StreamingHttpResponse(
+        broadcaster.events() if is_asgi(request) else broadcaster.events_sync(),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # ==========================================================
 #                   NEW CAPTURE API
 # ==========================================================
 
 @csrf_exempt   # <-- THIS FIXES YOUR 403 ERROR
-def capture_api(request): #let this receive url then print the url received
+async def capture_api(request): #let this receive url then print the url received
     """
     Called by Angular Frontend.
-    Triggers either capture_before.py or capture_after.py based on the segment URL.
-    Routes based on URL ending: /before -> capture_before.py, /after -> capture_after.py
+    Queues a before/after capture job based on the segment URL and returns
+    its id at once; poll /api/capture/jobs/<job_id>/ for progress.
+    Routes based on URL ending: /before -> "before", /after -> "after"
+    Optional "camera": serial of the camera to use (default: the camera of
+    the segment's earlier captures, else the least busy one).
     """
+    from .capture import capture_type_from_url
+    from .jobs import get_job_queue
+
     try:
         segment_url = None
+        patient_id = request.GET.get('patient_id')
+        camera = request.GET.get('camera')
         
         # Receive URL from request
         if request.method == 'POST':
             try:
                 data = json.loads(request.body)
                 segment_url = data.get('segment_url', None)
+                patient_id = data.get('patient_id', patient_id)
+                camera = data.get('camera', camera)
                 
                 # Print the received URL
                 if segment_url:
@@ -69,63 +148,26 @@ def capture_api(request): #let this receive url then print the url received
             else:
                 print("ℹ No segment_url in query parameters")
         
-        # Determine which script to run based on URL
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        
-        script_name = "capture_before.py"  # Default
-        capture_type = "before"  # Default
-        
-        if segment_url:
-            if segment_url.endswith('/before'):
-                script_name = "capture_before.py"
-                capture_type = "before"
-                print(f"🎯 Detected 'before' endpoint - using {script_name}")
-            elif segment_url.endswith('/after'):
-                script_name = "capture_after.py"
-                capture_type = "after"
-                print(f"🎯 Detected 'after' endpoint - using {script_name}")
-            else:
-                print(f"⚠ Unknown endpoint in URL: {segment_url} - defaulting to 'before'")
-        
-        script_path = os.path.join(project_root, script_name)
-
-        if not os.path.exists(script_path):
-            return JsonResponse({
-                "status": "error",
-                "message": f"Script not found at {script_path}"
-            }, status=500)
-
-        # Pass the URL to the appropriate capture script
-        command = [sys.executable, script_path]
-        if segment_url:
-            command.extend(['--segment-url', segment_url])
-            print(f"🚀 Running {script_name} with URL: {segment_url}")
-        else:
-            print(f"🚀 Running {script_name} without URL")
+        # Determine which segment type to run based on URL
+        capture_type = capture_type_from_url(segment_url)
+        if segment_url and not segment_url.rstrip('/').endswith('/' + capture_type):
+            print(f"⚠ Unknown endpoint in URL: {segment_url} - defaulting to 'before'")
 
-        result = subprocess.run(
-            command, 
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        job = get_job_queue().submit(capture_type, segment_url, patient_id, camera)
+        job.log(f"🚀 Queued '{capture_type}' capture job {job.id}")
 
         return JsonResponse({
-            "status": "success",
-            "message": f"Capture {capture_type} successful and sent to server.",
+            "status": "queued",
+            "message": f"Capture {capture_type} queued.",
+            "job_id": job.id,
+            "status_url": f"/api/capture/jobs/{job.id}/",
             "received_url": segment_url,
             "capture_type": capture_type,
-            "script_used": script_name,
-            "logs": result.stdout
-        })
+            "camera": camera,
+        }, status=202)
 
-    except subprocess.CalledProcessError as e:
-        return JsonResponse({
-            "status": "error",
-            "message": f"Capture script failed.",
-            "error_logs": e.stderr
-        }, status=500)
+    except QueueFullError as e:
+        return busy_response(e)
 
     except Exception as e:
         return JsonResponse({
@@ -134,77 +176,269 @@ def capture_api(request): #let this receive url then print the url received
         }, status=500)
 
 
-def capture_meal_rgb(width=848, height=480, fps=30):
+@csrf_exempt
+async def capture_batch(request):
     """
-    Capture a single RGB frame from Intel RealSense.
-    Returns: numpy array (BGR image)
+    Capture several segments in one pipelined run.
+    POST {"segment_urls": [...], "upload": true, "patient_id": "...",
+    "camera": "<serial>"}; streams one JSON line per item as it finishes,
+    then a summary line.
     """
-    pipeline = rs.pipeline()
-    config = rs.config()
+    from .batch import run_batch
 
-    # Enable RGB stream only
-    config.enable_stream(
-        rs.stream.color,
-        width,
-        height,
-        rs.format.bgr8,
-        fps
-    )
+    if request.method != 'POST':
+        return JsonResponse({"status": "error", "message": "POST required"}, status=405)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+
+    segment_urls = data.get('segment_urls')
+    max_items = getattr(settings, "TX2_CAPTURE_BATCH_MAX", 16)
+    if not isinstance(segment_urls, list) or not segment_urls or len(segment_urls) > max_items:
+        return JsonResponse({
+            "status": "error",
+            "message": f"segment_urls must be a list of 1 to {max_items} URLs"
+        }, status=400)
+    print(f"✓ Received batch of {len(segment_urls)} segment URLs")
 
     try:
-        pipeline.start(config)
+        results = run_batch(segment_urls, upload=bool(data.get('upload', True)),
+                            patient_id=data.get('patient_id'), camera=data.get('camera'))
+    except QueueFullError as e:
+        return busy_response(e)
 
-        # Warm-up frames (critical for RealSense)
-        for _ in range(5):
-            pipeline.wait_for_frames()
+    if is_asgi(request):
+        lines = (json.dumps(result) + "\n" async for result in results)
+    else:
+        lines = (json.dumps(result) + "\n" for result in results)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-        frames = pipeline.wait_for_frames()
-        color_frame = frames.get_color_frame()
 
-        if not color_frame:
-            raise RuntimeError("Failed to capture RGB frame")
+def capture_job_status(request, job_id):
+    """Stage progress, timings and server response of a queued capture, from any worker."""
+    from .jobs import get_job_queue
 
-        # Convert to numpy array (OpenCV BGR format)
-        color_image = np.asanyarray(color_frame.get_data())
+    job = get_job_queue().status(job_id)
+    if job is None:
+        return JsonResponse({
+            "status": "error",
+            "message": f"Unknown job {job_id}"
+        }, status=404)
+    return JsonResponse(job)
 
-        return color_image
 
-    finally:
-        # Always release the camera
-        pipeline.stop()
+def upload_outbox(request):
+    """Outbox counts by status plus the newest entries: ?limit=20."""
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 0), 500)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid query'}, status=400)
+    outbox = get_outbox()
+    return JsonResponse({'counts': outbox.stats(), 'entries': outbox.recent(limit)})
 
 
-@csrf_exempt
-def capture_meal(request):
+def upload_outbox_entry(request, entry_id):
+    """Upload status and server response of one capture handed to the outbox."""
+    entry = get_outbox().get(entry_id)
+    if entry is None:
+        return JsonResponse({
+            "status": "error",
+            "message": f"Unknown outbox entry {entry_id}"
+        }, status=404)
+    return JsonResponse(entry)
+
+
+def capture_history(request):
+    """
+    Recorded captures, newest first. Filters: patient_id, segment (segment
+    URL, with or without /before or /after), capture_type, status, since /
+    until (unix seconds or ISO 8601). Pages of ?limit=50; pass the response's
+    next_cursor as ?cursor= for the next page.
+    """
+    from .history import history_config, page, parse_time
+
+    config = history_config()
     try:
-        # Ensure RealSense device exists
-        ctx = rs.context()
-        if len(ctx.devices) == 0:
-            return JsonResponse({
-                "status": "error",
-                "message": "No RealSense device detected"
-            }, status=500)
-
-        # Capture RGB image
-        rgb_image = capture_meal_rgb()
-
-        # Save as captured_meal.jpg (overwrite-safe timestamp)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"captured_meal_{timestamp}.jpg"
-        file_path = os.path.join(MEDIA_DIR, filename)
-
-        cv2.imwrite(file_path, rgb_image)
-
-        # Return image to frontend
-        return FileResponse(
-            open(file_path, "rb"),
-            content_type="image/jpeg",
-            filename=filename
+        limit = min(max(int(request.GET.get('limit', config["PAGE_SIZE"])), 1), config["MAX_PAGE_SIZE"])
+        captures, next_cursor = page(
+            patient_id=request.GET.get('patient_id'),
+            segment=request.GET.get('segment'),
+            capture_type=request.GET.get('capture_type'),
+            status=request.GET.get('status'),
+            since=parse_time(request.GET.get('since')),
+            until=parse_time(request.GET.get('until')),
+            cursor=request.GET.get('cursor'),
+            limit=limit,
         )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'results': [c.to_dict() for c in captures], 'next_cursor': next_cursor})
+
+
+async def meal_volume(request):
+    """
+    Consumed food volume between a before and an after capture, computed on
+    the device: ?before=<session_id>&after=<session_id>. Either may be left
+    out: newest after session, newest before session of the same segment and
+    camera taken ahead of it.
+    Results are cached per session pair.
+    """
+    from .volume import get_volume_estimator
+
+    try:
+        result = await get_executor("cpu").run(
+            get_volume_estimator().estimate, request.GET.get('before'), request.GET.get('after'))
+    except ExecutorFullError as e:
+        return busy_response(e)
+    except (LookupError, FileNotFoundError) as e:
+        return JsonResponse({
+            "status": "error",
+            "message": str(e)
+        }, status=404)
+    except ValueError as e:
+        return JsonResponse({
+            "status": "error",
+            "message": str(e)
+        }, status=400)
+    return JsonResponse(result)
+
+
+def capture_meal_rgb(timeout=None, camera=None):
+    """
+    Grab a fresh RGB frame from the named or least busy camera; concurrent
+    requests on a camera share one frame. Returns: (serial, BGR image)
+    """
+    from .devices import get_device_pool
+
+    device, frameset = get_device_pool().capture("color", camera, timeout=timeout)
+    return device.serial, frameset.color
+
+
+@csrf_exempt
+async def capture_meal(request):
+    """
+    Capture a meal photo and return it, encoded in memory.
+
+    Query options: format=jpeg|webp, quality=1-100, max_dim=<pixels>.
+    Pass capture_id=<X-Capture-Id of an earlier response> to get another
+    variant of that photo (cached per capture) instead of a new capture,
+    and camera=<serial> to pick the camera (default: least busy).
+    Camera waits and encoding run on bounded executors; 503 + Retry-After
+    when they are full.
+    """
+    timer = StageTimer()
+    try:
+        fmt, quality, max_dim = encode_options(
+            request.GET.get('format'), request.GET.get('quality'), request.GET.get('max_dim'))
+    except ValueError as e:
+        return JsonResponse({
+            "status": "error",
+            "message": str(e)
+        }, status=400)
+
+    try:
+        capture_id = request.GET.get('capture_id')
+        if capture_id:
+            capture = get_meal_cache().get(capture_id)
+            if capture is None:
+                return JsonResponse({
+                    "status": "error",
+                    "message": f"Capture {capture_id} is no longer cached"
+                }, status=404)
+        else:
+            # Capture RGB image (CameraError if the device is missing or stalled)
+            with timer.stage("capture"):
+                serial, image = await get_executor("camera").run(
+                    capture_meal_rgb, None, request.GET.get('camera'))
+                capture = get_meal_cache().add(image, camera=serial)
+            metrics.CAPTURES.inc(capture_type="meal")
+
+            # Keep a full-size copy in the media store, written in the background
+            if meal_config()["SAVE"] and request.GET.get('save', '1') != '0':
+                save_async(capture, *encode_options(), patient_id=request.GET.get('patient_id'))
+
+        cached = capture.cached(fmt, quality, max_dim)
+        with timer.stage("encode"):
+            if cached:
+                data = capture.variant(fmt, quality, max_dim)
+            else:
+                data = await get_executor("cpu").run(capture.variant, fmt, quality, max_dim)
+
+        ext, content_type, _ = ENCODINGS[fmt]
+        response = HttpResponse(data, content_type=content_type)
+        response["Content-Disposition"] = f'inline; filename="captured_meal_{capture.id}{ext}"'
+        response["X-Capture-Id"] = capture.id
+        response["X-Camera"] = capture.camera
+        response["X-Cache"] = "HIT" if cached else "MISS"
+        response["Server-Timing"] = timer.server_timing()
+        return response
+
+    except ExecutorFullError as e:
+        return busy_response(e)
+
+    except UnknownCameraError as e:
+        return JsonResponse({
+            "status": "error",
+            "message": str(e)
+        }, status=404)
+
+    except CameraBusyError as e:
+        metrics.CAPTURE_FAILURES.inc(capture_type="meal")
+        return busy_response(e)
+
+    except CameraError as e:
+        metrics.CAPTURE_FAILURES.inc(capture_type="meal")
+        print("❌ capture_meal camera error:", repr(e))
+        return JsonResponse({
+            "status": "error",
+            "message": str(e)
+        }, status=503)
 
     except Exception as e:
+        metrics.CAPTURE_FAILURES.inc(capture_type="meal")
         print("❌ capture_meal error:", repr(e))
         return JsonResponse({
             "status": "error",
             "message": str(e)
         }, status=500)
+
+
+def capture_preview(request):
+    """
+    Live MJPEG preview (use as an <img> src) of ?camera=<serial>, default
+    the first camera; frames shared by all viewers.
+    """
+    from .preview import BOUNDARY, get_preview_broadcaster
+
+    try:
+        broadcaster = get_preview_broadcaster(request.GET.get('camera'))
+    except UnknownCameraError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=404)
+    except CameraError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=503)
+    response = StreamingHttpResponse(
+        broadcaster.stream() if is_asgi(request) else broadcaster.stream_sync(),
+        content_type=f'multipart/x-mixed-replace; boundary={BOUNDARY}'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def camera_list(request):
+    """The cameras in the device pool with their load, capture counts and errors."""
+    from .devices import get_device_pool
+
+    try:
+        pool = get_device_pool()
+    except CameraError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=503)
+    return JsonResponse({'routing': pool.routing, 'cameras': pool.status()})
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's capture metrics."""
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
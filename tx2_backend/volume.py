@@ -0,0 +1,269 @@
+"""
+On-device consumed-volume estimate from a before/after depth pair.
+
+Both inpainted depth maps are deprojected with the stream intrinsics saved
+next to them (camera.json) into heights above the table plane, which is
+fitted in metric space to the before frame. Over the tray region (detected
+from the before depth, or a fixed ROI), the pixels whose height dropped
+by more than MIN_CHANGE_MM make up the consumed area, grown into
+connected pixels that dropped by a third of that, so the shallow rim of
+a removed portion counts too. Each of them adds
+the volume of its viewing frustum between the two surfaces,
+(z_after^3 - z_before^3) / (3 fx fy). Pixels that rose give the added
+volume in the same way. Everything is whole-array NumPy on the ROI crop,
+so an estimate takes a few milliseconds.
+
+Results are cached per (before, after) session pair in the shared SQLite
+database. An "after" capture computes its own estimate against the newest
+"before" session of the same segment taken by the same camera
+(TX2_VOLUME["AUTO"]), so the amount eaten is known without a round trip
+to the segmentation server. Without such a session there is no estimate:
+another tray's before frame would give a meaningless one.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .camera import Intrinsics, default_intrinsics
+from .depth_io import find_depth, load_depth
+from .inpaint import detect_roi
+from .media_store import get_media_store
+from .sqlite import connect
+
+
+def volume_config():
+    config = {
+        "ROI": "auto",
+        "MIN_CHANGE_MM": 3.0,
+        "AUTO": True,
+    }
+    config.update(getattr(settings, "TX2_VOLUME", {}))
+    return config
+
+
+def ray_factors(intrinsics):
+    """Per-column x/z and per-row y/z of the pixel rays, as broadcastable float32 arrays."""
+    rx = (np.arange(intrinsics.width, dtype=np.float32) - intrinsics.ppx) / intrinsics.fx
+    ry = (np.arange(intrinsics.height, dtype=np.float32) - intrinsics.ppy) / intrinsics.fy
+    return rx[None, :], ry[:, None]
+
+
+def fit_table_plane(z, rx, ry, min_height=0.008, step=4):
+    """
+    Least-squares plane Z = a + b*X + c*Y (metres) through the table pixels
+    of metric depth `z`, refitted without points standing `min_height` / 2
+    clear of the last fit. Works on every `step`-th pixel.
+    """
+    small = z[::step, ::step]
+    yy, xx = np.nonzero(small > 0)
+    zs = small[yy, xx].astype(np.float64)
+    xs = zs * rx[0, ::step][xx]
+    ys = zs * ry[::step, 0][yy]
+    design = np.column_stack([np.ones_like(zs), xs, ys])
+    table = np.ones(zs.shape, dtype=bool)
+    for _ in range(3):
+        coeffs, *_ = np.linalg.lstsq(design[table], zs[table], rcond=None)
+        # The table is the far surface: drop what sits closer to the camera
+        table = zs > design @ coeffs - min_height / 2
+    return coeffs
+
+
+def _hysteresis(weak, strong):
+    """Pixels of `weak` connected to at least one pixel of `strong`."""
+    count, labels = cv2.connectedComponents(weak.astype(np.uint8), connectivity=8)
+    if count <= 1:
+        return strong
+    keep = np.zeros(count, dtype=bool)
+    keep[labels[strong]] = True
+    keep[0] = False
+    return keep[labels]
+
+
+def plane_geometry(plane, rx, ry, intrinsics):
+    """
+    For plane Z = a + b*X + c*Y with normal m = (-b, -c, 1): m.r per pixel
+    ray (a point Z*r lies (a - Z m.r) / |m| above the plane), and each
+    pixel's footprint (m^2) on the plane itself, Z_t^2 |m| / (fx fy m.r)
+    at the ray's plane depth Z_t = a / m.r.
+    """
+    a, b, c = plane
+    norm = float(np.sqrt(1.0 + b * b + c * c))
+    m_dot_r = (1.0 - b * rx - c * ry).astype(np.float32)
+    table_z = a / m_dot_r
+    footprint = table_z * table_z * (norm / (intrinsics.fx * intrinsics.fy)) / m_dot_r
+    return m_dot_r, norm, footprint
+
+
+def estimate_volume(before, after, intrinsics, depth_scale=0.001, roi="auto", min_change_mm=3.0):
+    """
+    Consumed / added volume (ml) and consumed area (cm^2) between two
+    aligned depth maps of the same tray. `roi` is (x, y, w, h), "auto" to
+    detect the tray in `before`, or None for the whole frame.
+    """
+    started = time.perf_counter()
+    before = np.asarray(before)
+    after = np.asarray(after)
+    if before.shape != after.shape:
+        raise ValueError(f"Depth shapes differ: {before.shape} vs {after.shape}")
+    if (intrinsics.height, intrinsics.width) != before.shape:
+        raise ValueError("Intrinsics do not match the depth resolution")
+
+    rx, ry = ray_factors(intrinsics)
+    z_before = before.astype(np.float32) * depth_scale
+    plane = fit_table_plane(z_before, rx, ry)
+
+    if isinstance(roi, str):
+        roi = detect_roi(before)
+    if roi is None:
+        roi = (0, 0, before.shape[1], before.shape[0])
+    x, y, w, h = roi
+    crop = np.s_[y:y + h, x:x + w]
+    rx, ry = rx[:, x:x + w], ry[y:y + h, :]
+
+    z_before = z_before[crop]
+    z_after = after[crop].astype(np.float32) * depth_scale
+    m_dot_r, norm, footprint = plane_geometry(plane, rx, ry, intrinsics)
+
+    valid = (z_before > 0) & (z_after > 0)
+    # Height drop along the table normal; thresholded after light smoothing,
+    # so sensor noise doesn't count as food
+    drop = np.where(valid, (z_after - z_before) * m_dot_r / norm, 0.0).astype(np.float32)
+    drop = cv2.blur(drop, (5, 5))
+    threshold = min_change_mm / 1000.0
+    consumed = valid & _hysteresis(drop > threshold / 3, drop > threshold)
+    added = valid & _hysteresis(drop < -threshold / 3, drop < -threshold)
+
+    # Volume between the two surfaces inside each pixel's viewing frustum
+    frustum = (z_after ** 3 - z_before ** 3) / (3.0 * intrinsics.fx * intrinsics.fy)
+    consumed_m3 = float(frustum[consumed].sum(dtype=np.float64))
+    added_m3 = float(-frustum[added].sum(dtype=np.float64))
+    return {
+        "consumed_ml": consumed_m3 * 1e6,
+        "added_ml": added_m3 * 1e6,
+        "net_ml": (consumed_m3 - added_m3) * 1e6,
+        "consumed_area_cm2": float(footprint[consumed].sum(dtype=np.float64)) * 1e4,
+        "changed_fraction": float(np.count_nonzero(consumed | added)) / consumed.size,
+        "valid_fraction": float(np.count_nonzero(valid)) / valid.size,
+        "roi": [int(v) for v in roi],
+        "table_tilt_deg": float(np.degrees(np.arctan(np.hypot(plane[1], plane[2])))),
+        "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+    }
+
+
+def _camera_info(path, shape):
+    """Intrinsics and depth scale saved with a session (defaults for older sessions)."""
+    try:
+        with open(os.path.join(path, "camera.json")) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        info = {}
+    intrinsics = info.get("intrinsics")
+    intrinsics = Intrinsics(**intrinsics) if intrinsics else default_intrinsics(shape[1], shape[0])
+    return intrinsics, info.get("depth_scale") or 0.001
+
+
+class VolumeEstimator:
+    """Estimates for media store session pairs, cached in `tx2_volume_results`."""
+
+    def __init__(self, store, roi="auto", min_change_mm=3.0, db_path=None):
+        self.store = store
+        self.roi = roi
+        self.min_change_mm = min_change_mm
+        self.db_path = db_path
+        connect(self.db_path).execute(
+            "CREATE TABLE IF NOT EXISTS tx2_volume_results ("
+            " before_id TEXT NOT NULL,"
+            " after_id TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (before_id, after_id))"
+        )
+
+    def cached(self, before_id, after_id):
+        row = connect(self.db_path).execute(
+            "SELECT result FROM tx2_volume_results WHERE before_id = ? AND after_id = ?",
+            (before_id, after_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pair(self, before_id=None, after_id=None):
+        """
+        (before, after) session dicts. Missing ids mean the newest "after"
+        session and the newest "before" session of its segment and camera
+        taken before it. Raises LookupError if a session doesn't exist.
+        """
+        after = self._session(after_id, "after")
+        if before_id:
+            return self._session(before_id, "before"), after
+        return self.matching_before(after["segment"], after["camera"], older_than=after["created_at"]), after
+
+    def matching_before(self, segment, camera, older_than=None):
+        """The newest before session of `segment` on `camera`; raises LookupError if there is none."""
+        if not segment:
+            raise LookupError("No segment recorded, so no before session to pair with")
+        newest = self.store.recent("before", limit=1, older_than=older_than, segment=segment, camera=camera)
+        if not newest:
+            raise LookupError(f"No before session for segment {segment} on camera {camera or '(unknown)'}")
+        return newest[0]
+
+    def _session(self, session_id, kind):
+        session = self.store.get(session_id) if session_id else (self.store.recent(kind, limit=1) or [None])[0]
+        if session is None:
+            raise LookupError(f"No {kind} session {session_id or 'found'}")
+        return session
+
+    def estimate(self, before_id=None, after_id=None):
+        """Cached estimate for a session pair (see `pair`), computed on first request."""
+        before, after = self.pair(before_id, after_id)
+        result = self.cached(before["session_id"], after["session_id"])
+        if result is not None:
+            return dict(result, cached=True)
+        after_depth = load_depth(find_depth(after["path"], "inpainted_depth"))
+        intrinsics, depth_scale = _camera_info(after["path"], after_depth.shape)
+        return self._compute(before, after["session_id"], after_depth, intrinsics, depth_scale)
+
+    def estimate_capture(self, after_id, after_depth, intrinsics, depth_scale, segment, camera):
+        """
+        Estimate for an "after" capture still in progress, against the newest
+        before session of its segment and camera (LookupError if none).
+        """
+        before = self.matching_before(segment, camera)
+        return self._compute(before, after_id, after_depth, intrinsics, depth_scale)
+
+    def _compute(self, before, after_id, after_depth, intrinsics, depth_scale):
+        before_depth = load_depth(find_depth(before["path"], "inpainted_depth"))
+        if intrinsics is None:
+            intrinsics = default_intrinsics(after_depth.shape[1], after_depth.shape[0])
+        result = estimate_volume(before_depth, after_depth, intrinsics, depth_scale,
+                                 roi=self.roi, min_change_mm=self.min_change_mm)
+        result.update(before_id=before["session_id"], after_id=after_id)
+        connect(self.db_path).execute(
+            "INSERT OR REPLACE INTO tx2_volume_results (before_id, after_id, result, created_at)"
+            " VALUES (?, ?, ?, ?)",
+            (before["session_id"], after_id, json.dumps(result), time.time()),
+        )
+        self.store.touch(before["session_id"])
+        return dict(result, cached=False)
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_volume_estimator():
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            config = volume_config()
+            roi = config["ROI"]
+            _estimator = VolumeEstimator(
+                get_media_store(),
+                roi=tuple(roi) if isinstance(roi, (list, tuple)) else roi,
+                min_change_mm=config["MIN_CHANGE_MM"],
+            )
+        return _estimator
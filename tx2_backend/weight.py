@@ -0,0 +1,360 @@
+"""
+Live scale weight shared by every worker process.
+
+The latest reading lives in a one-row SQLite table (WAL mode), so any
+Gunicorn/ASGI worker can answer `get_weight` with the same value. One
+broadcaster thread per process polls that row at `TX2_WEIGHT_STREAM_HZ`
+and the server-sent-event streams read from it, so high-rate scale posts
+are coalesced to that rate no matter how many clients are listening.
+Streams come as async iterators for ASGI servers and plain ones for WSGI,
+where each open stream holds a worker thread.
+
+Each process also keeps the recent samples it ingested in a fixed-size
+NumPy ring buffer. A rolling mean/variance detector on that buffer notices
+when a tray has settled and can queue a before/after capture job. History,
+like detection, covers the samples posted to this process, so point the
+scale at a single worker.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .errors import QueueFullError
+from .sqlite import connect
+
+
+class WeightStore:
+    """The latest weight reading, with a sequence number bumped on each write."""
+
+    def __init__(self, path=None):
+        self.path = path
+        connect(self.path).execute(
+            "CREATE TABLE IF NOT EXISTS tx2_live_weight ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " weight REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " seq INTEGER NOT NULL)"
+        )
+
+    def set(self, weight, timestamp=None):
+        # Upsert by hand: ON CONFLICT needs SQLite 3.24 (see outbox.RETURNING)
+        conn = connect(self.path)
+        reading = (float(weight), timestamp or time.time())
+        update = "UPDATE tx2_live_weight SET weight = ?, updated_at = ?, seq = seq + 1 WHERE id = 1"
+        if conn.execute(update, reading).rowcount:
+            return
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO tx2_live_weight (id, weight, updated_at, seq) VALUES (1, ?, ?, 1)", reading
+        ).rowcount
+        if not inserted:  # another process wrote the first reading in between
+            conn.execute(update, reading)
+
+    def get(self):
+        row = connect(self.path).execute(
+            "SELECT weight, updated_at, seq FROM tx2_live_weight WHERE id = 1"
+        ).fetchone()
+        if row is None:
+            return {"weight": 0.0, "updated_at": None, "seq": 0}
+        return {"weight": row[0], "updated_at": row[1], "seq": row[2]}
+
+
+class WeightBroadcaster:
+    """
+    Polls the store at `rate_hz` on a single thread and keeps the newest
+    reading in memory for any number of streaming clients.
+    """
+
+    def __init__(self, store, rate_hz=5.0):
+        self.store = store
+        self.interval = 1.0 / rate_hz
+        self.latest = store.get()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="weight-broadcaster", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.latest = self.store.get()
+            except Exception as e:
+                print(f"⚠ Weight poll failed: {e!r}")
+            time.sleep(self.interval)
+
+    def _chunks(self, heartbeat):
+        """SSE byte chunks, with None whenever the stream should wait one interval."""
+        self.start()
+        last_seq = None
+        last_sent = 0.0
+        while True:
+            reading = self.latest
+            now = time.monotonic()
+            if reading["seq"] != last_seq:
+                last_seq = reading["seq"]
+                last_sent = now
+                yield f"id: {last_seq}\ndata: {json.dumps(reading)}\n\n".encode()
+            elif now - last_sent >= heartbeat:
+                last_sent = now
+                yield b": keep-alive\n\n"
+            yield None
+
+    async def events(self, heartbeat=15.0):
+        """SSE byte chunks: the current reading, then each change at most `rate_hz` times a second."""
+        for chunk in self._chunks(heartbeat):
+            if chunk is None:
+                await asyncio.sleep(self.interval)
+            else:
+                yield chunk
+
+    def events_sync(self, heartbeat=15.0):
+        """`events` for WSGI servers, which can only send from a blocking iterator."""
+        for chunk in self._chunks(heartbeat):
+            if chunk is None:
+                time.sleep(self.interval)
+            else:
+                yield chunk
+
+
+class WeightSeries:
+    """
+    Ring buffer of timestamped samples in two preallocated float64 arrays.
+
+    Memory use is fixed by `capacity` whatever the scale's sample rate; old
+    samples are overwritten. Timestamps are kept in order, which the
+    searchsorted lookups rely on.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._t = np.zeros(capacity, dtype=np.float64)
+        self._w = np.zeros(capacity, dtype=np.float64)
+        self._head = 0  # next write position
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def extend(self, timestamps, weights):
+        """
+        Append a batch, sorted by time. Samples older than the newest one
+        already stored are dropped. Returns the (timestamps, weights) kept.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, weights = timestamps[order], weights[order]
+        with self._lock:
+            if self._count:
+                keep = np.searchsorted(timestamps, self._t[(self._head - 1) % self.capacity], side="left")
+                timestamps, weights = timestamps[keep:], weights[keep:]
+            timestamps, weights = timestamps[-self.capacity:], weights[-self.capacity:]
+            n = len(weights)
+            idx = (self._head + np.arange(n)) % self.capacity
+            self._t[idx] = timestamps
+            self._w[idx] = weights
+            self._head = (self._head + n) % self.capacity
+            self._count = min(self._count + n, self.capacity)
+        return timestamps, weights
+
+    def samples(self, since=None):
+        """Return (timestamps, weights) oldest first, optionally only after `since`."""
+        with self._lock:
+            start = (self._head - self._count) % self.capacity
+            idx = (start + np.arange(self._count)) % self.capacity
+            t, w = self._t[idx], self._w[idx]
+        if since is not None:
+            keep = np.searchsorted(t, since, side="right")
+            t, w = t[keep:], w[keep:]
+        return t, w
+
+    def history(self, seconds=60.0, points=200):
+        """Samples of the last `seconds`, averaged into at most `points` equal time buckets."""
+        now = time.time()
+        t, w = self.samples(since=now - seconds)
+        if len(t) <= points:
+            return {"t": t.tolist(), "weight": w.tolist(), "min": w.tolist(), "max": w.tolist()}
+
+        edges_start = now - seconds
+        bucket = np.minimum(((t - edges_start) / seconds * points).astype(np.int64), points - 1)
+        counts = np.bincount(bucket, minlength=points)
+        used = counts > 0
+        mean_t = np.bincount(bucket, weights=t, minlength=points)[used] / counts[used]
+        mean_w = np.bincount(bucket, weights=w, minlength=points)[used] / counts[used]
+
+        # Per-bucket min/max: buckets are contiguous because t is sorted
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        return {
+            "t": mean_t.tolist(),
+            "weight": mean_w.tolist(),
+            "min": np.minimum.reduceat(w, starts).tolist(),
+            "max": np.maximum.reduceat(w, starts).tolist(),
+        }
+
+
+def rolling_mean_var(values, window):
+    """Rolling mean and variance over `window` samples (valid positions only), via cumulative sums."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < window:
+        return np.empty(0), np.empty(0)
+    # Centre first so the E[x^2] - E[x]^2 form doesn't lose precision
+    centred = values - values.mean()
+    c1 = np.concatenate(([0.0], np.cumsum(centred)))
+    c2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    mean = s1 / window
+    var = np.maximum(s2 / window - mean * mean, 0.0)
+    return mean + values.mean(), var
+
+
+class StabilityDetector:
+    """
+    Fires once each time the reading settles at a new level.
+
+    Settled means the last `window_s` seconds hold at least `min_samples`
+    samples and their rolling standard deviation stays under `max_std` for
+    the whole window. A settled level near zero is an empty scale and
+    resets the session; the first loaded level is the "before" reading, and
+    a later level at least `min_change` lower is the "after" reading.
+    """
+
+    def __init__(self, window_s=1.5, max_std=2.0, min_samples=5, empty_below=20.0, min_change=10.0):
+        self.window_s = window_s
+        self.max_std = max_std
+        self.min_samples = min_samples
+        self.empty_below = empty_below
+        self.min_change = min_change
+        self.settled_level = None
+        self.before_level = None
+
+    def update(self, series):
+        """Check the newest samples; returns an event dict when a new level settles, else None."""
+        t, w = series.samples()
+        if len(t) == 0:
+            return None
+        # Window relative to the newest sample, so scale clock skew doesn't matter
+        start = np.searchsorted(t, t[-1] - self.window_s, side="left")
+        t, w = t[start:], w[start:]
+        if len(w) < self.min_samples or t[-1] - t[0] < self.window_s * 0.8:
+            return None
+
+        window = max(self.min_samples // 2, 2)
+        mean, var = rolling_mean_var(w, window)
+        if np.sqrt(var.max()) > self.max_std:
+            return None
+
+        level = float(mean[-1])
+        if self.settled_level is not None and abs(level - self.settled_level) < self.min_change:
+            return None
+        self.settled_level = level
+
+        if level < self.empty_below:
+            self.before_level = None
+            return {"event": "empty", "weight": level}
+        if self.before_level is None:
+            self.before_level = level
+            return {"event": "settled", "capture_type": "before", "weight": level}
+        if self.before_level - level >= self.min_change:
+            return {"event": "settled", "capture_type": "after", "weight": level,
+                    "consumed": self.before_level - level}
+        return {"event": "settled", "weight": level}
+
+
+class WeightMonitor:
+    """Ingests scale samples: shared latest value, local history, stability and auto-capture."""
+
+    def __init__(self, store, series, detector, auto_capture=False):
+        self.store = store
+        self.series = series
+        self.detector = detector
+        self.auto_capture = auto_capture
+        self.last_event = None
+        self._lock = threading.Lock()
+
+    def ingest(self, timestamps, weights):
+        """Add a batch of samples; returns (samples accepted, event or None)."""
+        timestamps, weights = self.series.extend(timestamps, weights)
+        if len(weights) == 0:
+            return 0, None
+        # One shared write per batch, however many samples it carried
+        self.store.set(float(weights[-1]), float(timestamps[-1]))
+
+        with self._lock:
+            event = self.detector.update(self.series)
+            if event is None:
+                return len(weights), None
+            event["timestamp"] = time.time()
+            if self.auto_capture and event.get("capture_type"):
+                # The job queue pulls in the capture stack: only load it when it's used
+                from .jobs import get_job_queue
+
+                try:
+                    job = get_job_queue().submit(event["capture_type"])
+                    job.log(f"⚖ Auto-capture on settled weight {event['weight']:.1f}")
+                    event["job_id"] = job.id
+                except QueueFullError as e:
+                    event["error"] = str(e)
+            self.last_event = event
+            return len(weights), event
+
+
+_store = None
+_broadcaster = None
+_monitor = None
+_lock = threading.Lock()
+
+
+def get_weight_store():
+    global _store
+    with _lock:
+        if _store is None:
+            _store = WeightStore()
+        return _store
+
+
+def get_weight_broadcaster():
+    global _broadcaster
+    store = get_weight_store()
+    with _lock:
+        if _broadcaster is None:
+            _broadcaster = WeightBroadcaster(store, getattr(settings, "TX2_WEIGHT_STREAM_HZ", 5.0))
+        return _broadcaster
+
+
+def get_weight_monitor():
+    global _monitor
+    store = get_weight_store()
+    with _lock:
+        if _monitor is None:
+            config = {
+                "CAPACITY": 4096,
+                "WINDOW_S": 1.5,
+                "MAX_STD": 2.0,
+                "MIN_SAMPLES": 5,
+                "EMPTY_BELOW": 20.0,
+                "MIN_CHANGE": 10.0,
+                "AUTO_CAPTURE": False,
+            }
+            config.update(getattr(settings, "TX2_WEIGHT_MONITOR", {}))
+            _monitor = WeightMonitor(
+                store,
+                WeightSeries(config["CAPACITY"]),
+                StabilityDetector(
+                    window_s=config["WINDOW_S"],
+                    max_std=config["MAX_STD"],
+                    min_samples=config["MIN_SAMPLES"],
+                    empty_below=config["EMPTY_BELOW"],
+                    min_change=config["MIN_CHANGE"],
+                ),
+                auto_capture=config["AUTO_CAPTURE"],
+            )
+        return _monitor